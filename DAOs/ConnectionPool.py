@@ -0,0 +1,161 @@
+import time
+import threading
+
+class PoolExhaustedError(Exception):
+    """Raised when no connection could be borrowed before the wait timeout ran out."""
+
+class ConnectionPool():
+    def __init__(self, connect, check=None, size:int=5, timeout:float=10.0, recycle:float=300.0):
+        """A fixed size pool of database connections.\n
+        connect: A function that opens a brand new connection\n
+        check: A function that returns True if a connection is still usable (run on checkout)\n
+        size: The most connections the pool will ever have open at once\n
+        timeout: How many seconds acquire() waits for a free connection before giving up\n
+        recycle: Connections idle for longer than this many seconds are closed and reopened"""
+        self.size = size
+        self.timeout = timeout
+        self.recycle = recycle
+        self._connect = connect
+        self._check = check
+        self._cond = threading.Condition()
+        self._idle = []  # (connection, time it was released), the most recently used is last
+        self._open = 0
+        self._in_use = 0
+        self._counters = {
+            'connections_created': 0,
+            'checkouts': 0,
+            'recycled': 0,
+            'failed_health_checks': 0,
+            'waits': 0,
+            'exhausted': 0,
+            'wait_seconds_total': 0.0,
+            'wait_seconds_max': 0.0,
+        }
+
+    def acquire(self):
+        """Borrows a connection from the pool, opening a new one if there is room.\n
+        returns: A raw database connection"""
+        start = time.monotonic()
+        deadline = start + self.timeout
+        waited = False
+        conn = None
+
+        # Take an idle connection, or reserve a slot for a new one, or wait for a release
+        with self._cond:
+            while True:
+                if self._idle:
+                    conn, released_at = self._idle.pop()
+                    break
+                if self._open < self.size:
+                    self._open += 1
+                    released_at = None
+                    break
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    self._counters['exhausted'] += 1
+                    raise PoolExhaustedError(f'No database connection available after {self.timeout} seconds')
+                waited = True
+                self._cond.wait(remaining)
+
+            self._in_use += 1
+            self._counters['checkouts'] += 1
+            if waited:
+                wait_seconds = time.monotonic() - start
+                self._counters['waits'] += 1
+                self._counters['wait_seconds_total'] += wait_seconds
+                self._counters['wait_seconds_max'] = max(self._counters['wait_seconds_max'], wait_seconds)
+
+        # Validate the connection outside of the lock, since pinging is a round trip
+        try:
+            if conn is not None and time.monotonic() - released_at > self.recycle:
+                self._close_quietly(conn)
+                conn = None
+                self._count('recycled')
+            elif conn is not None and self._check is not None and not self._is_healthy(conn):
+                self._close_quietly(conn)
+                conn = None
+                self._count('failed_health_checks')
+            if conn is None:
+                conn = self._connect()
+                self._count('connections_created')
+        except Exception:
+            # Give the reserved slot back so that a failed connect does not shrink the pool
+            with self._cond:
+                self._open -= 1
+                self._in_use -= 1
+                self._cond.notify()
+            raise
+        return conn
+
+    def release(self, conn, discard:bool=False):
+        """Returns a borrowed connection to the pool. Any open transaction is rolled back."""
+        if not discard:
+            try:
+                conn.rollback()
+            except Exception:
+                discard = True
+        if discard:
+            self._close_quietly(conn)
+
+        with self._cond:
+            self._in_use -= 1
+            if discard:
+                self._open -= 1
+            else:
+                self._idle.append((conn, time.monotonic()))
+            self._cond.notify()
+
+    def warm(self, count:int) -> int:
+        """Opens connections until at least count of them (at most the pool size) are idle, so early requests skip the connect.
+
+        returns: How many connections were opened"""
+        opened = 0
+        while True:
+            with self._cond:
+                if len(self._idle) >= count or self._open >= self.size:
+                    return opened
+                self._open += 1
+            try:
+                conn = self._connect()
+            except Exception:
+                with self._cond:
+                    self._open -= 1
+                    self._cond.notify()
+                raise
+            self._count('connections_created')
+            with self._cond:
+                self._idle.append((conn, time.monotonic()))
+                self._cond.notify()
+            opened += 1
+
+    def close_idle(self):
+        """Closes every idle connection, e.g. before a worker process forks or exits."""
+        with self._cond:
+            idle, self._idle = self._idle, []
+            self._open -= len(idle)
+        for conn, _ in idle:
+            self._close_quietly(conn)
+
+    def stats(self) -> dict:
+        """returns: A snapshot of the pool counters and current occupancy"""
+        with self._cond:
+            stats = dict(self._counters)
+            stats.update(size=self.size, open=self._open, in_use=self._in_use, idle=len(self._idle))
+            return stats
+
+    def _is_healthy(self, conn) -> bool:
+        try:
+            return bool(self._check(conn))
+        except Exception:
+            return False
+
+    def _count(self, counter:str):
+        with self._cond:
+            self._counters[counter] += 1
+
+    @staticmethod
+    def _close_quietly(conn):
+        try:
+            conn.close()
+        except Exception:
+            pass
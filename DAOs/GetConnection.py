@@ -1,13 +1,237 @@
-import os
-from dotenv import load_dotenv
-import mysql.connector
-
-def get_db_connection():
-    load_dotenv()
-    conn = mysql.connector.connect(
-        host=os.getenv("DB_HOST"),
-        user=os.getenv("DB_USER"),
-        password=os.getenv("DB_PASSWORD"),
-        database=os.getenv("DB_DATABASE")
-    )
-    return conn
\ No newline at end of file
+import time
+import threading
+from functools import wraps
+from contextlib import contextmanager
+from contextvars import ContextVar
+from flask import g, session, has_app_context, has_request_context
+
+from DAOs.ConnectionPool import ConnectionPool
+from DAOs.Instrumentation import InstrumentedCursor, record_connection
+from DAOs.Replicas import Replica, ReplicaSet
+from DAOs.StorageBackend import backend_from_settings
+from Services.Settings import get_settings
+
+_pool = None
+_backend = None
+_replicas = None
+_pool_lock = threading.Lock()
+_unit_connection = ContextVar('unit_connection', default=None)  # Set by UnitOfWork while it is open
+_reading = ContextVar('reading', default=False)  # Set while a reads_replica method runs
+WROTE_AT_KEY = '_db_wrote_at'  # The session key holding when the user last wrote to the primary
+
+def _load_db_config() -> dict:
+    """Picks the database settings out of the app settings. Only called once, when the pool is built."""
+    settings = get_settings()
+    return {
+        'backend': backend_from_settings(settings),
+        'size': settings.db_pool_size,
+        'timeout': settings.db_pool_timeout,
+        'recycle': settings.db_pool_recycle,
+        'replicas': [address for address in (settings.db_replicas or '').split(',') if address.strip()],
+        'replica_max_lag': settings.db_replica_max_lag,
+    }
+
+def get_pool() -> ConnectionPool:
+    """returns: The process wide connection pool of the primary, building it (and those of the replicas) on first use"""
+    global _pool, _backend, _replicas
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                config = _load_db_config()
+                _backend = config['backend']
+                pool_args = dict(size=config['size'], timeout=config['timeout'], recycle=config['recycle'])
+                if config['replicas']:
+                    replicas = []
+                    for address in config['replicas']:
+                        backend = _backend.replica(address)
+                        replicas.append(Replica(address.strip(), backend, ConnectionPool(connect=backend.connect, check=backend.check, **pool_args)))
+                    _replicas = ReplicaSet(replicas, config['replica_max_lag'])
+                _pool = ConnectionPool(connect=_backend.connect, check=_backend.check, **pool_args)
+    return _pool
+
+def get_replicas() -> ReplicaSet | None:
+    """returns: The read replicas named by DB_REPLICAS, or None if reads all go to the primary"""
+    get_pool()
+    return _replicas
+
+def reads_replica(method):
+    """Marks a DAO method that only reads, so its queries may go to a read replica.
+    Inside a unit of work they stay on the unit's connection. Leave it off methods that fill a cache,
+    since a stale row cached from a replica would outlive the replica's lag."""
+    @wraps(method)
+    def wrapper(*args, **kwargs):
+        token = _reading.set(True)
+        try:
+            return method(*args, **kwargs)
+        finally:
+            _reading.reset(token)
+    return wrapper
+
+def get_backend():
+    """returns: The MySQLBackend or SQLiteBackend picked by DB_BACKEND"""
+    get_pool()
+    return _backend
+
+class PooledConnection():
+    """A borrowed connection. close() hands it back to the pool instead of closing the socket.\n
+    Inside a Flask request the connection is shared by every DAO call and only goes back
+    to the pool when the request ends. Inside a UnitOfWork, commit() is deferred until the unit ends."""
+    def __init__(self, pool:ConnectionPool, conn, request_scoped:bool, primary:bool=True):
+        self._pool = pool
+        self._conn = conn
+        self._request_scoped = request_scoped
+        self._primary = primary
+        self._unit_depth = 0
+        self._rollback_only = False
+        self._after_commit = []
+
+    def cursor(self, *args, **kwargs):
+        # Every statement a DAO runs is timed and counted for the current request
+        return InstrumentedCursor(_backend.cursor(self._conn, *args, **kwargs))
+
+    def commit(self):
+        # The unit of work commits once, when it ends
+        if self._unit_depth == 0:
+            self._conn.commit()
+            self._wrote()
+
+    def rollback(self):
+        if self._unit_depth == 0:
+            self._conn.rollback()
+        else:
+            self._rollback_only = True
+
+    @property
+    def in_unit(self) -> bool:
+        """True while a UnitOfWork is open on this connection, so commit() and rollback() only take effect when it ends"""
+        return self._unit_depth > 0
+
+    def after_commit(self, callback):
+        """Runs callback once the current changes are committed: right away outside of a unit of work
+        (DAOs call this after their own commit), or when the unit of work commits. Dropped on rollback."""
+        if self._unit_depth == 0:
+            callback()
+        else:
+            self._after_commit.append(callback)
+
+    def begin_unit(self):
+        self._unit_depth += 1
+
+    def end_unit(self, commit:bool) -> bool:
+        """Ends a unit of work, committing (and running the after_commit callbacks) only when the outermost unit ends.\n
+        returns: True if this committed the transaction, False if it was rolled back or an outer unit is still open"""
+        self._unit_depth -= 1
+        if not commit:
+            self._rollback_only = True
+        if self._unit_depth > 0:
+            return False
+
+        callbacks, self._after_commit = self._after_commit, []
+        rollback_only, self._rollback_only = self._rollback_only, False
+        if rollback_only:
+            self._conn.rollback()
+            return False
+        self._conn.commit()
+        self._wrote()
+        for callback in callbacks:
+            callback()
+        return True
+
+    def _wrote(self):
+        # Remembered for read-your-writes, see remember_writes()
+        if self._primary and _replicas is not None and has_app_context():
+            g._db_wrote_at = time.time()
+
+    def close(self):
+        # Request scoped connections are released by release_request_connection(), and units of work need theirs until they end
+        if not self._request_scoped and self._unit_depth == 0:
+            self.release()
+
+    def release(self):
+        if self._conn is not None:
+            conn, self._conn = self._conn, None
+            self._pool.release(conn)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def __getattr__(self, name):
+        return getattr(self._conn, name)
+
+@contextmanager
+def advisory_lock(name:str):
+    """Holds a lock named name, shared by every worker process, for the duration of the with block if no one else holds it.
+    Background tasks that only one worker should run at a time take it and skip the run if they get False.\n
+    returns: (as the with target) True if the lock was taken, False if another process holds it"""
+    pool = get_pool()
+    conn = pool.acquire()
+    try:
+        locked = _backend.try_lock(conn, name)
+        try:
+            yield locked
+        finally:
+            if locked:
+                _backend.unlock(conn, name)
+    finally:
+        pool.release(conn)
+
+def get_db_connection() -> PooledConnection:
+    """Borrows a connection from the pool.\n
+    returns: The connection of the current unit of work or Flask request, or a standalone pooled connection outside of both"""
+    conn = _unit_connection.get()
+    if conn is not None:
+        return conn
+
+    # Reads go to a replica that has caught up with the user's last write, if there is one
+    pool = get_pool()
+    if _replicas is not None and _reading.get():
+        replica = _replicas.choose(_last_write_age())
+        if replica is not None:
+            return _borrow(replica.pool, '_db_replica_conn', primary=False)
+    return _borrow(pool, '_db_conn', primary=True)
+
+def _borrow(pool:ConnectionPool, key:str, primary:bool) -> PooledConnection:
+    if not has_app_context():
+        return PooledConnection(pool, _acquire(pool), request_scoped=False, primary=primary)
+
+    # One connection per request to the primary, and one to whichever replica the request read from first
+    conn = g.get(key)
+    if conn is None:
+        conn = PooledConnection(pool, _acquire(pool), request_scoped=True, primary=primary)
+        setattr(g, key, conn)
+    return conn
+
+def _last_write_age() -> float | None:
+    """returns: How many seconds ago this request or the user's session last wrote to the primary, or None if it has not"""
+    if not has_app_context():
+        return None
+    wrote_at = g.get('_db_wrote_at')
+    if wrote_at is None and has_request_context():
+        wrote_at = session.get(WROTE_AT_KEY)
+    return None if wrote_at is None else time.time() - wrote_at
+
+def _acquire(pool:ConnectionPool):
+    # Includes waiting for a free connection and opening a new one
+    started = time.perf_counter()
+    try:
+        return pool.acquire()
+    finally:
+        record_connection(time.perf_counter() - started)
+
+def remember_writes(response):
+    """Flask after_request handler that stores when the request wrote to the primary in the user's session,
+    so their next requests (like the page a form redirects to) keep reading from the primary until the replicas catch up."""
+    wrote_at = g.get('_db_wrote_at')
+    if wrote_at is not None:
+        session[WROTE_AT_KEY] = wrote_at
+    return response
+
+def release_request_connection(exception=None):
+    """Flask teardown handler that returns the request's connections to their pools."""
+    for key in ('_db_conn', '_db_replica_conn'):
+        conn = g.pop(key, None)
+        if conn is not None:
+            conn.release()
@@ -0,0 +1,97 @@
+from datetime import date
+
+from DAOs.GetConnection import get_db_connection, reads_replica
+from Services.BlobStore import blob_store_from_env
+
+class ImageDAO():
+    def add_variants(self, recipe_id:int, variants:list[tuple[str, str, str, bytes]]):
+        """Stores the resized variants of a recipe image, replacing any older ones."""
+        query = """
+        REPLACE INTO recipe_image_variant (recipe_id, size, format, mime_type, image_data)
+        VALUES (%s, %s, %s, %s, %s)
+        """
+        with get_db_connection() as conn, conn.cursor() as cursor:
+            rows = [(recipe_id, size, image_format, mime_type, data) for size, image_format, mime_type, data in variants]
+            cursor.executemany(query, rows)
+            conn.commit()
+
+    @reads_replica
+    def retrieve_variant(self, recipe_id:int, size:str, formats:list[str]) -> tuple[bytes, str, date] | None:
+        """Retrieves the first variant of a recipe image that exists in one of the formats, in order of preference.\n
+        returns: (image bytes, mime_type, date_created), or None if there is no such variant yet"""
+        assert isinstance(recipe_id, int)
+        if not formats:
+            return None
+
+        # Rank the formats with a CASE so the database picks the preferred one
+        placeholders = ', '.join(['%s'] * len(formats))
+        ranking = ' '.join(['WHEN %s THEN ' + str(rank) for rank in range(len(formats))])
+        query = f"""
+        SELECT recipe_image_variant.image_data, recipe_image_variant.mime_type, recipe.date_created
+        FROM recipe_image_variant JOIN recipe ON recipe.recipe_id = recipe_image_variant.recipe_id
+        WHERE recipe_image_variant.recipe_id = %s AND recipe_image_variant.size = %s AND recipe_image_variant.format IN ({placeholders})
+        ORDER BY CASE recipe_image_variant.format {ranking} END
+        LIMIT 1
+        """
+        with get_db_connection() as conn, conn.cursor() as cursor:
+            cursor.execute(query, (recipe_id, size, *formats, *formats))
+            response = cursor.fetchone()
+        if not response:
+            return None
+        return bytes(response[0]), response[1], response[2]
+
+    def retrieve_recipe_ids_without_variants(self) -> list[int]:
+        """returns: The ids of recipes that have an image but no variants yet"""
+        query = """
+        SELECT recipe_id FROM recipe
+        WHERE image_mime_type IS NOT NULL
+        AND recipe_id NOT IN (SELECT recipe_id FROM recipe_image_variant)
+        """
+        with get_db_connection() as conn, conn.cursor() as cursor:
+            cursor.execute(query)
+            return [recipe_id for recipe_id, in cursor.fetchall()]
+
+    def add_reference(self, cursor, blob_hash:str):
+        """Counts one more recipe using a stored image, using the caller's cursor so it is committed along with the recipe."""
+        # Only a duplicate key is skipped, unlike INSERT IGNORE, which would also swallow other errors as warnings
+        cursor.execute("INSERT INTO image_blob (blob_hash) VALUES (%s) ON DUPLICATE KEY UPDATE blob_hash = blob_hash", (blob_hash,))
+        cursor.execute("UPDATE image_blob SET ref_count = ref_count + 1 WHERE blob_hash = %s", (blob_hash,))
+
+    def release_reference(self, cursor, recipe_id:int):
+        """Counts one recipe fewer using the stored image of recipe_id, if it has one. Call it before the recipe's image_hash changes.
+        The file itself is left for the garbage collector, which deletes it once nothing uses it."""
+        cursor.execute("SELECT image_hash FROM recipe WHERE recipe_id = %s AND image_hash IS NOT NULL", (recipe_id,))
+        row = cursor.fetchone()
+        if row:
+            cursor.execute("UPDATE image_blob SET ref_count = ref_count - 1 WHERE blob_hash = %s", (row[0],))
+
+    def find_unused_blobs(self, blob_hashes:list[str]) -> list[str]:
+        """Forgets the stored images in blob_hashes that no recipe uses, for the garbage collector.\n
+        returns: The hashes that no recipe uses"""
+        if not blob_hashes:
+            return []
+        placeholders = ', '.join(['%s'] * len(blob_hashes))
+        with get_db_connection() as conn, conn.cursor() as cursor:
+            cursor.execute(f"DELETE FROM image_blob WHERE blob_hash IN ({placeholders}) AND ref_count <= 0", blob_hashes)
+            cursor.execute(f"SELECT blob_hash FROM image_blob WHERE blob_hash IN ({placeholders})", blob_hashes)
+            used = {blob_hash for blob_hash, in cursor.fetchall()}
+            conn.commit()
+        return [blob_hash for blob_hash in blob_hashes if blob_hash not in used]
+
+    def retrieve_inline_images(self, limit:int) -> list[tuple[int, bytes]]:
+        """Retrieves images still stored in the recipe table, for the migration to the blob store.\n
+        returns: A list of (recipe_id, image bytes)"""
+        query = "SELECT recipe_id, recipe_image FROM recipe WHERE recipe_image IS NOT NULL AND image_hash IS NULL ORDER BY recipe_id LIMIT %s"
+        with get_db_connection() as conn, conn.cursor() as cursor:
+            cursor.execute(query, (limit,))
+            return [(recipe_id, bytes(image)) for recipe_id, image in cursor.fetchall()]
+
+    def move_inline_image(self, recipe_id:int, blob_hash:str):
+        """Points a recipe at its image in the blob store and drops the copy in the recipe table."""
+        with get_db_connection() as conn, conn.cursor() as cursor:
+            self.add_reference(cursor, blob_hash)
+            cursor.execute("UPDATE recipe SET image_hash = %s, recipe_image = NULL WHERE recipe_id = %s", (blob_hash, recipe_id))
+            conn.commit()
+
+# One store of original image files per worker process
+blob_store = blob_store_from_env()
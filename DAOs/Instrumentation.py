@@ -0,0 +1,163 @@
+import re
+import time
+import logging
+from collections import defaultdict
+from flask import g, has_app_context
+
+from Services.Metrics import metrics
+
+logger = logging.getLogger('cookbook.db')
+
+# Changed by configure(), which main.py calls with the values from .env
+SLOW_QUERY_SECONDS = 0.2
+N_PLUS_ONE_THRESHOLD = 10
+
+QUERY_SECONDS = metrics.histogram('cookbook_db_query_seconds', 'Time spent running each statement')
+SLOW_QUERIES = metrics.counter('cookbook_db_slow_queries_total', 'Statements slower than SLOW_QUERY_MS')
+ROWS_FETCHED = metrics.counter('cookbook_db_rows_fetched_total', 'Rows read from the database')
+CONNECTION_SECONDS = metrics.histogram('cookbook_db_connection_seconds', 'Time spent borrowing a connection from the pool')
+REQUESTS = metrics.counter('cookbook_requests_total', 'Requests handled', ('endpoint', 'status'))
+REQUEST_SECONDS = metrics.histogram('cookbook_request_seconds', 'Time spent handling each request', ('endpoint',))
+REQUEST_DB_SECONDS = metrics.histogram('cookbook_request_db_seconds', 'Time spent running statements in each request', ('endpoint',))
+REQUEST_QUERIES = metrics.histogram('cookbook_request_queries', 'Statements run by each request', ('endpoint',), buckets=(0, 1, 2, 3, 5, 10, 20, 50, 100))
+N_PLUS_ONE = metrics.counter('cookbook_n_plus_one_total', 'Requests that ran one statement shape more than N_PLUS_ONE_THRESHOLD times', ('endpoint',))
+
+_LITERAL_RE = re.compile(r"'(?:[^'\\]|\\.|'')*'|\b\d+(?:\.\d+)?\b|%s|\?")
+_LIST_RE = re.compile(r'\((?:\s*\?\s*,)+\s*\?\s*\)')
+_SPACE_RE = re.compile(r'\s+')
+
+def configure(slow_query_ms:float | None = None, n_plus_one_threshold:int | None = None):
+    global SLOW_QUERY_SECONDS, N_PLUS_ONE_THRESHOLD
+    if slow_query_ms is not None:
+        SLOW_QUERY_SECONDS = slow_query_ms / 1000
+    if n_plus_one_threshold is not None:
+        N_PLUS_ONE_THRESHOLD = n_plus_one_threshold
+
+def statement_shape(statement:str) -> str:
+    """Strips the values out of a statement, so that "WHERE recipe_id IN (1, 2)" and "WHERE recipe_id IN (%s, %s, %s)"
+    have the same shape: "WHERE recipe_id IN (...)"."""
+    if isinstance(statement, (bytes, bytearray)):
+        statement = statement.decode(errors='replace')
+    shape = _LITERAL_RE.sub('?', statement)
+    shape = _LIST_RE.sub('(...)', shape)
+    return _SPACE_RE.sub(' ', shape).strip()
+
+class RequestStats():
+    """What one request did with the database."""
+    def __init__(self, endpoint:str | None):
+        self.endpoint = endpoint or 'unknown'
+        self.started = time.perf_counter()
+        self.queries = 0
+        self.db_seconds = 0.0
+        self.connection_seconds = 0.0
+        self.rows_fetched = 0
+        self.status = None  # Set once the response is ready
+        self.shapes = defaultdict(int)  # statement shape -> times run
+
+def current_stats() -> RequestStats | None:
+    """returns: The stats of the current Flask request, or None outside of one"""
+    return g.get('_request_stats') if has_app_context() else None
+
+def begin_request(endpoint:str | None) -> RequestStats:
+    stats = RequestStats(endpoint)
+    g._request_stats = stats
+    return stats
+
+def server_timing(stats:RequestStats) -> str:
+    """returns: A Server-Timing header value, which browser dev tools show next to the request"""
+    return (f'db;dur={stats.db_seconds * 1000:.2f};desc="{stats.queries} queries", '
+            f'conn;dur={stats.connection_seconds * 1000:.2f}, rows;desc="{stats.rows_fetched}"')
+
+def end_request(exception=None):
+    """Flask teardown handler that records the finished request's totals."""
+    stats = g.pop('_request_stats', None)
+    if stats is None:
+        return
+    status = stats.status or (500 if exception is not None else '')
+    REQUESTS.inc(endpoint=stats.endpoint, status=status)
+    REQUEST_SECONDS.observe(time.perf_counter() - stats.started, endpoint=stats.endpoint)
+    REQUEST_DB_SECONDS.observe(stats.db_seconds, endpoint=stats.endpoint)
+    REQUEST_QUERIES.observe(stats.queries, endpoint=stats.endpoint)
+
+def record_connection(seconds:float):
+    CONNECTION_SECONDS.observe(seconds)
+    stats = current_stats()
+    if stats is not None:
+        stats.connection_seconds += seconds
+
+def record_query(statement, seconds:float):
+    QUERY_SECONDS.observe(seconds)
+    shape = None
+    if seconds >= SLOW_QUERY_SECONDS:
+        shape = statement_shape(statement)
+        SLOW_QUERIES.inc()
+        logger.warning('Slow query (%.1f ms): %s', seconds * 1000, shape)
+
+    stats = current_stats()
+    if stats is None:
+        return
+    stats.queries += 1
+    stats.db_seconds += seconds
+    shape = shape or statement_shape(statement)
+    stats.shapes[shape] += 1
+
+    # The same statement over and over in one request is usually a query inside a loop
+    if stats.shapes[shape] == N_PLUS_ONE_THRESHOLD + 1:
+        N_PLUS_ONE.inc(endpoint=stats.endpoint)
+        logger.warning('Possible N+1 in %s: ran %d+ times: %s', stats.endpoint, N_PLUS_ONE_THRESHOLD + 1, shape)
+
+def record_rows(count:int):
+    if not count:
+        return
+    ROWS_FETCHED.inc(count)
+    stats = current_stats()
+    if stats is not None:
+        stats.rows_fetched += count
+
+class InstrumentedCursor():
+    """Wraps a database cursor to time every statement and count the rows it returns."""
+    def __init__(self, cursor):
+        self._cursor = cursor
+
+    def execute(self, operation, params=None, *args, **kwargs):
+        started = time.perf_counter()
+        try:
+            return self._cursor.execute(operation, params, *args, **kwargs)
+        finally:
+            record_query(operation, time.perf_counter() - started)
+
+    def executemany(self, operation, seq_params, *args, **kwargs):
+        started = time.perf_counter()
+        try:
+            return self._cursor.executemany(operation, seq_params, *args, **kwargs)
+        finally:
+            record_query(operation, time.perf_counter() - started)
+
+    def fetchone(self):
+        row = self._cursor.fetchone()
+        record_rows(0 if row is None else 1)
+        return row
+
+    def fetchmany(self, *args, **kwargs):
+        rows = self._cursor.fetchmany(*args, **kwargs)
+        record_rows(len(rows))
+        return rows
+
+    def fetchall(self):
+        rows = self._cursor.fetchall()
+        record_rows(len(rows))
+        return rows
+
+    def __iter__(self):
+        for row in self._cursor:
+            record_rows(1)
+            yield row
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self._cursor.close()
+
+    def __getattr__(self, name):
+        return getattr(self._cursor, name)
@@ -1,9 +1,20 @@
-from DAOs.GetConnection import get_db_connection
+import logging
+
+from DAOs.GetConnection import get_db_connection, reads_replica
+from DAOs.Recommendation_DAO import RecommendationDAO
+from DAOs.Stats_DAO import StatsDAO
+from DAOs.Saved_DAO import saved_set_cache
+from DAOs.Recipe_DAO import RecipeNotFoundError, suggest_index
 from Models.PCB_Entry import PCBEntry
 
+logger = logging.getLogger(__name__)
+
 class PcbDAO():
-    def retrieve_entries_by_user(self, user_id:int):
-        """Retrieves the entries for a specific user.\n
+    @reads_replica
+    def retrieve_entries_by_user(self, user_id:int, after_recipe_id:int | None = None, limit:int | None = None):
+        """Retrieves the entries for a specific user, ordered by recipe_id.\n
+        after_recipe_id: Only return entries after this recipe_id (keyset pagination)\n
+        limit: The most entries to return\n
         returns: A list of recipe_ids"""
 
         # Check that user_id is an int
@@ -15,8 +26,15 @@ class PcbDAO():
 
         # Create the query
         query = "SELECT * FROM personal_cookbook_entry WHERE user_id = %s"
-        tup = (user_id,)
-        cursor.execute(query, tup)
+        params = [user_id]
+        if after_recipe_id is not None:
+            query += " AND recipe_id > %s"
+            params.append(after_recipe_id)
+        query += " ORDER BY recipe_id"
+        if limit is not None:
+            query += " LIMIT %s"
+            params.append(limit)
+        cursor.execute(query, params)
 
         # Get the response and close the connection
         response = cursor.fetchall()
@@ -27,23 +45,33 @@ class PcbDAO():
         return pcb_entries
     
     def add_new_entry(self, user_id, recipe_id):
+        """Raises RecipeNotFoundError if the recipe does not exist.\n
+        returns: True if the entry was added, False if it was already there"""
         conn = get_db_connection()
         try:
             cursor = conn.cursor(buffered=True)  # Use a buffered cursor
 
-            # Check if the entry already exists
-            query = "SELECT COUNT(*) FROM personal_cookbook_entry WHERE user_id = %s AND recipe_id = %s"
+            # A missing recipe is an error, not an entry that already exists
+            cursor.execute("SELECT 1 FROM recipe WHERE recipe_id = %s", (recipe_id,))
+            if cursor.fetchone() is None:
+                raise RecipeNotFoundError(recipe_id)
+
+            # Insert the entry unless it already exists, in one atomic statement. Unlike INSERT IGNORE this only skips
+            # the duplicate key, a foreign key or NOT NULL violation still raises. The row count is 0 for a duplicate.
+            query = "INSERT INTO personal_cookbook_entry (user_id, recipe_id) VALUES (%s, %s) ON DUPLICATE KEY UPDATE recipe_id = recipe_id"
             cursor.execute(query, (user_id, recipe_id))
-            count = cursor.fetchone()[0]
+            added = cursor.rowcount == 1
 
-            if count == 0:
-                # Insert the entry if it does not exist
-                query = "INSERT INTO personal_cookbook_entry (user_id, recipe_id) VALUES (%s, %s)"
-                cursor.execute(query, (user_id, recipe_id))
+            # The recipe's counters and similar recipes change with it
+            if added:
+                StatsDAO().entry_changed(cursor, 'cookbook', recipe_id, 1)
+                RecommendationDAO().mark_user_stale(cursor, user_id, recipe_id)
 
             cursor.close()  # Close the cursor to handle any potential unread results
             conn.commit()  # Now commit the transaction
-            return count == 0  # Returns True if the entry was added, False if it was not
+            if added:
+                conn.after_commit(lambda: (saved_set_cache.add(user_id, 'cookbook', recipe_id), suggest_index.add_saves(recipe_id, 1)))
+            return added  # Returns True if the entry was added, False if it was not
         finally:
             conn.close()  # Ensure the connection is closed in case of error
 
@@ -53,20 +81,26 @@ class PcbDAO():
         try:
             query = "DELETE FROM personal_cookbook_entry WHERE user_id = %s AND recipe_id = %s"
             cursor.execute(query, (user_id, recipe_id))
+            deleted = cursor.rowcount > 0
+            if deleted:
+                StatsDAO().entry_changed(cursor, 'cookbook', recipe_id, -1)
+                RecommendationDAO().mark_user_stale(cursor, user_id, recipe_id)
             conn.commit()
-            return cursor.rowcount > 0  # Returns True if rows were affected
-        except Exception as e:
-            print(f"Failed to delete recipe: {e}")
+            conn.after_commit(lambda: saved_set_cache.discard(user_id, 'cookbook', recipe_id))
+            if deleted:
+                conn.after_commit(lambda: suggest_index.add_saves(recipe_id, -1))
+            return deleted  # Returns True if rows were affected
+        except Exception:
+            # Inside a unit of work the caller's other changes are rolled back too, so the caller has to hear about it
+            conn.rollback()
+            if conn.in_unit:
+                raise
+            logger.exception('Failed to delete recipe %s from the cookbook of user %s', recipe_id, user_id)
             return False
         finally:
             cursor.close()
             conn.close()
     
     def check_if_saved_recipe(self, user_id, recipe_id) -> bool:
-        query = "SELECT COUNT(*) FROM personal_cookbook_entry WHERE user_id = %s AND recipe_id = %s"
-        with get_db_connection() as conn:
-            with conn.cursor() as cursor:
-                tup = (user_id, recipe_id)
-                cursor.execute(query, tup)
-                count = cursor.fetchone()[0]
-                return count != 0
+        # Answered from the user's cached set of saved recipe_ids
+        return saved_set_cache.contains(user_id, 'cookbook', recipe_id)
@@ -0,0 +1,44 @@
+import json
+import math
+import base64
+from typing import NamedTuple
+
+PAGE_SIZE = 50
+
+class Page(NamedTuple):
+    items: list
+    next_token: str | None
+
+def encode_cursor(values:list) -> str:
+    """Turns the sort key of the last row on a page into an opaque, URL safe "next page" token."""
+    return base64.urlsafe_b64encode(json.dumps(values).encode()).decode().rstrip('=')
+
+def decode_cursor(token:str | None, types:tuple[type, ...]) -> list | None:
+    """Reads the sort key back out of a "next page" token. Tokens come from the URL, so anyone can send any value.\n
+    types: The type of each value of the caller's sort key, e.g. (int,) for a recipe_id or (float, int) for a score and a recipe_id\n
+    returns: The sort key stored in a token, or None if there is no token or it is not a valid key of those types"""
+    if not token:
+        return None
+    try:
+        values = json.loads(base64.urlsafe_b64decode(token + '=' * (-len(token) % 4)))
+    except ValueError:
+        return None
+    if not isinstance(values, list) or len(values) != len(types):
+        return None
+    return values if all(_is_a(value, value_type) for value, value_type in zip(values, types)) else None
+
+def _is_a(value, value_type:type) -> bool:
+    # bool is a subclass of int, and a float written without a fraction (like 0.0 in some encoders) reads back as an int
+    if isinstance(value, bool):
+        return value_type is bool
+    if value_type is float:
+        return isinstance(value, (int, float)) and math.isfinite(value)
+    return isinstance(value, value_type)
+
+def paginate(rows:list, limit:int | None, cursor_of) -> Page:
+    """Cuts a page from rows that were fetched with limit + 1, so an extra row means there is a next page.\n
+    cursor_of: A function returning the sort key of a row, as a list"""
+    if limit is not None and len(rows) > limit:
+        rows = rows[:limit]
+        return Page(rows, encode_cursor(cursor_of(rows[-1])))
+    return Page(rows, None)
@@ -1,36 +1,91 @@
 import json
+from datetime import date
 
-from DAOs.GetConnection import get_db_connection
+from DAOs.GetConnection import get_db_connection, reads_replica
+from DAOs.Pagination import Page, decode_cursor, paginate
+from DAOs.Tag_DAO import TagDAO
+from DAOs.Recommendation_DAO import RecommendationDAO
+from DAOs.Stats_DAO import StatsDAO
+from DAOs.Image_DAO import ImageDAO
+from DAOs.RowMapper import RowMapper
 from Models.Recipe import Recipe
+from Models.RecipeSummary import RecipeSummary
+from Services.ChangeFeed import ChangeFeed
+from Services.SearchIndex import SearchIndex
+from Services.SuggestIndex import SuggestIndex
+from Services.RecipeCache import recipe_cache_from_env
+from Services.FragmentCache import fragment_cache_from_env
+from Services.Settings import get_settings
+
+# The columns of a full Recipe, which _convert_data_to_recipe__ maps onto its fields by name
+RECIPE_COLUMNS = "recipe_id, recipe_name, date_created, image_hash, recipe_description, instructions, tags, user_id"
+RECIPE_COLUMN_NAMES = tuple(RECIPE_COLUMNS.split(', '))
+
+# Search pages count the matches, and the tags among them, over at most this many best matches
+SEARCH_SAMPLE_SIZE = 500
+
+# How many of the newest changes the recipe_change log keeps
+CHANGE_LOG_ROWS = 100000
+
+class RecipeNotFoundError(LookupError):
+    """Raised when a recipe_id given to a DAO does not belong to any recipe."""
 
 class RecipeDAO():
-    def create_recipe(self, recipe_name:str, date_created:str, recipe_image:str, recipe_description:str, instructions:str, tags:str, user_id:int) -> str:
-        """Creates a new recipe in the database."""
+    def create_recipe(self, recipe_name:str, date_created:str, image_hash:str | None, recipe_description:str, instructions:str, tags:str, user_id:int, image_mime_type:str | None = None) -> str:
+        """Creates a new recipe in the database.\n
+        image_hash: The hash of the recipe's image in the blob store, or None if it has no image"""
         # Create a new database connection and cursor using a context manager
         with get_db_connection() as conn, conn.cursor() as cursor:
+            # Count the recipe as a user of its image, which also creates the image's row the recipe refers to
+            if image_hash:
+                ImageDAO().add_reference(cursor, image_hash)
+
             # Create the query with placeholders
             query = """
             INSERT INTO recipe 
-            (recipe_name, date_created, recipe_image, recipe_description, instructions, tags, user_id) 
-            VALUES (%s, %s, %s, %s, %s, %s, %s)
+            (recipe_name, date_created, image_hash, recipe_description, instructions, tags, user_id, image_mime_type)
+            VALUES (%s, %s, %s, %s, %s, %s, %s, %s)
             """
-            
+
             # Execute the query with the data
-            tup = (recipe_name, date_created, recipe_image, recipe_description, instructions, tags, user_id)
+            tup = (recipe_name, date_created, image_hash, recipe_description, instructions, tags, user_id, image_mime_type)
             cursor.execute(query, tup)
-            
-            # Commit changes
-            conn.commit()
-            
+
             # Get the recipe_id of the last inserted row
             recipe_id = cursor.lastrowid
-            
+
+            # Store the tags in the indexed recipe_tag table as well
+            TagDAO().add_tags(cursor, recipe_id, json.loads(tags))
+
+            # Count it, and find its similar recipes on the next refresh
+            StatsDAO().recipe_created(cursor, recipe_id, user_id, json.loads(tags))
+            RecommendationDAO().mark_stale(cursor, [recipe_id])
+
+            # Let the other workers' search indexes know
+            self.record_changes(cursor, [recipe_id])
+
+            # Commit changes
+            conn.commit()
+
+            # Make the new recipe searchable and suggestable as soon as it is committed
+            conn.after_commit(lambda: (search_index.add(recipe_id, recipe_name, recipe_description, instructions), suggest_index.add(recipe_id, recipe_name, json.loads(tags))))
+
             # Return the recipe_id
             return str(recipe_id)
 
-    def retrieve_recipes_from_search(self, recipe_name:str, recipe_description:str, tags:list[str]) -> list[Recipe]:
-        """Retrieves recipes matching the search criteria including tags.\n        
-        returns: A list of recipes"""
+    def retrieve_recipes_from_search(self, recipe_name:str, recipe_description:str, tags:list[str], match_all_tags:bool=True) -> list[RecipeSummary]:
+        """Retrieves recipes matching the search criteria including tags.\n
+        match_all_tags: If False, a recipe only needs one of the tags\n
+        returns: A list of recipe summaries"""
+        matches = self.search_recipe_ids(recipe_name, recipe_description, tags, match_all_tags)
+        return self.retrieve_search_page(matches).items
+
+    def search_recipe_ids(self, recipe_name:str, recipe_description:str, tags:list[str], match_all_tags:bool=True, limit:int | None = None, page_token:str | None = None) -> list[tuple[int, float]] | None:
+        """Finds the recipes matching the search criteria, without loading any recipe rows.\n
+        match_all_tags: If False, a recipe only needs one of the tags\n
+        limit: Only find this many best matches\n
+        page_token: Only find the matches after the page this token came from\n
+        returns: A list of (recipe_id, score) best match first, or None if there are no criteria and every recipe matches"""
         # Validate input
         try:
             assert isinstance(recipe_name, str)
@@ -43,43 +98,124 @@ class RecipeDAO():
         except:
             return []
 
-        # Create a new database connection and cursor using a context manager
+        # Matches are ordered by (score descending, recipe_id), so the token holds the (score, recipe_id) of the last match shown
+        after = None
+        cursor_values = decode_cursor(page_token, (float, int))
+        if cursor_values:
+            after = (cursor_values[0], cursor_values[1])
+
+        # Tags are answered by the recipe_tag index, before any recipe rows are loaded
+        tagged_ids = None
+        if tags:
+            tagged_ids = TagDAO().retrieve_recipe_ids_by_tags(tags, match_all=match_all_tags)
+
+        # Text searches are ranked by the search index, which stops as soon as it has the best limit matches
+        if recipe_name or recipe_description:
+            return search_index.search(recipe_name, recipe_description, limit, after, None if tagged_ids is None else set(tagged_ids))
+        if tagged_ids is None:
+            return None
+        matches = [(recipe_id, 0.0) for recipe_id in tagged_ids if after is None or recipe_id > after[1]]
+        return matches if limit is None else matches[:limit]
+
+    @reads_replica
+    def retrieve_search_page(self, matches:list[tuple[int, float]] | None, page_token:str | None = None, limit:int | None = None) -> Page:
+        """Loads one page of search results, continuing after the page that page_token came from.\n
+        matches: The result of search_recipe_ids, called with the same page_token and a limit of at least limit + 1\n
+        returns: A Page of recipe summaries and the token of the next page"""
+
+        # Without any criteria every recipe matches, paged by recipe_id in the database
+        if matches is None:
+            cursor_values = decode_cursor(page_token, (int,))
+            query = f"SELECT {RecipeSummary.COLUMNS} FROM recipe WHERE recipe_id > %s ORDER BY recipe_id"
+            params = [cursor_values[0] if cursor_values else 0]
+            if limit is not None:
+                query += " LIMIT %s"
+                params.append(limit + 1)
+            with get_db_connection() as conn, conn.cursor() as cursor:
+                cursor.execute(query, params)
+                response = cursor.fetchall()
+            return paginate([RecipeSummary.from_row(row) for row in response], limit, lambda summary: [summary.recipe_id])
+
+        # The matches already start after the page token
+        page = paginate(matches if limit is None else matches[:limit + 1], limit, lambda match: [match[1], match[0]])
+
+        # Only the recipes on this page are loaded
+        recipes = self.retrieve_recipe_summaries_by_ids([recipe_id for recipe_id, _ in page.items])
+        return Page(recipes, page.next_token)
+
+    def retrieve_search_documents(self, recipe_ids:list[int] | None = None) -> list[tuple]:
+        """Retrieves the searchable text of the given recipes (or of every recipe, if recipe_ids is None), for the search index.\n
+        returns: A list of (recipe_id, recipe_name, recipe_description, instructions), leaving out recipes that do not exist"""
+        query = "SELECT recipe_id, recipe_name, recipe_description, instructions FROM recipe"
+        params = ()
+        if recipe_ids is not None:
+            if not recipe_ids:
+                return []
+            query += f" WHERE recipe_id IN ({', '.join(['%s'] * len(recipe_ids))})"
+            params = tuple(recipe_ids)
         with get_db_connection() as conn, conn.cursor() as cursor:
+            cursor.execute(query + " ORDER BY recipe_id", params)
+            return cursor.fetchall()
 
-            # Build the query dynamically based on provided inputs (but not including them)
-            query = "SELECT * FROM recipe WHERE 1=1"
-            params = []
-            if recipe_name:
-                query += " AND recipe_name LIKE %s"
-                params.append('%' + recipe_name + '%')
-            if recipe_description:
-                query += " AND recipe_description LIKE %s"
-                params.append('%' + recipe_description + '%')
-            cursor.execute(query, params)
-            response = cursor.fetchall()
-            conn.close()
+    def record_changes(self, cursor, recipe_ids:list[int]):
+        """Appends recipes that were created, edited or deleted to the recipe_change log using the caller's cursor,
+        so the other workers' in memory indexes pick them up once the transaction commits."""
+        if recipe_ids:
+            cursor.executemany("INSERT INTO recipe_change (recipe_id) VALUES (%s)", [(recipe_id,) for recipe_id in recipe_ids])
 
-            # Convert to Recipe Model Objects
-            recipe_list = [self._convert_data_to_recipe__(recipe_data) for recipe_data in response]
-            
-            # Remove the recipes that do not have the same tags
-            recipe_list = [recipe for recipe in recipe_list if all(tag in recipe.tags for tag in tags)]
+    def retrieve_change_range(self) -> tuple[int | None, int | None]:
+        """returns: The oldest and newest change_id in the recipe_change log, (None, None) if it is empty"""
+        with get_db_connection() as conn, conn.cursor() as cursor:
+            cursor.execute("SELECT MIN(change_id), MAX(change_id) FROM recipe_change")
+            oldest, newest = cursor.fetchone()
+            return oldest, newest
 
-            # Return the matching recipes, if any
-            return recipe_list
-    
-    def retrieve_recipe_by_id(self, recipe_id:int) -> Recipe:
-        """Retrieves the recipe that matches the recipe_id.\n        
-        returns: A list of recipes"""
+    def retrieve_recipe_changes(self, after_change_id:int) -> list[tuple[int, int]]:
+        """returns: A list of (change_id, recipe_id) for every change newer than after_change_id, oldest first"""
+        with get_db_connection() as conn, conn.cursor() as cursor:
+            cursor.execute("SELECT change_id, recipe_id FROM recipe_change WHERE change_id > %s ORDER BY change_id", (after_change_id,))
+            return cursor.fetchall()
+
+    def prune_changes(self, keep:int=CHANGE_LOG_ROWS):
+        """Deletes all but the newest keep changes from the recipe_change log. A worker that falls further behind reloads its indexes,
+        which it notices from the oldest change left, so at least one is always kept."""
+        keep = max(keep, 1)
+        with get_db_connection() as conn, conn.cursor() as cursor:
+            cursor.execute("SELECT MAX(change_id) FROM recipe_change")
+            newest, = cursor.fetchone()
+            if newest is not None and newest > keep:
+                cursor.execute("DELETE FROM recipe_change WHERE change_id <= %s", (newest - keep,))
+            conn.commit()
+
+    def retrieve_recipe_names(self, recipe_ids:list[int] | None = None) -> list[tuple]:
+        """Retrieves the name of the given recipes (or of every recipe, if recipe_ids is None), for the suggest index.\n
+        returns: A list of (recipe_id, recipe_name), leaving out recipes that do not exist"""
+        query, params = "SELECT recipe_id, recipe_name FROM recipe", ()
+        if recipe_ids is not None:
+            if not recipe_ids:
+                return []
+            query += f" WHERE recipe_id IN ({', '.join(['%s'] * len(recipe_ids))})"
+            params = tuple(recipe_ids)
+        with get_db_connection() as conn, conn.cursor() as cursor:
+            cursor.execute(query, params)
+            return cursor.fetchall()
+
+    def retrieve_recipe_by_id(self, recipe_id:int) -> Recipe | None:
+        """Retrieves the recipe that matches the recipe_id, from the recipe cache when it is there.\n
+        returns: The recipe, or None if it does not exist"""
 
         # Check that the search arguments are strings
         assert isinstance(recipe_id, int)
+        return recipe_cache.get(recipe_id)
+
+    def _load_recipe_by_id(self, recipe_id:int) -> Recipe | None:
+        """Loads a recipe from the database, for the recipe cache."""
 
         # Create a new database connection and cursor using a context manager
         with get_db_connection() as conn, conn.cursor() as cursor:
 
             # Create the query
-            query = "SELECT * FROM recipe WHERE recipe_id = %s"
+            query = f"SELECT {RECIPE_COLUMNS} FROM recipe WHERE recipe_id = %s"
             tup = (recipe_id,)
             cursor.execute(query, tup)
 
@@ -88,29 +224,154 @@ class RecipeDAO():
             conn.close()
 
             # Convert to a Recipe Model Object and return
+            if not response:
+                return None
             recipe = self._convert_data_to_recipe__(response[0])
             return recipe
 
+    @reads_replica
+    def retrieve_recipe_summaries_by_ids(self, recipe_ids:list[int]) -> list[RecipeSummary]:
+        """Retrieves the summary of every recipe in recipe_ids with a single query, without images or full instructions.\n
+        returns: A list of recipe summaries in the same order as recipe_ids (missing ids are skipped)"""
+
+        # Check that every id is an int
+        assert all(isinstance(recipe_id, int) for recipe_id in recipe_ids)
+        if not recipe_ids:
+            return []
+
+        # Create a new database connection and cursor using a context manager
+        with get_db_connection() as conn, conn.cursor() as cursor:
+
+            # Create the query with one placeholder per id
+            placeholders = ', '.join(['%s'] * len(recipe_ids))
+            query = f"SELECT {RecipeSummary.COLUMNS} FROM recipe WHERE recipe_id IN ({placeholders})"
+            cursor.execute(query, tuple(recipe_ids))
+            response = cursor.fetchall()
+
+        # Convert to summaries and put them back in the requested order
+        summaries_by_id = {row[0]: RecipeSummary.from_row(row) for row in response}
+        return [summaries_by_id[recipe_id] for recipe_id in recipe_ids if recipe_id in summaries_by_id]
+
+    @reads_replica
+    def retrieve_recipe_image(self, recipe_id:int) -> tuple[str, str, date] | None:
+        """Retrieves where the image of a recipe is stored, without building a Recipe.\n
+        returns: (image_hash, mime_type, date_created), or None if the recipe has no image"""
+        assert isinstance(recipe_id, int)
+        with get_db_connection() as conn, conn.cursor() as cursor:
+            query = "SELECT image_hash, image_mime_type, date_created FROM recipe WHERE recipe_id = %s AND image_hash IS NOT NULL"
+            cursor.execute(query, (recipe_id,))
+            response = cursor.fetchone()
+        if not response:
+            return None
+        return response[0], response[1], response[2]
+
     def retrieve_recipes_by_author(self, user_id:int): # TODO
         pass
     
-    def update_recipe(self, recipe_id:int): # TODO
-        pass
+    def update_recipe(self, recipe_id:int, recipe_name:str | None = None, recipe_description:str | None = None, instructions:str | None = None,
+                      tags:list[str] | None = None, image_hash:str | None = None, image_mime_type:str | None = None) -> bool:
+        """Updates the given fields of a recipe. Fields left as None are not changed.\n
+        returns: True if the recipe exists"""
+        assert isinstance(recipe_id, int)
 
-    def delete_recipe(self, recipe_id:int): # TODO
-        pass
+        # Only the columns that were passed in are updated
+        fields = {
+            'recipe_name': recipe_name,
+            'recipe_description': recipe_description,
+            'instructions': instructions,
+            'tags': json.dumps(tags) if tags is not None else None,
+            'image_hash': image_hash,
+            'image_mime_type': image_mime_type
+        }
+        fields = {column: value for column, value in fields.items() if value is not None}
+
+        with get_db_connection() as conn, conn.cursor() as cursor:
+            # Move the recipe's count over from its old image to its new one
+            if image_hash is not None:
+                ImageDAO().release_reference(cursor, recipe_id)
+                ImageDAO().add_reference(cursor, image_hash)
+
+            if fields:
+                assignments = ', '.join(f'{column} = %s' for column in fields)
+                cursor.execute(f"UPDATE recipe SET {assignments} WHERE recipe_id = %s", (*fields.values(), recipe_id))
+
+            # Read back the searchable text, which also tells us if the recipe exists
+            cursor.execute("SELECT recipe_id, recipe_name, recipe_description, instructions FROM recipe WHERE recipe_id = %s", (recipe_id,))
+            document = cursor.fetchone()
+            if document is None:
+                conn.rollback()
+                return False
+
+            # Keep the tag index and the tag counters in step with the tags column
+            old_tags = new_tags = []
+            if tags is not None:
+                cursor.execute("SELECT tag FROM recipe_tag WHERE recipe_id = %s", (recipe_id,))
+                old_tags, new_tags = [tag for tag, in cursor.fetchall()], tags
+                StatsDAO().tags_changed(cursor, old_tags, new_tags)
+                cursor.execute("DELETE FROM recipe_tag WHERE recipe_id = %s", (recipe_id,))
+                TagDAO().add_tags(cursor, recipe_id, tags)
+
+            # Resized variants of the old image are stale, the original is served until new ones are made
+            if image_hash is not None:
+                cursor.execute("DELETE FROM recipe_image_variant WHERE recipe_id = %s", (recipe_id,))
+
+            self.record_changes(cursor, [recipe_id])
+            conn.commit()
+
+            # Drop the cached copy and re-index the text
+            conn.after_commit(lambda: (recipe_cache.invalidate(recipe_id), fragment_cache.invalidate(recipe_id), search_index.add(*document),
+                                     suggest_index.replace(recipe_id, document[1], old_tags, new_tags)))
+        return True
+
+    def delete_recipe(self, recipe_id:int) -> bool:
+        """Deletes a recipe along with its tags, image variants and every cookbook and try list entry of it.\n
+        returns: True if the recipe was deleted"""
+        assert isinstance(recipe_id, int)
+
+        with get_db_connection() as conn, conn.cursor() as cursor:
+            cursor.execute("SELECT tag FROM recipe_tag WHERE recipe_id = %s", (recipe_id,))
+            tags = [tag for tag, in cursor.fetchall()]
+
+            # Rows referencing the recipe go first because of the foreign keys
+            StatsDAO().recipe_deleted(cursor, recipe_id)
+            RecommendationDAO().delete_recipe(cursor, recipe_id)
+            ImageDAO().release_reference(cursor, recipe_id)
+            for table in ('recipe_image_variant', 'recipe_tag', 'personal_cookbook_entry', 'to_try_entry'):
+                cursor.execute(f"DELETE FROM {table} WHERE recipe_id = %s", (recipe_id,))
+            cursor.execute("DELETE FROM recipe WHERE recipe_id = %s", (recipe_id,))
+            deleted = cursor.rowcount > 0
+            if deleted:
+                self.record_changes(cursor, [recipe_id])
+            conn.commit()
+
+            # Drop the cached copy and the search entry
+            conn.after_commit(lambda: (recipe_cache.invalidate(recipe_id), fragment_cache.invalidate(recipe_id), search_index.remove(recipe_id),
+                                     suggest_index.remove(recipe_id, tags)))
+        return deleted
 
     def _convert_data_to_recipe__(self, recipe_data:tuple) -> Recipe:
-        recipe_id, recipe_name, date_created, recipe_image, recipe_description, instructions, tags, user_id = recipe_data
-        tags =  json.loads(tags)
-        recipe = Recipe(
-            recipe_id = recipe_id,
-            recipe_name = recipe_name,
-            date_created = date_created,
-            recipe_image = recipe_image,
-            recipe_description = recipe_description,
-            instructions = instructions,
-            tags = tags,
-            user_id = user_id
-        )
-        return recipe
\ No newline at end of file
+        return recipe_mapper.for_columns(RECIPE_COLUMN_NAMES)(recipe_data)
+
+# Builds Recipes from trusted rows without validating them again, unless STRICT_ROW_MAPPING is set
+recipe_mapper = RowMapper(Recipe, {'tags': json.loads}, strict=get_settings().strict_row_mapping)
+
+def recipe_change_feed() -> ChangeFeed:
+    """returns: A new reader of the recipe_change log, one for each in memory index that follows it"""
+    return ChangeFeed(load_range=lambda: RecipeDAO().retrieve_change_range(), load_changes=lambda after_change_id: RecipeDAO().retrieve_recipe_changes(after_change_id))
+
+# One search index per worker process, loaded from the database on the first search and kept up to date by refresh()
+search_index = SearchIndex(load_documents=lambda recipe_ids: RecipeDAO().retrieve_search_documents(recipe_ids), changes=recipe_change_feed())
+
+# One autocomplete index per worker process, ranked by how many cookbooks each recipe is saved in
+suggest_index = SuggestIndex(
+    load_names=lambda recipe_ids: RecipeDAO().retrieve_recipe_names(recipe_ids),
+    load_popularity=lambda: StatsDAO().retrieve_save_counts(),
+    load_tags=lambda: StatsDAO().retrieve_tag_counts(),
+    changes=recipe_change_feed()
+)
+
+# One read-through recipe cache per worker process, optionally backed by a shared tier
+recipe_cache = recipe_cache_from_env(load=lambda recipe_id: RecipeDAO()._load_recipe_by_id(recipe_id))
+
+# One cache of rendered list page rows per worker process
+fragment_cache = fragment_cache_from_env()
@@ -0,0 +1,200 @@
+from DAOs.GetConnection import get_db_connection, reads_replica
+
+# The most ids put in one IN (...) list
+IN_CHUNK_SIZE = 1000
+
+class RecommendationDAO():
+    def mark_stale(self, cursor, recipe_ids:list[int]):
+        """Queues recipes for the recommender to recompute their neighbours, using the caller's cursor
+        so the queue is committed in the same transaction as the change that caused it."""
+        if recipe_ids:
+            query = "INSERT INTO recipe_similarity_stale (recipe_id) VALUES (%s)"
+            cursor.executemany(query, [(recipe_id,) for recipe_id in dict.fromkeys(recipe_ids)])
+
+    def mark_user_stale(self, cursor, user_id:int, recipe_id:int):
+        """Queues a recipe a user just saved or removed, and the user, since how often the recipe is saved together
+        with each of the user's other recipes has changed. The recommender expands the user into those recipes."""
+        self.mark_stale(cursor, [recipe_id])
+        cursor.execute("INSERT INTO recipe_similarity_stale_user (user_id) VALUES (%s)", (user_id,))
+
+    def expand_stale_users(self, limit:int) -> int:
+        """Takes up to limit users off their queue and queues every recipe they saved instead, in one transaction.\n
+        returns: How many users were taken"""
+        with get_db_connection() as conn, conn.cursor() as cursor:
+            cursor.execute("SELECT stale_id, user_id FROM recipe_similarity_stale_user ORDER BY stale_id LIMIT %s", (limit,))
+            rows = cursor.fetchall()
+            if rows:
+                user_ids = list({user_id for _, user_id in rows})
+                placeholders = ', '.join(['%s'] * len(user_ids))
+                cursor.execute(f"""
+                INSERT INTO recipe_similarity_stale (recipe_id)
+                SELECT recipe_id FROM personal_cookbook_entry WHERE user_id IN ({placeholders})
+                UNION
+                SELECT recipe_id FROM to_try_entry WHERE user_id IN ({placeholders})
+                """, user_ids * 2)
+                placeholders = ', '.join(['%s'] * len(rows))
+                cursor.execute(f"DELETE FROM recipe_similarity_stale_user WHERE stale_id IN ({placeholders})", [stale_id for stale_id, _ in rows])
+            conn.commit()
+        return len(rows)
+
+    def retrieve_stale(self, limit:int | None = None) -> tuple[list[int], list[int]]:
+        """Reads up to limit rows of the queue (all of them if limit is None), oldest first. They stay queued until
+        replace_neighbours() stores the recomputed neighbours, so a refresh that fails leaves them for the next one.\n
+        returns: (the stale_ids of the rows read, their distinct recipe_ids)"""
+        query = "SELECT stale_id, recipe_id FROM recipe_similarity_stale ORDER BY stale_id"
+        params = []
+        if limit is not None:
+            query += " LIMIT %s"
+            params.append(limit)
+        with get_db_connection() as conn, conn.cursor() as cursor:
+            cursor.execute(query, params)
+            rows = cursor.fetchall()
+        return [stale_id for stale_id, _ in rows], list(dict.fromkeys(recipe_id for _, recipe_id in rows))
+
+    def retrieve_interactions(self) -> list[tuple[int, int, str]]:
+        """Retrieves every cookbook and try list entry, for the recommender.\n
+        returns: A list of (user_id, recipe_id, list name)"""
+        query = """
+        SELECT user_id, recipe_id, 'cookbook' FROM personal_cookbook_entry
+        UNION ALL
+        SELECT user_id, recipe_id, 'try_list' FROM to_try_entry
+        """
+        with get_db_connection() as conn, conn.cursor() as cursor:
+            cursor.execute(query)
+            return cursor.fetchall()
+
+    def retrieve_co_saved_interactions(self, recipe_ids:list[int]) -> list[tuple[int, int, str]]:
+        """Retrieves the cookbook and try list entries of recipe_ids and of every recipe saved by someone who saved one of them.
+        That is every entry the neighbours of recipe_ids depend on, the similarity of two recipes nobody saved together being 0.\n
+        returns: A list of (user_id, recipe_id, list name)"""
+        if not recipe_ids:
+            return []
+        placeholders = ', '.join(['%s'] * len(recipe_ids))
+        savers = f"SELECT user_id FROM personal_cookbook_entry WHERE recipe_id IN ({placeholders}) UNION SELECT user_id FROM to_try_entry WHERE recipe_id IN ({placeholders})"
+        with get_db_connection() as conn, conn.cursor() as cursor:
+            cursor.execute(f"""
+            SELECT recipe_id FROM personal_cookbook_entry WHERE user_id IN ({savers})
+            UNION
+            SELECT recipe_id FROM to_try_entry WHERE user_id IN ({savers})
+            """, list(recipe_ids) * 4)
+            related = sorted(set(recipe_ids) | {recipe_id for recipe_id, in cursor.fetchall()})
+
+            # Every entry of the related recipes, since their similarity is scaled by how many users saved each of them
+            interactions = []
+            for start in range(0, len(related), IN_CHUNK_SIZE):
+                chunk = related[start:start + IN_CHUNK_SIZE]
+                placeholders = ', '.join(['%s'] * len(chunk))
+                cursor.execute(f"""
+                SELECT user_id, recipe_id, 'cookbook' FROM personal_cookbook_entry WHERE recipe_id IN ({placeholders})
+                UNION ALL
+                SELECT user_id, recipe_id, 'try_list' FROM to_try_entry WHERE recipe_id IN ({placeholders})
+                """, chunk * 2)
+                interactions.extend(cursor.fetchall())
+            return interactions
+
+    def retrieve_recipe_tags(self, recipe_ids:list[int] | None = None) -> list[tuple[int, str | None]]:
+        """Retrieves recipes with each of their tags, for the recommender. Recipes without tags appear once with None.\n
+        recipe_ids: The recipes to read, or None for every recipe\n
+        returns: A list of (recipe_id, tag)"""
+        query = "SELECT recipe.recipe_id, recipe_tag.tag FROM recipe LEFT JOIN recipe_tag ON recipe_tag.recipe_id = recipe.recipe_id"
+        with get_db_connection() as conn, conn.cursor() as cursor:
+            if recipe_ids is None:
+                cursor.execute(query)
+                return cursor.fetchall()
+            recipe_ids = sorted(set(recipe_ids))
+            rows = []
+            for start in range(0, len(recipe_ids), IN_CHUNK_SIZE):
+                chunk = recipe_ids[start:start + IN_CHUNK_SIZE]
+                placeholders = ', '.join(['%s'] * len(chunk))
+                cursor.execute(f"{query} WHERE recipe.recipe_id IN ({placeholders})", chunk)
+                rows.extend(cursor.fetchall())
+            return rows
+
+    def retrieve_tag_sharing_ids(self, recipe_ids:list[int]) -> set[int]:
+        """Finds the recipes that share at least one tag with one of recipe_ids, the only ones with a tag similarity to them,
+        through the (tag, recipe_id) index.\n
+        returns: A set of recipe_ids, including those of recipe_ids that have tags"""
+        recipe_ids = sorted(set(recipe_ids))
+        with get_db_connection() as conn, conn.cursor() as cursor:
+            tags = set()
+            for start in range(0, len(recipe_ids), IN_CHUNK_SIZE):
+                chunk = recipe_ids[start:start + IN_CHUNK_SIZE]
+                placeholders = ', '.join(['%s'] * len(chunk))
+                cursor.execute(f"SELECT DISTINCT tag FROM recipe_tag WHERE recipe_id IN ({placeholders})", chunk)
+                tags.update(tag for tag, in cursor.fetchall())
+            tags = sorted(tags)
+            sharing = set()
+            for start in range(0, len(tags), IN_CHUNK_SIZE):
+                chunk = tags[start:start + IN_CHUNK_SIZE]
+                placeholders = ', '.join(['%s'] * len(chunk))
+                cursor.execute(f"SELECT DISTINCT recipe_id FROM recipe_tag WHERE tag IN ({placeholders})", chunk)
+                sharing.update(recipe_id for recipe_id, in cursor.fetchall())
+            return sharing
+
+    def replace_neighbours(self, neighbours:dict[int, list[tuple[int, float]]], stale_ids:list[int] = ()):
+        """Stores the most similar recipes of each recipe in neighbours, replacing the ones stored before,
+        and takes the queue rows they were computed for off the queue in the same transaction.\n
+        neighbours: A dict of recipe_id -> list of (similar_recipe_id, score)\n
+        stale_ids: The queue rows from retrieve_stale() that are done once these neighbours are stored"""
+        rows = [(recipe_id, similar_recipe_id, score) for recipe_id, similar in neighbours.items() for similar_recipe_id, score in similar]
+        with get_db_connection() as conn, conn.cursor() as cursor:
+            if neighbours:
+                placeholders = ', '.join(['%s'] * len(neighbours))
+                cursor.execute(f"DELETE FROM recipe_similarity WHERE recipe_id IN ({placeholders})", list(neighbours))
+            if rows:
+                cursor.executemany("INSERT INTO recipe_similarity (recipe_id, similar_recipe_id, score) VALUES (%s, %s, %s)", rows)
+            # Only the rows read, a recipe queued again meanwhile stays queued
+            stale_ids = list(stale_ids)
+            for start in range(0, len(stale_ids), IN_CHUNK_SIZE):
+                chunk = stale_ids[start:start + IN_CHUNK_SIZE]
+                placeholders = ', '.join(['%s'] * len(chunk))
+                cursor.execute(f"DELETE FROM recipe_similarity_stale WHERE stale_id IN ({placeholders})", chunk)
+            conn.commit()
+
+    def delete_recipe(self, cursor, recipe_id:int):
+        """Removes a recipe that is about to be deleted from the similarity tables using the caller's cursor,
+        and queues the recipes that listed it so they get a replacement neighbour."""
+        cursor.execute("""
+        INSERT INTO recipe_similarity_stale (recipe_id)
+        SELECT recipe_id FROM recipe_similarity WHERE similar_recipe_id = %s AND recipe_id <> %s
+        """, (recipe_id, recipe_id))
+        cursor.execute("DELETE FROM recipe_similarity WHERE recipe_id = %s OR similar_recipe_id = %s", (recipe_id, recipe_id))
+        cursor.execute("DELETE FROM recipe_similarity_stale WHERE recipe_id = %s", (recipe_id,))
+
+    @reads_replica
+    def retrieve_similar_recipes(self, recipe_id:int, limit:int) -> list[tuple[int, str]]:
+        """Retrieves the precomputed most similar recipes of a recipe.\n
+        returns: A list of (recipe_id, recipe_name), most similar first"""
+        assert isinstance(recipe_id, int)
+        query = """
+        SELECT recipe.recipe_id, recipe.recipe_name
+        FROM recipe_similarity JOIN recipe ON recipe.recipe_id = recipe_similarity.similar_recipe_id
+        WHERE recipe_similarity.recipe_id = %s
+        ORDER BY recipe_similarity.score DESC, recipe.recipe_id
+        LIMIT %s
+        """
+        with get_db_connection() as conn, conn.cursor() as cursor:
+            cursor.execute(query, (recipe_id, limit))
+            return cursor.fetchall()
+
+    @reads_replica
+    def retrieve_recommended_recipes(self, user_id:int, limit:int) -> list[tuple[int, str]]:
+        """Recommends recipes for a user by adding up the precomputed similarity of every recipe in their cookbook
+        to each recipe they have not saved yet.\n
+        returns: A list of (recipe_id, recipe_name), best first"""
+        assert isinstance(user_id, int)
+        query = """
+        SELECT recipe.recipe_id, recipe.recipe_name
+        FROM personal_cookbook_entry
+        JOIN recipe_similarity ON recipe_similarity.recipe_id = personal_cookbook_entry.recipe_id
+        JOIN recipe ON recipe.recipe_id = recipe_similarity.similar_recipe_id
+        WHERE personal_cookbook_entry.user_id = %s
+        AND recipe_similarity.similar_recipe_id NOT IN (SELECT recipe_id FROM personal_cookbook_entry WHERE user_id = %s)
+        AND recipe_similarity.similar_recipe_id NOT IN (SELECT recipe_id FROM to_try_entry WHERE user_id = %s)
+        GROUP BY recipe.recipe_id, recipe.recipe_name
+        ORDER BY SUM(recipe_similarity.score) DESC, recipe.recipe_id
+        LIMIT %s
+        """
+        with get_db_connection() as conn, conn.cursor() as cursor:
+            cursor.execute(query, (user_id, user_id, user_id, limit))
+            return cursor.fetchall()
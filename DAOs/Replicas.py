@@ -0,0 +1,90 @@
+import time
+import random
+import logging
+import threading
+
+from DAOs.ConnectionPool import ConnectionPool
+
+logger = logging.getLogger(__name__)
+
+# Replicas report their lag in whole seconds, so a write is only assumed to have arrived this much later still
+LAG_MARGIN_SECONDS = 1.0
+
+class Replica():
+    def __init__(self, name:str, backend, pool:ConnectionPool):
+        """One read replica, with its own connection pool and its last measured lag."""
+        self.name = name
+        self.backend = backend
+        self.pool = pool
+        self.lag = None  # Seconds behind the primary, None until measured or while replication is broken
+        self.measured_at = 0.0
+
+    def behind(self, now:float) -> float | None:
+        """returns: The most the replica can be behind the primary now, assuming it stalled right after its lag was measured"""
+        if self.lag is None:
+            return None
+        return self.lag + (now - self.measured_at)
+
+class ReplicaSet():
+    def __init__(self, replicas:list[Replica], max_lag:float):
+        """The read replicas of the primary database. Reads are spread over the replicas that are less than
+        max_lag seconds behind, and only go to one that has caught up with the caller's last write.\n
+        max_lag: Replicas further behind than this many seconds get no reads until they catch up"""
+        self.replicas = replicas
+        self.max_lag = max_lag
+        self._lock = threading.Lock()
+        self._counters = {'replica_reads': 0, 'pinned_reads': 0, 'fallback_reads': 0}
+
+    def check_lag(self):
+        """Measures how far behind the primary each replica is. Run it every few seconds."""
+        for replica in self.replicas:
+            lag = None
+            try:
+                conn = replica.pool.acquire()
+            except Exception:
+                logger.warning('Could not connect to replica %s', replica.name, exc_info=True)
+            else:
+                discard = False
+                try:
+                    lag = replica.backend.replica_lag(conn)
+                    if lag is None:
+                        logger.warning('Replica %s is not replicating, sending its reads to the primary', replica.name)
+                except Exception:
+                    discard = True
+                    logger.warning('Could not read the lag of replica %s', replica.name, exc_info=True)
+                finally:
+                    replica.pool.release(conn, discard=discard)
+            replica.lag, replica.measured_at = lag, time.monotonic()
+
+    def choose(self, last_write_age:float | None) -> Replica | None:
+        """Picks a replica for a read.\n
+        last_write_age: How many seconds ago the caller last wrote to the primary, or None if it has not\n
+        returns: A replica that is recent enough, or None if the read has to go to the primary"""
+        now = time.monotonic()
+        usable, caught_up = [], []
+        for replica in self.replicas:
+            behind = replica.behind(now)
+            if behind is None or behind > self.max_lag:
+                continue
+            usable.append(replica)
+            if last_write_age is None or behind + LAG_MARGIN_SECONDS < last_write_age:
+                caught_up.append(replica)
+
+        if caught_up:
+            self._count('replica_reads')
+            return random.choice(caught_up)
+        # A replica that has not caught up with the caller's write yet would show them stale data
+        self._count('pinned_reads' if usable else 'fallback_reads')
+        return None
+
+    def stats(self) -> dict:
+        """returns: How reads were routed, and the last measured lag of each replica (-1 if unknown)"""
+        with self._lock:
+            stats = dict(self._counters)
+        for index, replica in enumerate(self.replicas):
+            stats[f'replica{index}_lag_seconds'] = -1 if replica.lag is None else replica.lag
+        return stats
+
+    def _count(self, counter:str):
+        with self._lock:
+            self._counters[counter] += 1
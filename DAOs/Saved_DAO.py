@@ -0,0 +1,36 @@
+from DAOs.GetConnection import get_db_connection
+from Services.SavedSetCache import SavedSetCache
+
+class SavedDAO():
+    def retrieve_saved_flags(self, user_id:int, recipe_ids:list[int]) -> dict[int, tuple[bool, bool]]:
+        """Checks the try list and personal cookbook of a user for many recipes at once.\n
+        returns: A dict of recipe_id -> (saved_try, saved_cb) for every id in recipe_ids"""
+
+        # Check the args
+        assert isinstance(user_id, int)
+        assert all(isinstance(recipe_id, int) for recipe_id in recipe_ids)
+
+        # Answered from the user's cached sets, which cost at most one query to load
+        saved = saved_set_cache.get(user_id)
+        return {recipe_id: (recipe_id in saved['try_list'], recipe_id in saved['cookbook']) for recipe_id in recipe_ids}
+
+    def retrieve_saved_sets(self, user_id:int) -> tuple[set[int], set[int]]:
+        """Retrieves every recipe_id a user saved to their cookbook and try list, in one query.\n
+        returns: (cookbook recipe_ids, try list recipe_ids)"""
+        assert isinstance(user_id, int)
+        query = """
+        SELECT 'cookbook', recipe_id FROM personal_cookbook_entry WHERE user_id = %s
+        UNION ALL
+        SELECT 'try_list', recipe_id FROM to_try_entry WHERE user_id = %s
+        """
+        with get_db_connection() as conn, conn.cursor() as cursor:
+            cursor.execute(query, (user_id, user_id))
+            response = cursor.fetchall()
+
+        cookbook, try_list = set(), set()
+        for list_name, recipe_id in response:
+            (cookbook if list_name == 'cookbook' else try_list).add(recipe_id)
+        return cookbook, try_list
+
+# One cache of saved recipe_ids per worker process
+saved_set_cache = SavedSetCache(load=lambda user_id: SavedDAO().retrieve_saved_sets(user_id))
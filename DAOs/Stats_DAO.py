@@ -0,0 +1,157 @@
+import random
+
+from DAOs.GetConnection import get_db_connection, reads_replica
+
+# The counter column of recipe_stats and the site_stats total of each saved list
+LIST_COUNTERS = {'cookbook': ('cookbook_saves', 'cookbook_entries'), 'try_list': ('try_saves', 'try_entries')}
+SITE_TOTALS = ('users', 'recipes', 'cookbook_entries', 'try_entries')
+# Rows each site total is spread over, so concurrent saves rarely wait for each other's row lock. The total is their sum.
+SITE_STRIPES = 16
+
+class StatsDAO():
+    """Keeps the counter tables behind the /stats page. The write paths update them with the caller's cursor,
+    so every counter is committed in the same transaction as the change it counts."""
+
+    def recipe_created(self, cursor, recipe_id:int, user_id:int, tags:list[str]):
+        cursor.execute("INSERT INTO recipe_stats (recipe_id) VALUES (%s)", (recipe_id,))
+        self._add(cursor, 'author_stats', 'user_id', user_id, 'recipes', 1)
+        self.tags_changed(cursor, [], tags)
+        self._add_total(cursor, 'recipes', 1)
+
+    def recipe_deleted(self, cursor, recipe_id:int):
+        """Takes a recipe out of the counters. Call it before its tags and entries are deleted."""
+        cursor.execute("SELECT user_id FROM recipe WHERE recipe_id = %s", (recipe_id,))
+        author = cursor.fetchone()
+        if author is None:
+            return
+        cursor.execute("SELECT tag FROM recipe_tag WHERE recipe_id = %s", (recipe_id,))
+        tags = [tag for tag, in cursor.fetchall()]
+        cursor.execute("SELECT cookbook_saves, try_saves FROM recipe_stats WHERE recipe_id = %s", (recipe_id,))
+        saves = cursor.fetchone() or (0, 0)
+
+        if author[0] is not None:
+            self._add(cursor, 'author_stats', 'user_id', author[0], 'recipes', -1)
+        self.tags_changed(cursor, tags, [])
+        self._add_total(cursor, 'recipes', -1)
+        self._add_total(cursor, 'cookbook_entries', -saves[0])
+        self._add_total(cursor, 'try_entries', -saves[1])
+        cursor.execute("DELETE FROM recipe_stats WHERE recipe_id = %s", (recipe_id,))
+
+    def tags_changed(self, cursor, old_tags:list[str], new_tags:list[str]):
+        old_tags, new_tags = set(old_tags), set(new_tags)
+        # In one sorted pass, so concurrent transactions lock the rows of shared tags in the same order and cannot deadlock
+        for tag in sorted(old_tags ^ new_tags):
+            self._add(cursor, 'tag_stats', 'tag', tag, 'recipes', 1 if tag in new_tags else -1)
+
+    def entry_changed(self, cursor, list_name:str, recipe_id:int, amount:int):
+        """Counts a recipe being added to (amount 1) or removed from (amount -1) a cookbook or try list."""
+        column, total = LIST_COUNTERS[list_name]
+        self._add(cursor, 'recipe_stats', 'recipe_id', recipe_id, column, amount)
+        self._add_total(cursor, total, amount)
+
+    def user_created(self, cursor):
+        self._add_total(cursor, 'users', 1)
+
+    def reconcile(self):
+        """Recounts every counter from the tables they describe, fixing any drift (e.g. from rows changed by hand or by a bulk import).
+        It rewrites every counter row, so run it from the command line or cron rather than from the workers."""
+        statements = [
+            "DELETE FROM recipe_stats",
+            """
+            INSERT INTO recipe_stats (recipe_id, cookbook_saves, try_saves)
+            SELECT recipe_id,
+                   (SELECT COUNT(*) FROM personal_cookbook_entry WHERE personal_cookbook_entry.recipe_id = recipe.recipe_id),
+                   (SELECT COUNT(*) FROM to_try_entry WHERE to_try_entry.recipe_id = recipe.recipe_id)
+            FROM recipe
+            """,
+            "DELETE FROM tag_stats",
+            "INSERT INTO tag_stats (tag, recipes) SELECT tag, COUNT(*) FROM recipe_tag GROUP BY tag",
+            "DELETE FROM author_stats",
+            "INSERT INTO author_stats (user_id, recipes) SELECT user_id, COUNT(*) FROM recipe WHERE user_id IS NOT NULL GROUP BY user_id",
+            "DELETE FROM site_stats",
+            """
+            INSERT INTO site_stats (name, value)
+            SELECT 'users', COUNT(*) FROM user
+            UNION ALL SELECT 'recipes', COUNT(*) FROM recipe
+            UNION ALL SELECT 'cookbook_entries', COUNT(*) FROM personal_cookbook_entry
+            UNION ALL SELECT 'try_entries', COUNT(*) FROM to_try_entry
+            """,
+        ]
+        with get_db_connection() as conn, conn.cursor() as cursor:
+            try:
+                for statement in statements:
+                    cursor.execute(statement)
+                conn.commit()
+            except Exception:
+                conn.rollback()
+                raise
+
+    @reads_replica
+    def retrieve_totals(self) -> dict[str, int]:
+        """returns: A dict of total name -> count, for every name in SITE_TOTALS"""
+        with get_db_connection() as conn, conn.cursor() as cursor:
+            cursor.execute("SELECT name, SUM(value) FROM site_stats GROUP BY name")
+            totals = {name: value for name, value in cursor.fetchall()}
+        return {name: int(totals.get(name) or 0) for name in SITE_TOTALS}
+
+    @reads_replica
+    def retrieve_most_saved(self, list_name:str, limit:int) -> list[tuple[int, str, int]]:
+        """Retrieves the recipes in the most cookbooks (list_name 'cookbook') or try lists ('try_list'), read off the counter's index.\n
+        returns: A list of (recipe_id, recipe_name, count), most saved first"""
+        column, _ = LIST_COUNTERS[list_name]
+        query = f"""
+        SELECT recipe.recipe_id, recipe.recipe_name, recipe_stats.{column}
+        FROM recipe_stats JOIN recipe ON recipe.recipe_id = recipe_stats.recipe_id
+        WHERE recipe_stats.{column} > 0
+        ORDER BY recipe_stats.{column} DESC, recipe_stats.recipe_id DESC
+        LIMIT %s
+        """
+        with get_db_connection() as conn, conn.cursor() as cursor:
+            cursor.execute(query, (limit,))
+            return cursor.fetchall()
+
+    @reads_replica
+    def retrieve_top_tags(self, limit:int) -> list[tuple[str, int]]:
+        """returns: A list of (tag, number of recipes), most used first"""
+        with get_db_connection() as conn, conn.cursor() as cursor:
+            cursor.execute("SELECT tag, recipes FROM tag_stats WHERE recipes > 0 ORDER BY recipes DESC, tag LIMIT %s", (limit,))
+            return cursor.fetchall()
+
+    @reads_replica
+    def retrieve_top_authors(self, limit:int) -> list[tuple[str, int]]:
+        """returns: A list of (username, number of recipes), most recipes first"""
+        query = """
+        SELECT user.username, author_stats.recipes
+        FROM author_stats JOIN user ON user.user_id = author_stats.user_id
+        WHERE author_stats.recipes > 0
+        ORDER BY author_stats.recipes DESC, author_stats.user_id DESC
+        LIMIT %s
+        """
+        with get_db_connection() as conn, conn.cursor() as cursor:
+            cursor.execute(query, (limit,))
+            return cursor.fetchall()
+
+    def retrieve_save_counts(self) -> dict[int, int]:
+        """Reads how many personal cookbooks each recipe is saved in off its counter, for ranking suggestions.\n
+        returns: A dict of recipe_id -> count, leaving out recipes nobody saved"""
+        with get_db_connection() as conn, conn.cursor() as cursor:
+            cursor.execute("SELECT recipe_id, cookbook_saves FROM recipe_stats WHERE cookbook_saves > 0")
+            return {recipe_id: count for recipe_id, count in cursor.fetchall()}
+
+    def retrieve_tag_counts(self) -> dict[str, int]:
+        """returns: A dict of tag -> number of recipes with it, for suggesting tags"""
+        with get_db_connection() as conn, conn.cursor() as cursor:
+            cursor.execute("SELECT tag, recipes FROM tag_stats WHERE recipes > 0")
+            return {tag: count for tag, count in cursor.fetchall()}
+
+    def _add(self, cursor, table:str, key_column:str, key, column:str, amount:int):
+        # Two statements rather than an upsert, since MySQL and SQLite spell upserts differently. Only the no-op form of
+        # ON DUPLICATE KEY UPDATE is translated for SQLite, and unlike INSERT IGNORE it only skips the duplicate key
+        cursor.execute(f"INSERT INTO {table} ({key_column}) VALUES (%s) ON DUPLICATE KEY UPDATE {key_column} = {key_column}", (key,))
+        cursor.execute(f"UPDATE {table} SET {column} = {column} + %s WHERE {key_column} = %s", (amount, key))
+
+    def _add_total(self, cursor, name:str, amount:int):
+        if amount:
+            stripe = random.randrange(SITE_STRIPES)
+            cursor.execute("INSERT INTO site_stats (name, stripe) VALUES (%s, %s) ON DUPLICATE KEY UPDATE stripe = stripe", (name, stripe))
+            cursor.execute("UPDATE site_stats SET value = value + %s WHERE name = %s AND stripe = %s", (amount, name, stripe))
@@ -0,0 +1,206 @@
+import os
+import re
+import sqlite3
+import threading
+from datetime import date
+from functools import lru_cache
+
+SCRIPTS_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'sql_scripts')
+
+class MySQLBackend():
+    """The MySQL server the app was written for. The DAOs' SQL is passed through as is."""
+    name = 'mysql'
+    schema_script = os.path.join(SCRIPTS_DIR, 'create.sql')
+
+    def __init__(self, connect_args:dict):
+        import mysql.connector  # Only needed when DB_BACKEND is mysql
+        self._connector = mysql.connector
+        self.connect_args = connect_args
+
+    def connect(self):
+        return self._connector.connect(**self.connect_args)
+
+    def check(self, conn) -> bool:
+        return conn.is_connected()
+
+    def cursor(self, conn, *args, **kwargs):
+        return conn.cursor(*args, **kwargs)
+
+    def replica(self, address:str) -> 'MySQLBackend':
+        """returns: A backend for the replica at address (host or host:port), with the same user and database"""
+        host, _, port = address.strip().partition(':')
+        return MySQLBackend(dict(self.connect_args, host=host, port=int(port or 3306)))
+
+    def replica_lag(self, conn) -> float | None:
+        """returns: How many seconds the replica is behind its primary, or None if it is not replicating"""
+        cursor = conn.cursor(dictionary=True)
+        try:
+            try:
+                cursor.execute("SHOW REPLICA STATUS")
+            except self._connector.Error:
+                cursor.execute("SHOW SLAVE STATUS")  # Servers older than MySQL 8.0.22
+            status = cursor.fetchone()
+        finally:
+            cursor.close()
+        if not status:
+            return None
+        lag = status.get('Seconds_Behind_Source', status.get('Seconds_Behind_Master'))
+        return None if lag is None else float(lag)
+
+    def try_lock(self, conn, name:str) -> bool:
+        """Takes a lock named name that every connection to the server shares, without waiting, and holds it until unlock() or until conn closes.\n
+        returns: True if the lock was taken, False if another connection holds it"""
+        cursor = conn.cursor()
+        try:
+            cursor.execute("SELECT GET_LOCK(%s, 0)", (name,))
+            return cursor.fetchone()[0] == 1
+        finally:
+            cursor.close()
+
+    def unlock(self, conn, name:str):
+        cursor = conn.cursor()
+        try:
+            cursor.execute("SELECT RELEASE_LOCK(%s)", (name,))
+            cursor.fetchone()
+        finally:
+            cursor.close()
+
+    def has_consecutive_insert_ids(self, conn) -> bool:
+        """returns: True if a multi-row INSERT gets consecutive ids, starting at cursor.lastrowid"""
+        # Interleaved lock mode (2) may hand out gaps within one multi-row insert
+        cursor = conn.cursor()
+        try:
+            cursor.execute("SELECT @@innodb_autoinc_lock_mode")
+            return cursor.fetchone()[0] in (0, 1)
+        finally:
+            cursor.close()
+
+class SQLiteBackend():
+    """An embedded SQLite database file in WAL mode, for single server deployments and for running
+    the app with no database server at all. The DAOs' MySQL flavoured SQL is translated on the fly."""
+    name = 'sqlite'
+    schema_script = os.path.join(SCRIPTS_DIR, 'create_sqlite.sql')
+
+    def __init__(self, path:str, read_only:bool=False):
+        if path == ':memory:':
+            raise ValueError('Every pooled connection would get its own empty database, use a file path for DB_PATH')
+        self.path = path
+        self.read_only = read_only
+        self._schema_lock = threading.Lock()
+        self._schema_checked = False
+        self._lock_files_lock = threading.Lock()
+        self._lock_files = {}  # Lock name -> the open file holding it
+
+    def connect(self):
+        # Pooled connections move between threads, but only one thread uses a connection at a time
+        conn = sqlite3.connect(self.path, timeout=10.0, detect_types=sqlite3.PARSE_DECLTYPES, check_same_thread=False)
+        conn.execute("PRAGMA journal_mode = WAL")  # Readers never block the writer, or the other way around
+        conn.execute("PRAGMA synchronous = NORMAL")  # Safe in WAL mode, and skips an fsync per commit
+        conn.execute("PRAGMA foreign_keys = ON")
+        if self.read_only:
+            conn.execute("PRAGMA query_only = ON")  # A write sent to a replica fails instead of going missing
+            return conn
+        self._create_schema(conn)
+        return conn
+
+    def check(self, conn) -> bool:
+        conn.execute("SELECT 1")
+        return True
+
+    def cursor(self, conn, *args, **kwargs):
+        # buffered= and the like mean nothing here, SQLite reads rows straight from the file
+        return SQLiteCursor(conn.cursor())
+
+    def replica(self, address:str) -> 'SQLiteBackend':
+        """returns: A read only backend for a copy of the database file at address, kept up to date by some other tool"""
+        return SQLiteBackend(address.strip(), read_only=True)
+
+    def replica_lag(self, conn) -> float | None:
+        # A file has no replication status, whatever copies it decides how fresh it is
+        return 0.0
+
+    def try_lock(self, conn, name:str) -> bool:
+        """Takes a lock named name that every process using the database file shares, without waiting: a lock on a file next to it.\n
+        returns: True if the lock was taken, False if another process holds it"""
+        import fcntl  # Only needed for locks, and only on the systems a SQLite deployment runs on
+        file = open(f'{self.path}.{name}.lock', 'a')
+        try:
+            fcntl.flock(file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            file.close()
+            return False
+        with self._lock_files_lock:
+            self._lock_files[name] = file
+        return True
+
+    def unlock(self, conn, name:str):
+        with self._lock_files_lock:
+            file = self._lock_files.pop(name, None)
+        if file is not None:
+            file.close()  # Closing the file releases its lock
+
+    def has_consecutive_insert_ids(self, conn) -> bool:
+        # sqlite3 does not set lastrowid after executemany
+        return False
+
+    def _create_schema(self, conn):
+        """Creates the tables the first time a new database file is opened."""
+        if self._schema_checked:
+            return
+        with self._schema_lock:
+            if self._schema_checked:
+                return
+            if conn.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'recipe'").fetchone() is None:
+                with open(self.schema_script) as file:
+                    conn.executescript(file.read())
+            self._schema_checked = True
+
+class SQLiteCursor():
+    """A sqlite3 cursor that accepts the DAOs' MySQL flavoured SQL."""
+    def __init__(self, cursor):
+        self._cursor = cursor
+
+    def execute(self, operation, params=None):
+        return self._cursor.execute(translate_to_sqlite(operation), params or ())
+
+    def executemany(self, operation, seq_params):
+        return self._cursor.executemany(translate_to_sqlite(operation), seq_params)
+
+    def __iter__(self):
+        return iter(self._cursor)
+
+    def __getattr__(self, name):
+        return getattr(self._cursor, name)
+
+_TRANSLATIONS = [
+    (re.compile(r'%s'), '?'),
+    (re.compile(r'\bINSERT\s+IGNORE\b', re.IGNORECASE), 'INSERT OR IGNORE'),
+    (re.compile(r'\bON\s+DUPLICATE\s+KEY\s+UPDATE\s+(\w+)\s*=\s*\1$', re.IGNORECASE), 'ON CONFLICT DO NOTHING'),  # The no-op upsert
+    (re.compile(r'\bNOW\(\)', re.IGNORECASE), 'CURRENT_DATE'),  # Only ever stored in DATE columns
+]
+
+@lru_cache(maxsize=1024)
+def translate_to_sqlite(statement:str) -> str:
+    """Rewrites the MySQL only parts of a statement. REPLACE INTO, LIMIT, SUBSTR and row values already mean the same in both."""
+    for pattern, replacement in _TRANSLATIONS:
+        statement = pattern.sub(replacement, statement)
+    return statement
+
+# DATE columns are stored as ISO text and read back as dates, like MySQL returns them
+sqlite3.register_adapter(date, date.isoformat)
+sqlite3.register_converter('DATE', lambda value: date.fromisoformat(value.decode()[:10]))
+
+def backend_from_settings(settings):
+    """Builds the backend named by DB_BACKEND: mysql (the default, using DB_HOST, DB_USER, DB_PASSWORD and DB_DATABASE)
+    or sqlite (using the file at DB_PATH)."""
+    if settings.db_backend == 'mysql':
+        return MySQLBackend(dict(
+            host=settings.db_host,
+            user=settings.db_user,
+            password=settings.db_password,
+            database=settings.db_database,
+            buffered=True  # Connections are shared between DAOs, so never leave unread rows behind
+        ))
+    if settings.db_backend == 'sqlite':
+        return SQLiteBackend(settings.db_path)
+    raise ValueError(f'Unsupported DB_BACKEND: {settings.db_backend}')
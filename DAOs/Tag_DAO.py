@@ -0,0 +1,53 @@
+from DAOs.GetConnection import get_db_connection, reads_replica
+
+class TagDAO():
+    def add_tags(self, cursor, recipe_id:int, tags:list[str]):
+        """Adds the tags of a recipe to the recipe_tag table using the caller's cursor,
+        so they are committed in the same transaction as the recipe itself."""
+        if tags:
+            query = "INSERT INTO recipe_tag (recipe_id, tag) VALUES (%s, %s)"
+            cursor.executemany(query, [(recipe_id, tag) for tag in dict.fromkeys(tags)])
+
+    @reads_replica
+    def retrieve_recipe_ids_by_tags(self, tags:list[str], match_all:bool=True) -> list[int]:
+        """Finds the recipes tagged with all (or any) of the tags, using only the recipe_tag index.\n
+        returns: A list of recipe_ids in ascending order"""
+
+        # Check the args
+        assert all(isinstance(tag, str) for tag in tags)
+        tags = list(dict.fromkeys(tags))
+        if not tags:
+            return []
+
+        # Create the query, with a HAVING clause when every tag is required
+        placeholders = ', '.join(['%s'] * len(tags))
+        query = f"SELECT recipe_id FROM recipe_tag WHERE tag IN ({placeholders}) GROUP BY recipe_id"
+        params = list(tags)
+        if match_all:
+            query += " HAVING COUNT(*) = %s"
+            params.append(len(tags))
+        query += " ORDER BY recipe_id"
+
+        with get_db_connection() as conn, conn.cursor() as cursor:
+            cursor.execute(query, params)
+            return [recipe_id for recipe_id, in cursor.fetchall()]
+
+    @reads_replica
+    def retrieve_tag_counts(self, recipe_ids:list[int] | None) -> dict[str, int]:
+        """Counts how many of the given recipes (or of all recipes, if recipe_ids is None) carry each tag, for showing search facets.\n
+        returns: A dict of tag -> count, most common tag first"""
+
+        # Check the args
+        if recipe_ids is None:
+            recipe_filter, params = "", ()
+        else:
+            assert all(isinstance(recipe_id, int) for recipe_id in recipe_ids)
+            if not recipe_ids:
+                return {}
+            placeholders = ', '.join(['%s'] * len(recipe_ids))
+            recipe_filter, params = f"WHERE recipe_id IN ({placeholders})", tuple(recipe_ids)
+
+        query = f"SELECT tag, COUNT(*) FROM recipe_tag {recipe_filter} GROUP BY tag ORDER BY COUNT(*) DESC, tag"
+        with get_db_connection() as conn, conn.cursor() as cursor:
+            cursor.execute(query, params)
+            return {tag: count for tag, count in cursor.fetchall()}
@@ -0,0 +1,23 @@
+from DAOs.GetConnection import get_db_connection, _unit_connection
+
+class UnitOfWork():
+    """Runs every DAO call made inside it on one connection, in one transaction, with one commit.\n
+    Usage:\n
+        with UnitOfWork():
+            PcbDAO().add_new_entry(user_id, recipe_id)
+            TryDAO().delete_recipe(user_id, recipe_id)\n
+    If the block raises (or a DAO rolls back) nothing is committed, and committed stays False. Units can be nested;
+    only the outermost one commits."""
+    def __enter__(self):
+        self.committed = False
+        self.conn = get_db_connection()
+        self._token = _unit_connection.set(self.conn)
+        self.conn.begin_unit()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        try:
+            self.committed = self.conn.end_unit(commit=exc_type is None)
+        finally:
+            _unit_connection.reset(self._token)
+            self.conn.close()
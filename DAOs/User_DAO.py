@@ -1,5 +1,8 @@
 from DAOs.GetConnection import get_db_connection
+from DAOs.Stats_DAO import StatsDAO
+from DAOs.RowMapper import RowMapper
 from Models.User import User
+from Services.Settings import get_settings
 import hashlib
 
 #testing User Authentication
@@ -21,16 +24,8 @@ class UserDAO():
             user_data = cursor.fetchone()
             if not user_data:
                 return None
-            user = User(
-                user_id=user_data[0],
-                username=user_data[1],
-                user_email=user_data[2],
-                first_name=user_data[3],
-                last_name=user_data[4],
-                password_hash=user_data[5],
-                date_joined=user_data[6]
-            )
-            return user
+            # Mapped by the column names the query returned, so SELECT * keeps working if columns are added
+            return user_mapper.for_cursor(cursor)(user_data)
     
     def is_username_taken(self, username):
         # Establish the connection
@@ -87,13 +82,14 @@ class UserDAO():
             query = "INSERT INTO user (username, user_email, first_name, last_name, password_hash, date_joined) VALUES (%s, %s, %s, %s, %s, NOW())"
             tup = (username, email, first_name, last_name, password_hash)
             cursor.execute(query, tup)
+
+            # Fetch the user ID of the newly inserted user, then count the user
+            user_id = cursor.lastrowid
+            StatsDAO().user_created(cursor)
             
             # Commit the transaction
             conn.commit()
             
-            # Fetch the user ID of the newly inserted user
-            user_id = cursor.lastrowid
-            
             # Close the database connection
             conn.close()
             
@@ -176,4 +172,7 @@ class UserDAO():
         except Exception as e:
             # Handle any errors
             print(f"Error updating password: {str(e)}")
-            return False  # Return False if update failed
\ No newline at end of file
+            return False  # Return False if update failed
+
+# Builds Users from trusted rows without validating them again, unless STRICT_ROW_MAPPING is set
+user_mapper = RowMapper(User, strict=get_settings().strict_row_mapping)
@@ -0,0 +1,37 @@
+import json
+from datetime import date
+
+class RecipeSummary():
+    """A lightweight, read only view of a recipe for list pages.\n
+    Built straight from trusted database rows without pydantic validation, and never holds
+    the image or the full instructions."""
+    __slots__ = ('recipe_id', 'recipe_name', 'date_created', 'recipe_description', 'instructions_preview', 'tags', 'user_id', 'image_hash')
+
+    # The columns selected for a summary, in the order of __slots__
+    COLUMNS = "recipe_id, recipe_name, date_created, recipe_description, SUBSTR(instructions, 1, 200), tags, user_id, CASE WHEN image_mime_type IS NOT NULL THEN image_hash END"
+
+    def __init__(self, recipe_id:int, recipe_name:str, date_created:date, recipe_description:str, instructions_preview:str, tags:list[str], user_id:int, image_hash:str | None):
+        self.recipe_id = recipe_id
+        self.recipe_name = recipe_name
+        self.date_created = date_created
+        self.recipe_description = recipe_description
+        self.instructions_preview = instructions_preview
+        self.tags = tags
+        self.user_id = user_id
+        self.image_hash = image_hash  # None when the recipe has no image
+
+    @classmethod
+    def from_row(cls, row:tuple) -> 'RecipeSummary':
+        recipe_id, recipe_name, date_created, recipe_description, instructions_preview, tags, user_id, image_hash = row
+        return cls(recipe_id, recipe_name, date_created, recipe_description, instructions_preview, json.loads(tags), user_id, image_hash)
+
+    @property
+    def has_image(self) -> bool:
+        return self.image_hash is not None
+
+    def version(self) -> tuple:
+        """returns: Everything a list page shows of the recipe, which changes whenever the recipe is edited"""
+        return (self.recipe_name, self.recipe_description, self.instructions_preview, tuple(self.tags), self.image_hash)
+
+    def __repr__(self):
+        return f'RecipeSummary(recipe_id={self.recipe_id!r}, recipe_name={self.recipe_name!r})'
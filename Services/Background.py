@@ -0,0 +1,25 @@
+import logging
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+_tasks = {}  # name -> thread
+_tasks_lock = threading.Lock()
+
+def run_every(name:str, interval:float, task):
+    """Runs task every interval seconds on a daemon thread of this process, logging instead of raising its errors.
+    Starting a task with a name that is already running, or with an interval of 0, does nothing."""
+    with _tasks_lock:
+        if name in _tasks or interval <= 0:
+            return
+        _tasks[name] = threading.Thread(target=_run_forever, args=(name, interval, task), name=name, daemon=True)
+        _tasks[name].start()
+
+def _run_forever(name:str, interval:float, task):
+    while True:
+        time.sleep(interval)
+        try:
+            task()
+        except Exception:
+            logger.exception('Background task %s failed', name)
@@ -0,0 +1,153 @@
+import io
+import os
+import time
+import shutil
+import hashlib
+import tempfile
+import threading
+from contextlib import contextmanager
+
+try:
+    import fcntl  # Locks the store against other worker processes, where the OS has it
+except ImportError:
+    fcntl = None
+
+CHUNK_BYTES = 1024 * 1024
+GC_GRACE_SECONDS = 3600  # Files written or reused this recently are never collected, their recipe may still be committing
+
+class BlobStore():
+    def __init__(self, root:str):
+        """Files stored under the SHA-256 of their content, so identical uploads are kept once.\n
+        root: The folder holding the files, as root/ab/cd/abcd... so no folder gets too big"""
+        self.root = root
+        self._lock = threading.Lock()
+
+    def path(self, blob_hash:str) -> str:
+        return os.path.join(self.root, blob_hash[:2], blob_hash[2:4], blob_hash)
+
+    def put(self, stream) -> str:
+        """Copies a file into the store a chunk at a time, hashing it on the way, so it is never held in memory whole.\n
+        returns: The hash the file is stored under"""
+        os.makedirs(self.root, exist_ok=True)
+        digest = hashlib.sha256()
+        with tempfile.NamedTemporaryFile(dir=self.root, prefix='.upload-', delete=False) as temp:
+            try:
+                while chunk := stream.read(CHUNK_BYTES):
+                    digest.update(chunk)
+                    temp.write(chunk)
+                temp.flush()
+                os.fsync(temp.fileno())
+            except BaseException:
+                os.remove(temp.name)
+                raise
+        blob_hash = digest.hexdigest()
+
+        with self._locked():
+            path = self.path(blob_hash)
+            if os.path.exists(path):
+                # Already stored, so only mark it as in use for the garbage collector
+                os.remove(temp.name)
+                os.utime(path)
+            else:
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                os.replace(temp.name, path)
+        return blob_hash
+
+    def put_bytes(self, data:bytes) -> str:
+        return self.put(io.BytesIO(data))
+
+    def read(self, blob_hash:str) -> bytes:
+        with open(self.path(blob_hash), 'rb') as file:
+            return file.read()
+
+    def copy_to(self, blob_hash:str, destination:str):
+        shutil.copyfile(self.path(blob_hash), destination)
+
+    def walk(self):
+        """Yields the hash of every stored file."""
+        for directory, _, files in os.walk(self.root):
+            for name in files:
+                if not name.startswith('.'):
+                    yield name
+
+    def collect_garbage(self, find_unused, grace_seconds:float=GC_GRACE_SECONDS, batch_size:int=1000) -> int:
+        """Deletes the files no recipe refers to any more.\n
+        find_unused: A function taking a list of hashes and returning the ones no recipe refers to, forgetting them as it does\n
+        returns: The number of files deleted"""
+        deleted = 0
+        cutoff = time.time() - grace_seconds
+        batch = []
+        for blob_hash in self.walk():
+            if self._modified(blob_hash) < cutoff:
+                batch.append(blob_hash)
+            if len(batch) == batch_size:
+                deleted += self._delete_unused(find_unused(batch), cutoff)
+                batch = []
+        if batch:
+            deleted += self._delete_unused(find_unused(batch), cutoff)
+
+        # Uploads that never got as far as being stored
+        for name in os.listdir(self.root) if os.path.isdir(self.root) else []:
+            path = os.path.join(self.root, name)
+            if name.startswith('.upload-') and os.path.getmtime(path) < cutoff:
+                os.remove(path)
+        return deleted
+
+    def _delete_unused(self, blob_hashes:list[str], cutoff:float) -> int:
+        deleted = 0
+        for blob_hash in blob_hashes:
+            with self._locked():
+                # put() touches a file it reuses, so a file reused since the walk is left alone
+                if self._modified(blob_hash) < cutoff:
+                    os.remove(self.path(blob_hash))
+                    deleted += 1
+        return deleted
+
+    def _modified(self, blob_hash:str) -> float:
+        try:
+            return os.path.getmtime(self.path(blob_hash))
+        except FileNotFoundError:
+            return float('inf')
+
+    @contextmanager
+    def _locked(self):
+        """Holds the store's lock, across worker processes where possible, so a file is never reused and deleted at once."""
+        with self._lock:
+            if fcntl is None:
+                yield
+                return
+            os.makedirs(self.root, exist_ok=True)
+            with open(os.path.join(self.root, '.lock'), 'a') as lock_file:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+                try:
+                    yield
+                finally:
+                    fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+def blob_store_from_env() -> BlobStore:
+    """Builds the blob store in the BLOB_DIR folder."""
+    from Services.Settings import get_settings
+    return BlobStore(get_settings().blob_dir)
+
+def migrate(batch_size:int=100) -> int:
+    """Moves the images still stored in the recipe table into the blob store, a batch at a time so it can be stopped and run again.\n
+    returns: The number of images moved"""
+    from DAOs.Image_DAO import ImageDAO, blob_store
+    moved = 0
+    while images := ImageDAO().retrieve_inline_images(batch_size):
+        for recipe_id, image in images:
+            ImageDAO().move_inline_image(recipe_id, blob_store.put_bytes(image))
+        moved += len(images)
+        print(f'Moved {moved} images')
+    return moved
+
+if __name__ == '__main__':
+    import argparse
+    parser = argparse.ArgumentParser(description='Manages the folder of original recipe images.')
+    parser.add_argument('command', choices=['migrate', 'gc'], help='migrate: move the images out of the recipe table, gc: delete the files no recipe uses')
+    args = parser.parse_args()
+    if args.command == 'migrate':
+        print(f'Moved {migrate()} images into the blob store')
+    else:
+        from DAOs.Image_DAO import ImageDAO, blob_store
+        print(f'Deleted {blob_store.collect_garbage(ImageDAO().find_unused_blobs)} unused images')
@@ -0,0 +1,36 @@
+import threading
+
+class ChangeFeed():
+    def __init__(self, load_range, load_changes, replay:int=100):
+        """Follows the recipe_change log, which every write to a recipe appends its recipe_id to in the same transaction,
+        so an in memory index can pick up the recipes other worker processes created, edited or deleted.\n
+        load_range: A function returning (oldest, newest) change_id in the log, (None, None) when it is empty\n
+        load_changes: A function taking a change_id and returning (change_id, recipe_id) rows for every newer change\n
+        replay: Changes are read again this many ids back, since a transaction that got its change_id earlier can commit after later ones"""
+        self._load_range = load_range
+        self._load_changes = load_changes
+        self.replay = replay
+        self._lock = threading.Lock()
+        self._position = 0  # The newest change_id seen
+        self._seen = set()  # The change_ids seen within replay of the newest
+
+    def start(self):
+        """Starts following the log from its newest change. Call it right before loading the whole index."""
+        _, newest = self._load_range()
+        with self._lock:
+            self._position, self._seen = newest or 0, set()
+
+    def poll(self) -> set[int] | None:
+        """returns: The recipe_ids changed since the last poll, or None if the log was pruned past them and the index has to be loaded again"""
+        with self._lock:
+            oldest, _ = self._load_range()
+            if oldest is not None and oldest > self._position + 1:
+                return None
+            changed = set()
+            for change_id, recipe_id in self._load_changes(max(0, self._position - self.replay)):
+                if change_id not in self._seen:
+                    self._seen.add(change_id)
+                    changed.add(recipe_id)
+                    self._position = max(self._position, change_id)
+            self._seen = {change_id for change_id in self._seen if change_id > self._position - self.replay}
+            return changed
@@ -0,0 +1,49 @@
+import hashlib
+import threading
+from markupsafe import Markup
+
+from Services.RecipeCache import SizeBoundedLRU
+from Services.Settings import get_settings
+
+class FragmentCache():
+    def __init__(self, max_bytes:int):
+        """Caches rendered pieces of templates (like one table row per recipe), so hot pages mostly join up cached HTML.\n
+        Each fragment is keyed by template, recipe_id and any flags it shows, and stores a hash of the version of the recipe
+        it was rendered from, so an edit made by any worker process is picked up on the next render.\n
+        max_bytes: The most bytes of HTML kept at once, the least recently used fragments are evicted first"""
+        self._lru = SizeBoundedLRU(max_bytes)
+        self._lock = threading.Lock()
+        self._templates = set()  # Every template name fragments were cached for, to find them again in invalidate()
+        self._flag_sets = set()
+
+    def render(self, template, recipe_id:int, version, flags:tuple=(), **context) -> Markup:
+        """Renders a Jinja template, or returns the HTML it rendered last time for the same recipe version and flags.\n
+        template: A jinja2 Template\n
+        version: Anything that changes whenever the recipe's fragment would, e.g. RecipeSummary.version()"""
+        key = (template.name, recipe_id, flags)
+        # A version can hold as much text as the fragment itself, so only a short hash of it is kept
+        digest = hashlib.blake2b(repr(version).encode(), digest_size=16).digest()
+        cached = self._lru.get(key)
+        if cached is not None and cached[0] == digest:
+            return cached[1]
+
+        html = Markup(template.render(**context))
+        self._lru.set(key, (digest, html), len(html) + 100)  # Plus roughly what the key, the digest and the tuples cost
+        with self._lock:
+            self._templates.add(template.name)
+            self._flag_sets.add(flags)
+        return html
+
+    def invalidate(self, recipe_id:int):
+        """Drops every fragment of a recipe, e.g. after it is edited or deleted."""
+        with self._lock:
+            keys = [(name, recipe_id, flags) for name in self._templates for flags in self._flag_sets]
+        for key in keys:
+            self._lru.delete(key)
+
+    def stats(self) -> dict:
+        return self._lru.stats()
+
+def fragment_cache_from_env() -> FragmentCache:
+    """Builds the fragment cache from FRAGMENT_CACHE_BYTES (default 16 MB)."""
+    return FragmentCache(max_bytes=get_settings().fragment_cache_bytes)
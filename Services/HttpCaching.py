@@ -0,0 +1,109 @@
+import os
+import gzip
+import hashlib
+import threading
+from flask import request
+
+STATIC_MAX_AGE = 365 * 24 * 60 * 60  # Fingerprinted static files never change under the same URL
+COMPRESSIBLE_TYPES = {'text/html', 'text/css', 'text/plain', 'application/json', 'application/javascript', 'image/svg+xml'}
+
+_fingerprints = {}  # static file path -> (mtime, content hash)
+_fingerprints_lock = threading.Lock()
+
+def static_fingerprint(static_folder:str, filename:str) -> str | None:
+    """returns: A short hash of a static file's content, recomputed only when the file changes, or None if it does not exist"""
+    path = os.path.join(static_folder, filename)
+    try:
+        mtime = os.stat(path).st_mtime_ns
+    except OSError:
+        return None
+    cached = _fingerprints.get(path)
+    if cached is not None and cached[0] == mtime:
+        return cached[1]
+    with open(path, 'rb') as file:
+        fingerprint = hashlib.sha256(file.read()).hexdigest()[:12]
+    with _fingerprints_lock:
+        _fingerprints[path] = (mtime, fingerprint)
+    return fingerprint
+
+def templates_version(template_folder:str) -> str:
+    """returns: A hash of every template, so ETags made before a deploy stop matching after it"""
+    digest = hashlib.sha256()
+    for root, _, files in sorted(os.walk(template_folder)):
+        for name in sorted(files):
+            with open(os.path.join(root, name), 'rb') as file:
+                digest.update(name.encode() + file.read())
+    return digest.hexdigest()[:12]
+
+def page_etag(app, *parts) -> str:
+    """returns: An ETag for a page built from parts (e.g. a recipe's id, content and saved flags) and the templates,
+    so a route can answer a revalidation with a 304 before rendering anything"""
+    digest = hashlib.sha256(app.config['TEMPLATES_VERSION'].encode())
+    for part in parts:
+        digest.update(repr(part).encode() + b'\0')
+    return digest.hexdigest()[:32]
+
+def _brotli():
+    try:
+        import brotli  # Optional dependency, gzip is used without it
+    except ImportError:
+        return None
+    return brotli
+
+def compress(response, min_bytes:int):
+    """Compresses a text response with brotli or gzip, whichever the browser accepts, when it is at least min_bytes long."""
+    if (response.direct_passthrough or response.is_streamed or response.status_code != 200
+            or response.mimetype not in COMPRESSIBLE_TYPES or 'Content-Encoding' in response.headers):
+        return response
+    response.vary.add('Accept-Encoding')
+    data = response.get_data()
+    if len(data) < min_bytes:
+        return response
+
+    brotli = _brotli()
+    if brotli is not None and request.accept_encodings['br']:
+        response.set_data(brotli.compress(data, quality=5))
+        response.headers['Content-Encoding'] = 'br'
+    elif request.accept_encodings['gzip']:
+        response.set_data(gzip.compress(data, compresslevel=6))
+        response.headers['Content-Encoding'] = 'gzip'
+    return response
+
+def init_app(app, compress_min_bytes:int=1024):
+    """Adds conditional GET and compression to the app's HTML responses and fingerprints its static URLs.\n
+    compress_min_bytes: Smaller responses are sent as they are, since compressing them saves next to nothing"""
+    app.config['TEMPLATES_VERSION'] = templates_version(os.path.join(app.root_path, app.template_folder))
+
+    # url_for('static', filename=...) gets ?v=<content hash>, so a changed file gets a new URL
+    @app.url_defaults
+    def add_static_fingerprint(endpoint, values):
+        if endpoint == 'static' and 'filename' in values and 'v' not in values:
+            fingerprint = static_fingerprint(app.static_folder, values['filename'])
+            if fingerprint:
+                values['v'] = fingerprint
+
+    @app.after_request
+    def add_http_caching(response):
+        if request.method not in ('GET', 'HEAD'):
+            return response
+
+        # A fingerprinted URL always has the same content, so browsers can keep it for a year without asking
+        if request.endpoint == 'static':
+            if request.args.get('v') and request.args.get('v') == static_fingerprint(app.static_folder, request.view_args['filename']):
+                response.cache_control.no_cache = None
+                response.cache_control.public = True
+                response.cache_control.max_age = STATIC_MAX_AGE
+                response.cache_control.immutable = True
+            return response
+
+        # Pages are ETagged by their content, so an unchanged page costs a 304 instead of the whole HTML.
+        # The ETag is weak because the compressed and uncompressed bodies share it.
+        if response.status_code == 200 and response.mimetype == 'text/html' and not response.is_streamed:
+            if not response.get_etag()[0]:
+                response.set_etag(hashlib.sha256(response.get_data()).hexdigest()[:32], weak=True)
+            if not response.cache_control.public:
+                response.cache_control.private = True
+                response.cache_control.no_cache = True
+            response = response.make_conditional(request)
+
+        return compress(response, compress_min_bytes)
@@ -0,0 +1,95 @@
+import logging
+import threading
+from io import BytesIO
+
+logger = logging.getLogger(__name__)
+
+# Longest side in pixels of each derivative, and the formats made for each size (best first)
+SIZES = {'thumb': 320, 'detail': 1024}
+FORMATS = {
+    'avif': ('AVIF', 'image/avif', {'quality': 55}),
+    'webp': ('WEBP', 'image/webp', {'quality': 80, 'method': 4}),
+    'jpeg': ('JPEG', 'image/jpeg', {'quality': 82, 'optimize': True, 'progressive': True}),
+}
+
+_executor = None
+_executor_lock = threading.Lock()
+
+def available_formats() -> list[str]:
+    """returns: The derivative formats this Pillow build can write (AVIF needs a recent Pillow with libavif)"""
+    from PIL import Image  # Imported on first use, since only image worker processes need Pillow
+    Image.init()
+    return [name for name, (pil_format, _, _) in FORMATS.items() if pil_format in Image.SAVE]
+
+def make_derivatives(image_path:str) -> list[tuple[str, str, str, bytes]]:
+    """Decodes an upload once, straight from its file in the blob store, and makes every resized, recompressed variant of it.\n
+    Metadata such as EXIF and GPS tags is not copied into the variants.\n
+    returns: A list of (size, format, mime_type, image bytes)"""
+    from PIL import Image, ImageOps
+    with Image.open(image_path) as original:
+        # Apply the camera orientation before the EXIF data carrying it is dropped
+        image = ImageOps.exif_transpose(original)
+        if image.mode in ('RGBA', 'LA', 'P'):
+            image = image.convert('RGBA')
+            background = Image.new('RGB', image.size, 'white')
+            background.paste(image, mask=image.getchannel('A'))
+            image = background
+        else:
+            image = image.convert('RGB')
+        image.info = {}
+
+    derivatives = []
+    formats = available_formats()
+    for size, longest_side in SIZES.items():
+        resized = image.copy()
+        resized.thumbnail((longest_side, longest_side), Image.Resampling.LANCZOS)
+        for name in formats:
+            pil_format, mime_type, options = FORMATS[name]
+            buffer = BytesIO()
+            resized.save(buffer, format=pil_format, **options)
+            derivatives.append((size, name, mime_type, buffer.getvalue()))
+    return derivatives
+
+def get_executor() -> 'ProcessPoolExecutor':
+    """returns: The process pool that image work runs in, so request threads never decode images"""
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                import multiprocessing  # Imported on first use, a worker that never sees an upload never needs them
+                from concurrent.futures import ProcessPoolExecutor
+                from Services.Settings import get_settings  # Kept out of the worker processes, which only resize images
+                workers = get_settings().image_workers
+                _executor = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('spawn'))
+    return _executor
+
+def submit_derivatives(recipe_id:int, image_path:str):
+    """Makes the variants of a recipe image in the background and stores them when they are ready.
+    Only the path is sent to the worker process, rather than the whole image."""
+    future = get_executor().submit(make_derivatives, image_path)
+    future.add_done_callback(lambda finished: _store_derivatives(recipe_id, finished))
+    return future
+
+def _store_derivatives(recipe_id:int, future):
+    # Imported here so that worker processes never load the database code
+    from DAOs.Image_DAO import ImageDAO
+    try:
+        ImageDAO().add_variants(recipe_id, future.result())
+    except Exception:
+        logger.exception('Could not make the image variants of recipe %s', recipe_id)
+
+def backfill():
+    """Makes the variants of every recipe image that does not have any yet."""
+    from DAOs.Image_DAO import ImageDAO, blob_store
+    from DAOs.Recipe_DAO import RecipeDAO
+    futures = []
+    for recipe_id in ImageDAO().retrieve_recipe_ids_without_variants():
+        image = RecipeDAO().retrieve_recipe_image(recipe_id)
+        if image:
+            futures.append(submit_derivatives(recipe_id, blob_store.path(image[0])))
+    for future in futures:
+        future.exception()
+    print(f'Made image variants for {len(futures)} recipes')
+
+if __name__ == '__main__':
+    backfill()
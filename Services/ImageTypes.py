@@ -0,0 +1,19 @@
+# Magic numbers of the image formats users can upload, and the formats we generate
+SIGNATURES = [
+    (b'\x89PNG\r\n\x1a\n', 'image/png'),
+    (b'\xff\xd8\xff', 'image/jpeg'),
+    (b'GIF87a', 'image/gif'),
+    (b'GIF89a', 'image/gif'),
+]
+
+def sniff_mime_type(header:bytes) -> str | None:
+    """Works out the type of an image from its first bytes.\n
+    returns: The mime type, or None if the bytes are not a known image format"""
+    for signature, mime_type in SIGNATURES:
+        if header.startswith(signature):
+            return mime_type
+    if header[:4] == b'RIFF' and header[8:12] == b'WEBP':
+        return 'image/webp'
+    if header[4:12] in (b'ftypavif', b'ftypavis'):
+        return 'image/avif'
+    return None
@@ -0,0 +1,117 @@
+import threading
+from collections import defaultdict
+
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+def _format_labels(labels:dict) -> str:
+    if not labels:
+        return ''
+    escaped = {name: str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for name, value in labels.items()}
+    return '{' + ','.join(f'{name}="{value}"' for name, value in escaped.items()) + '}'
+
+def _format_value(value:float) -> str:
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+class Counter():
+    def __init__(self, name:str, help:str, label_names:tuple[str, ...] = ()):
+        """A value that only goes up, e.g. the number of queries run, optionally split by labels."""
+        self.name = name
+        self.help = help
+        self.label_names = label_names
+        self._lock = threading.Lock()
+        self._values = defaultdict(float)  # label values -> count
+
+    def inc(self, amount:float=1.0, **labels):
+        key = tuple(str(labels[name]) for name in self.label_names)
+        with self._lock:
+            self._values[key] += amount
+
+    def render(self) -> list[str]:
+        with self._lock:
+            values = dict(self._values)
+        lines = [f'# HELP {self.name} {self.help}', f'# TYPE {self.name} counter']
+        for key, value in sorted(values.items()):
+            lines.append(f'{self.name}{_format_labels(dict(zip(self.label_names, key)))} {_format_value(value)}')
+        return lines
+
+class Histogram():
+    def __init__(self, name:str, help:str, label_names:tuple[str, ...] = (), buckets:tuple[float, ...] = DEFAULT_BUCKETS):
+        """Counts observations (e.g. seconds) into cumulative buckets, so percentiles can be worked out by the scraper."""
+        self.name = name
+        self.help = help
+        self.label_names = label_names
+        self.buckets = tuple(sorted(buckets)) + (float('inf'),)
+        self._lock = threading.Lock()
+        self._values = {}  # label values -> [bucket counts, sum, count]
+
+    def observe(self, value:float, **labels):
+        key = tuple(str(labels[name]) for name in self.label_names)
+        with self._lock:
+            entry = self._values.get(key)
+            if entry is None:
+                entry = self._values[key] = [[0] * len(self.buckets), 0.0, 0]
+            for index, bound in enumerate(self.buckets):
+                if value <= bound:
+                    entry[0][index] += 1
+                    break
+            entry[1] += value
+            entry[2] += 1
+
+    def render(self) -> list[str]:
+        with self._lock:
+            values = {key: ([*entry[0]], entry[1], entry[2]) for key, entry in self._values.items()}
+        lines = [f'# HELP {self.name} {self.help}', f'# TYPE {self.name} histogram']
+        for key, (bucket_counts, total, count) in sorted(values.items()):
+            labels = dict(zip(self.label_names, key))
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets, bucket_counts):
+                cumulative += bucket_count
+                lines.append(f'{self.name}_bucket{_format_labels(dict(labels, le=_format_value(bound)))} {cumulative}')
+            lines.append(f'{self.name}_sum{_format_labels(labels)} {_format_value(total)}')
+            lines.append(f'{self.name}_count{_format_labels(labels)} {count}')
+        return lines
+
+class MetricsRegistry():
+    """Holds the metrics of this worker process and renders them in the Prometheus text format."""
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._metrics = {}
+        self._stats_sources = []  # (prefix, help, function returning a stats dict)
+
+    def counter(self, name:str, help:str, label_names:tuple[str, ...] = ()) -> Counter:
+        return self._register(Counter(name, help, label_names))
+
+    def histogram(self, name:str, help:str, label_names:tuple[str, ...] = (), buckets:tuple[float, ...] = DEFAULT_BUCKETS) -> Histogram:
+        return self._register(Histogram(name, help, label_names, buckets))
+
+    def add_stats(self, prefix:str, help:str, stats):
+        """Exposes every number of a stats() dict (like ConnectionPool.stats) as a gauge named <prefix>_<key>, read on each scrape."""
+        with self._lock:
+            self._stats_sources.append((prefix, help, stats))
+
+    def render(self) -> str:
+        with self._lock:
+            metrics = list(self._metrics.values())
+            stats_sources = list(self._stats_sources)
+        lines = []
+        for metric in metrics:
+            lines.extend(metric.render())
+        for prefix, help, stats in stats_sources:
+            for key, value in stats().items():
+                if isinstance(value, (int, float)) and not isinstance(value, bool):
+                    lines.append(f'# HELP {prefix}_{key} {help}')
+                    lines.append(f'# TYPE {prefix}_{key} gauge')
+                    lines.append(f'{prefix}_{key} {_format_value(value)}')
+        return '\n'.join(lines) + '\n'
+
+    def _register(self, metric):
+        with self._lock:
+            if metric.name in self._metrics:
+                return self._metrics[metric.name]
+            self._metrics[metric.name] = metric
+            return metric
+
+# One registry per worker process
+metrics = MetricsRegistry()
@@ -0,0 +1,218 @@
+import time
+import pickle
+import threading
+from collections import OrderedDict
+
+from Services.Settings import get_settings
+
+class SizeBoundedLRU():
+    def __init__(self, max_bytes:int, ttl:float | None = None):
+        """An in process LRU cache that evicts by the total size of its values rather than how many there are.\n
+        max_bytes: The most bytes of values kept at once\n
+        ttl: Seconds a value is served for after it was set, None to keep it until it is evicted"""
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()  # key -> (value, size, expires)
+        self._bytes = 0
+        self._counters = {'hits': 0, 'misses': 0, 'evictions': 0, 'expired': 0, 'too_large': 0}
+
+    def get(self, key):
+        """returns: The cached value, or None"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[2] is not None and entry[2] <= time.monotonic():
+                self._pop(key)
+                self._counters['expired'] += 1
+                entry = None
+            if entry is None:
+                self._counters['misses'] += 1
+                return None
+            self._entries.move_to_end(key)
+            self._counters['hits'] += 1
+            return entry[0]
+
+    def set(self, key, value, size:int):
+        with self._lock:
+            self._pop(key)
+            if size > self.max_bytes:
+                self._counters['too_large'] += 1
+                return
+            expires = None if self.ttl is None else time.monotonic() + self.ttl
+            self._entries[key] = (value, size, expires)
+            self._bytes += size
+            while self._bytes > self.max_bytes:
+                _, (_, evicted_size, _) = self._entries.popitem(last=False)
+                self._bytes -= evicted_size
+                self._counters['evictions'] += 1
+
+    def delete(self, key):
+        with self._lock:
+            self._pop(key)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def stats(self) -> dict:
+        with self._lock:
+            return dict(self._counters, entries=len(self._entries), bytes=self._bytes, max_bytes=self.max_bytes)
+
+    def _pop(self, key):
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self._bytes -= entry[1]
+
+class InMemorySharedBackend():
+    """A stand-in for a shared cache server that lives in this process. Stores serialized bytes,
+    exactly like a real server would, so it can replace one in tests and single worker setups."""
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._values = {}
+
+    def get(self, key:str) -> bytes | None:
+        with self._lock:
+            return self._values.get(key)
+
+    def set(self, key:str, value:bytes, ttl:int):
+        with self._lock:
+            self._values[key] = value
+
+    def delete(self, key:str):
+        with self._lock:
+            self._values.pop(key, None)
+
+    def incr(self, key:str, ttl:int) -> int:
+        with self._lock:
+            value = int(self._values.get(key) or 0) + 1
+            self._values[key] = str(value).encode()
+            return value
+
+class RedisSharedBackend():
+    """A shared cache tier on a Redis server, so every worker process sees the same entries."""
+    def __init__(self, url:str):
+        import redis  # Optional dependency, only needed when RECIPE_CACHE_URL points at Redis
+        self._client = redis.Redis.from_url(url)
+
+    def get(self, key:str) -> bytes | None:
+        return self._client.get(key)
+
+    def set(self, key:str, value:bytes, ttl:int):
+        self._client.set(key, value, ex=ttl)
+
+    def delete(self, key:str):
+        self._client.delete(key)
+
+    def incr(self, key:str, ttl:int) -> int:
+        pipeline = self._client.pipeline()
+        pipeline.incr(key)
+        pipeline.expire(key, ttl)
+        return pipeline.execute()[0]
+
+def shared_backend_from_url(url:str | None):
+    """returns: The shared backend named by a RECIPE_CACHE_URL value, or None for a local only cache"""
+    if not url:
+        return None
+    if url == 'memory://':
+        return InMemorySharedBackend()
+    if url.startswith(('redis://', 'rediss://', 'unix://')):
+        return RedisSharedBackend(url)
+    raise ValueError(f'Unsupported RECIPE_CACHE_URL: {url}')
+
+class RecipeCache():
+    def __init__(self, load, max_bytes:int, shared=None, ttl:int=3600, local_ttl:float=5.0, namespace:str='recipe'):
+        """A read-through cache of Recipe objects keyed by recipe_id.\n
+        load: A function taking a recipe_id and returning the Recipe, or None if it does not exist\n
+        max_bytes: The size bound of the in process tier\n
+        shared: An optional out of process tier with get/set/delete/incr of bytes, shared by every worker\n
+        ttl: Seconds entries live in the shared tier\n
+        local_ttl: Seconds entries live in the in process tier. Only this worker's invalidations reach that tier,
+        so this is how long an edit made through another worker can take to show up here"""
+        self._load = load
+        self._local = SizeBoundedLRU(max_bytes, ttl=local_ttl)
+        self._shared = shared
+        self.ttl = ttl
+        self.namespace = namespace
+        self._lock = threading.Lock()
+        self._generation = 0  # Counts this worker's invalidations
+        self._counters = {'shared_hits': 0, 'loads': 0, 'stale_fills': 0}
+
+    def get(self, recipe_id:int):
+        # The in process tier holds ready to use objects
+        recipe = self._local.get(recipe_id)
+        if recipe is not None:
+            return recipe
+
+        # Taken before reading, so a value that was read before an invalidation is not cached after it
+        with self._lock:
+            generation = self._generation
+
+        # The shared tier holds pickled objects, under the recipe's current version
+        key = None
+        if self._shared is not None:
+            key = self._key(recipe_id, self._version(recipe_id))
+            data = self._shared.get(key)
+            if data is not None:
+                self._count('shared_hits')
+                recipe = pickle.loads(data)
+                self._fill(recipe_id, recipe, len(data), generation)
+                return recipe
+
+        # Fall through to the database
+        self._count('loads')
+        recipe = self._load(recipe_id)
+        if recipe is not None:
+            data = pickle.dumps(recipe, protocol=pickle.HIGHEST_PROTOCOL)
+            self._fill(recipe_id, recipe, len(data), generation)
+            if self._shared is not None:
+                # If the recipe was invalidated since its version was read, this lands under the old version, which nothing reads any more
+                self._shared.set(key, data, self.ttl)
+        return recipe
+
+    def invalidate(self, recipe_id:int):
+        with self._lock:
+            self._generation += 1
+            self._local.delete(recipe_id)
+        if self._shared is not None:
+            # Moves every worker on to a new key. The version outlives the values stored under the old ones.
+            self._shared.incr(self._version_key(recipe_id), self.ttl * 2)
+
+    def stats(self) -> dict:
+        with self._lock:
+            counters = dict(self._counters)
+        return dict(self._local.stats(), **counters, shared=type(self._shared).__name__ if self._shared else None)
+
+    def _fill(self, recipe_id:int, recipe, size:int, generation:int):
+        with self._lock:
+            # Dropped if this worker invalidated anything while the recipe was being read, it may be the old one
+            if generation != self._generation:
+                self._counters['stale_fills'] += 1
+                return
+            self._local.set(recipe_id, recipe, size)
+
+    def _count(self, counter:str):
+        with self._lock:
+            self._counters[counter] += 1
+
+    def _version(self, recipe_id:int) -> int:
+        version = self._shared.get(self._version_key(recipe_id))
+        return int(version) if version else 0
+
+    def _version_key(self, recipe_id:int) -> str:
+        return f'{self.namespace}:version:{recipe_id}'
+
+    def _key(self, recipe_id:int, version:int) -> str:
+        return f'{self.namespace}:{recipe_id}:{version}'
+
+def recipe_cache_from_env(load) -> RecipeCache:
+    """Builds the recipe cache from RECIPE_CACHE_BYTES (default 64 MB), RECIPE_CACHE_URL (default: local only)
+    and RECIPE_CACHE_LOCAL_TTL (default 5 seconds)."""
+    settings = get_settings()
+    return RecipeCache(
+        load=load,
+        max_bytes=settings.recipe_cache_bytes,
+        shared=shared_backend_from_url(settings.recipe_cache_url),
+        ttl=settings.recipe_cache_ttl,
+        local_ttl=settings.recipe_cache_local_ttl
+    )
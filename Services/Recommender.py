@@ -0,0 +1,174 @@
+import logging
+
+from Services.Background import run_every
+
+logger = logging.getLogger(__name__)
+
+# How much an entry in each list says about what a user likes
+LIST_WEIGHTS = {'cookbook': 1.0, 'try_list': 0.5}
+# Shared tags only break ties and place recipes nobody has saved yet, being saved together counts far more
+TAG_WEIGHT = 0.1
+# Rows of the similarity matrix computed at a time, which bounds the memory a refresh needs
+BATCH_SIZE = 256
+
+class SimilarityModel():
+    def __init__(self, interactions:list[tuple[int, int, str]], recipe_tags:list[tuple[int, str | None]]):
+        """Item-item cosine similarity from a sparse user x recipe matrix of cookbook and try list entries,
+        plus a small share of the cosine similarity of the recipes' tags.\n
+        interactions: (user_id, recipe_id, list name) rows from the cookbook and try list tables\n
+        recipe_tags: (recipe_id, tag) rows for every recipe that may be compared, with a None tag for recipes without any.
+        Neighbours are only found among these, so they must include every recipe saved with or sharing a tag with the ones asked for"""
+        import numpy as np  # Imported on first use, since only the refresh needs NumPy and SciPy
+        from scipy import sparse
+
+        recipe_tag_sets = {}
+        for recipe_id, tag in recipe_tags:
+            tags = recipe_tag_sets.setdefault(recipe_id, set())
+            if tag is not None:
+                tags.add(tag)
+        self.recipe_ids = np.array(sorted(recipe_tag_sets), dtype=np.int64)
+        self._positions = {int(recipe_id): position for position, recipe_id in enumerate(self.recipe_ids)}
+        n_recipes = len(self.recipe_ids)
+
+        # Recipes x users, summing a user's cookbook and try list entries of the same recipe, each recipe scaled to length 1
+        interactions = [(user_id, recipe_id, LIST_WEIGHTS[list_name]) for user_id, recipe_id, list_name in interactions if recipe_id in self._positions]
+        user_positions = {}
+        columns = [user_positions.setdefault(user_id, len(user_positions)) for user_id, _, _ in interactions]
+        rows = [self._positions[recipe_id] for _, recipe_id, _ in interactions]
+        weights = np.array([weight for _, _, weight in interactions], dtype=np.float32)
+        self._saves = _normalize_rows(sparse.csr_matrix((weights, (rows, columns)), shape=(n_recipes, len(user_positions))))
+        self._saves_t = self._saves.T.tocsr()
+
+        # Recipes x tags would be nearly dense once multiplied, since a handful of tags is shared by most recipes.
+        # Recipes with the same set of tags have the same tag vector though, so the groups x tags matrix is enough.
+        signatures = {}
+        self._groups = np.array([signatures.setdefault(frozenset(recipe_tag_sets[int(recipe_id)]), len(signatures)) for recipe_id in self.recipe_ids], dtype=np.int64)
+        tag_positions = {}
+        cells = [(group, tag_positions.setdefault(tag, len(tag_positions))) for signature, group in signatures.items() for tag in signature]
+        group_tags = sparse.csr_matrix((np.ones(len(cells), dtype=np.float32), ([group for group, _ in cells], [tag for _, tag in cells])), shape=(len(signatures), len(tag_positions)))
+        group_tags = _normalize_rows(group_tags)
+        self._group_similarity = (group_tags @ group_tags.T).toarray()  # groups x groups
+        order = np.argsort(self._groups, kind='stable')
+        self._group_members = np.split(order, np.cumsum(np.bincount(self._groups, minlength=len(signatures)))[:-1])  # positions, by recipe_id
+
+    def neighbours(self, recipe_ids:list[int], k:int) -> dict[int, list[tuple[int, float]]]:
+        """Computes the k most similar recipes of each of recipe_ids, in batches of sparse matrix products.\n
+        returns: A dict of recipe_id -> list of (similar_recipe_id, score), most similar first"""
+        import numpy as np
+
+        positions = [self._positions[recipe_id] for recipe_id in recipe_ids if recipe_id in self._positions]
+        result = {}
+        for start in range(0, len(positions), BATCH_SIZE):
+            batch = positions[start:start + BATCH_SIZE]
+            saved_together = (self._saves[batch] @ self._saves_t).tocsr()
+            for row, position in enumerate(batch):
+                # Recipes saved by the same users, plus their share of tag similarity
+                columns = saved_together.indices[saved_together.indptr[row]:saved_together.indptr[row + 1]]
+                values = saved_together.data[saved_together.indptr[row]:saved_together.indptr[row + 1]]
+                keep = columns != position
+                columns = columns[keep]
+                values = values[keep] + TAG_WEIGHT * self._group_similarity[self._groups[position], self._groups[columns]]
+
+                # The best recipes on tags alone, in case fewer than k were saved together with this one
+                tag_columns, tag_values = self._tag_neighbours(position, set(columns.tolist()), k)
+                columns = np.concatenate([columns, tag_columns]).astype(np.int64)
+                values = np.concatenate([values, tag_values])
+
+                keep = values > 0
+                columns, values = columns[keep], values[keep]
+                if len(values) > k:
+                    top = np.argpartition(-values, k - 1)[:k]
+                    columns, values = columns[top], values[top]
+                order = np.lexsort((self.recipe_ids[columns], -values))
+                result[int(self.recipe_ids[position])] = [(int(self.recipe_ids[column]), float(value)) for column, value in zip(columns[order], values[order])]
+
+        # Recipes that no longer exist lose their neighbours
+        for recipe_id in recipe_ids:
+            result.setdefault(recipe_id, [])
+        return result
+
+    def _tag_neighbours(self, position:int, excluded:set[int], k:int):
+        """returns: (positions, scores) of the k recipes most similar to position on tags alone, leaving out excluded"""
+        import numpy as np
+        similarities = self._group_similarity[self._groups[position]]
+        columns, values = [], []
+        for group in np.argsort(-similarities, kind='stable'):
+            if similarities[group] <= 0 or len(columns) >= k:
+                break
+            for member in self._group_members[group]:
+                if member != position and member not in excluded:
+                    columns.append(member)
+                    values.append(TAG_WEIGHT * similarities[group])
+                    if len(columns) >= k:
+                        break
+        return np.array(columns, dtype=np.int64), np.array(values, dtype=np.float32)
+
+def _normalize_rows(matrix):
+    """returns: The sparse matrix with every non empty row scaled to length 1"""
+    import numpy as np
+    from scipy import sparse
+    norms = np.sqrt(np.asarray(matrix.multiply(matrix).sum(axis=1))).ravel()
+    norms[norms == 0] = 1.0
+    return (sparse.diags(1.0 / norms) @ matrix).astype(np.float32).tocsr()
+
+# Only one worker process refreshes at a time
+LOCK_NAME = 'cookbook.recommender'
+
+def refresh(k:int=10, full:bool=False, batch_limit:int=1000) -> int:
+    """Recomputes the neighbours of every queued recipe (or of every recipe when full is True) and stores them.
+    Queued recipes are computed from the entries of the recipes saved together with them and the tags of those and of the
+    recipes sharing a tag with them, not from every entry and tag.\n
+    returns: The number of recipes recomputed"""
+    from DAOs.Recommendation_DAO import RecommendationDAO
+    dao = RecommendationDAO()
+    while dao.expand_stale_users(batch_limit):
+        pass
+
+    if full:
+        # The whole queue is read before the entries, so every recipe in it is recomputed below
+        stale_ids, _ = dao.retrieve_stale()
+        model = SimilarityModel(dao.retrieve_interactions(), dao.retrieve_recipe_tags())
+        recipe_ids = [int(recipe_id) for recipe_id in model.recipe_ids]
+        for start in range(0, len(recipe_ids), batch_limit):
+            last = start + batch_limit >= len(recipe_ids)
+            dao.replace_neighbours(model.neighbours(recipe_ids[start:start + batch_limit], k), stale_ids if last else ())
+        return len(recipe_ids)
+
+    total = 0
+    while True:
+        # Queue rows are read before the entries, so a save made meanwhile is either read now or still queued afterwards
+        stale_ids, recipe_ids = dao.retrieve_stale(batch_limit)
+        if not stale_ids:
+            return total
+        # Only the recipes saved together or sharing a tag with the queued ones can be their neighbours, so only their tags are read
+        interactions = dao.retrieve_co_saved_interactions(recipe_ids)
+        candidates = set(recipe_ids) | {recipe_id for _, recipe_id, _ in interactions} | dao.retrieve_tag_sharing_ids(recipe_ids)
+        model = SimilarityModel(interactions, dao.retrieve_recipe_tags(candidates))
+        dao.replace_neighbours(model.neighbours(recipe_ids, k), stale_ids)
+        total += len(recipe_ids)
+
+def start_refresher(interval:float, k:int=10):
+    """Refreshes the queued recipes every interval seconds on a background thread of this process,
+    skipping the runs where another worker process is already refreshing."""
+    run_every('recommender', interval, lambda: _refresh_and_log(k))
+
+def _refresh_and_log(k:int):
+    from DAOs.GetConnection import advisory_lock
+    with advisory_lock(LOCK_NAME) as locked:
+        if not locked:
+            return
+        count = refresh(k)
+    if count:
+        logger.info('Recomputed the similar recipes of %d recipes', count)
+
+if __name__ == '__main__':
+    import argparse
+    from Services.Settings import get_settings
+    parser = argparse.ArgumentParser(description='Recomputes the similar recipes of the queued recipes, or of every recipe with --full.')
+    parser.add_argument('--full', action='store_true', help='recompute every recipe, e.g. after first creating the tables')
+    args = parser.parse_args()
+    from DAOs.GetConnection import advisory_lock
+    with advisory_lock(LOCK_NAME) as locked:
+        if not locked:
+            raise SystemExit('A worker is refreshing the similar recipes right now, try again in a minute')
+        print(f'Recomputed the similar recipes of {refresh(get_settings().recommendations_top_k, full=args.full)} recipes')
@@ -0,0 +1,89 @@
+import time
+import threading
+from collections import OrderedDict
+
+LISTS = ('cookbook', 'try_list')
+
+class SavedSetCache():
+    def __init__(self, load, ttl:float=60.0, max_users:int=10000):
+        """Caches the ids of the recipes each user saved to their cookbook and try list.\n
+        load: A function taking a user_id and returning (cookbook recipe_ids, try list recipe_ids)\n
+        ttl: Seconds before a user's sets are reloaded, which bounds how stale other workers' writes can look\n
+        max_users: The most users kept, the least recently used are evicted first"""
+        self._load = load
+        self.ttl = ttl
+        self.max_users = max_users
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()  # user_id -> (loaded_at, {list name: set of recipe_ids})
+        self._loading = {}  # user_id -> [loads in flight, generation], the generation counting the writes made to the user meanwhile
+        self._counters = {'hits': 0, 'misses': 0, 'expired': 0, 'evictions': 0, 'invalidations': 0, 'stale_loads': 0}
+
+    def get(self, user_id:int) -> dict[str, set[int]]:
+        """returns: {'cookbook': recipe_ids, 'try_list': recipe_ids} for the user. Treat the sets as read only."""
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is not None and time.monotonic() - entry[0] < self.ttl:
+                self._entries.move_to_end(user_id)
+                self._counters['hits'] += 1
+                return entry[1]
+            self._counters['expired' if entry is not None else 'misses'] += 1
+            loading = self._loading.setdefault(user_id, [0, 0])
+            loading[0] += 1
+            generation = loading[1]
+
+        # Load outside of the lock so one slow query does not block every other user
+        try:
+            cookbook, try_list = self._load(user_id)
+        finally:
+            with self._lock:
+                loading[0] -= 1
+                if loading[0] == 0:
+                    del self._loading[user_id]
+        sets = {'cookbook': set(cookbook), 'try_list': set(try_list)}
+        with self._lock:
+            # A write made while the sets were loading may be missing from them, and would be undone by caching them
+            if loading[1] != generation:
+                self._counters['stale_loads'] += 1
+                return sets
+            self._entries[user_id] = (time.monotonic(), sets)
+            self._entries.move_to_end(user_id)
+            while len(self._entries) > self.max_users:
+                self._entries.popitem(last=False)
+                self._counters['evictions'] += 1
+        return sets
+
+    def contains(self, user_id:int, list_name:str, recipe_id:int) -> bool:
+        return recipe_id in self.get(user_id)[list_name]
+
+    def add(self, user_id:int, list_name:str, recipe_id:int):
+        """Records a new entry in place, if the user is cached."""
+        with self._lock:
+            self._wrote(user_id)
+            entry = self._entries.get(user_id)
+            if entry is not None:
+                entry[1][list_name].add(recipe_id)
+
+    def discard(self, user_id:int, list_name:str, recipe_id:int):
+        """Records a removed entry in place, if the user is cached."""
+        with self._lock:
+            self._wrote(user_id)
+            entry = self._entries.get(user_id)
+            if entry is not None:
+                entry[1][list_name].discard(recipe_id)
+
+    def invalidate(self, user_id:int):
+        with self._lock:
+            self._wrote(user_id)
+            if self._entries.pop(user_id, None) is not None:
+                self._counters['invalidations'] += 1
+
+    def stats(self) -> dict:
+        """returns: The hit, miss and eviction counters and the number of cached users"""
+        with self._lock:
+            return dict(self._counters, users=len(self._entries), max_users=self.max_users)
+
+    def _wrote(self, user_id:int):
+        # Call with the lock held
+        loading = self._loading.get(user_id)
+        if loading is not None:
+            loading[1] += 1
@@ -0,0 +1,346 @@
+import math
+import re
+import heapq
+import threading
+from array import array
+from itertools import chain
+from functools import lru_cache
+from collections import Counter, OrderedDict, defaultdict
+
+from Services.ChangeFeed import ChangeFeed
+
+FIELD_BOOSTS = {'name': 3.0, 'description': 1.5, 'instructions': 1.0}
+SEARCHED_FIELDS = (('name',), tuple(FIELD_BOOSTS))  # The fields of the name query and of the text query
+STOPWORDS = {'a', 'an', 'and', 'the', 'of', 'to', 'in', 'on', 'with', 'for', 'is', 'it', 'or', 'at', 'by', 'so', 'be'}
+TOKEN_RE = re.compile(r"[a-z0-9]+")
+
+def tokenize(text:str) -> list[str]:
+    """Splits text into lower case, stemmed search terms."""
+    return [stem(word) for word in TOKEN_RE.findall(text.lower()) if word not in STOPWORDS]
+
+@lru_cache(maxsize=65536)
+def stem(word:str) -> str:
+    """A light suffix stripping stemmer, enough to make "cookies" match "cookie" and "baking" match "bake"."""
+    if len(word) <= 3:
+        return word
+    for suffix, replacement in (('ies', 'i'), ('sses', 'ss'), ('ing', ''), ('ed', ''), ('es', ''), ('s', ''), ('ly', '')):
+        if word.endswith(suffix) and len(word) - len(suffix) >= 3:
+            word = word[:len(word) - len(suffix)] + replacement
+            break
+    # "bak" from "baking" should meet "bake" from "bakes", and "berry" should meet "berries"
+    if len(word) > 3 and word.endswith('e'):
+        word = word[:-1]
+    elif len(word) > 3 and word.endswith('y'):
+        word = word[:-1] + 'i'
+    return word
+
+def trigrams(term:str) -> set[str]:
+    padded = f'  {term} '
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+class TermImpacts():
+    __slots__ = ('fields', 'document_count', 'k1', 'b', 'recipe_ids', 'impacts')
+
+    def __init__(self, fields:list[tuple[dict, dict, float, float]], items:list[list[tuple[int, int]]], document_count:int, k1:float, b:float):
+        """The BM25 score that one term, searched in one or more fields, adds to every recipe containing it, highest first,
+        so a search can stop reading postings once no recipe it has not read yet can make the results.\n
+        fields: The (postings, lengths, weight, average_length) of each field, weight being the field's boost times the term's idf\n
+        items: A copy of each field's postings, taken while holding the index's lock"""
+        self.fields = fields
+        self.document_count = document_count
+        self.k1 = k1
+        self.b = b
+        scores = defaultdict(float)
+        for (_, lengths, weight, average_length), field_items in zip(fields, items):
+            for recipe_id, tf in field_items:
+                scores[recipe_id] += self._impact(tf, lengths.get(recipe_id, 0), weight, average_length)
+        ranked = sorted((-impact, recipe_id) for recipe_id, impact in scores.items())
+        self.recipe_ids = [recipe_id for _, recipe_id in ranked]
+        self.impacts = array('d', [-impact for impact, _ in ranked])
+
+    def impact(self, recipe_id:int) -> float | None:
+        """returns: What the term adds to the recipe's score, or None if the recipe does not contain it"""
+        score, found = 0.0, False
+        for postings, lengths, weight, average_length in self.fields:
+            tf = postings.get(recipe_id)
+            if tf is not None:
+                score += self._impact(tf, lengths.get(recipe_id, 0), weight, average_length)
+                found = True
+        return score if found else None
+
+    def _impact(self, tf:int, length:int, weight:float, average_length:float) -> float:
+        norm = 1 - self.b + self.b * length / average_length
+        return weight * tf * (self.k1 + 1) / (tf + self.k1 * norm)
+
+class SearchIndex():
+    def __init__(self, load_documents, changes:ChangeFeed | None = None, k1:float=1.2, b:float=0.75, cache_postings:int=2_000_000):
+        """An in memory inverted index over recipe names, descriptions and instructions, ranked with BM25.\n
+        load_documents: A function taking a list of recipe_ids, or None for every recipe, and returning
+        their (recipe_id, recipe_name, recipe_description, instructions) rows\n
+        changes: The recipes other worker processes created, edited or deleted, picked up by refresh()\n
+        cache_postings: How many postings to keep ranked by score, over all the terms searched for recently"""
+        self._load_documents = load_documents
+        self._changes = changes
+        self.k1 = k1
+        self.b = b
+        self.cache_postings = cache_postings
+        self._lock = threading.RLock()
+        self._loaded = False
+        self._generation = 0  # Bumped by every change to the postings
+        self._clear()
+
+    def add(self, recipe_id:int, recipe_name:str, recipe_description:str, instructions:str):
+        """Indexes (or re-indexes) a single recipe."""
+        with self._lock:
+            if not self._loaded:
+                return  # The first search will read this recipe from the database
+            self._add(recipe_id, recipe_name, recipe_description, instructions)
+
+    def remove(self, recipe_id:int):
+        """Drops a recipe from the index."""
+        with self._lock:
+            self._remove(recipe_id)
+
+    def warm(self):
+        """Loads the index now rather than on the first search."""
+        self._ensure_loaded()
+
+    def refresh(self):
+        """Picks up the recipes other worker processes created, edited or deleted since the last refresh. Run it every few seconds."""
+        if not self._loaded or self._changes is None:
+            return
+        changed = self._changes.poll()
+        if changed is None:
+            with self._lock:
+                self._load()
+            return
+        if not changed:
+            return
+        documents = {document[0]: document for document in self._load_documents(sorted(changed))}
+        with self._lock:
+            for recipe_id in changed:
+                if recipe_id in documents:
+                    self._add(*documents[recipe_id])
+                else:
+                    self._remove(recipe_id)
+
+    def search(self, name_query:str='', text_query:str='', limit:int|None=None, after:tuple[float, int]|None=None, allowed:set[int]|None=None) -> list[tuple[int, float]]:
+        """Ranks recipes against a query on the name and a query on all of the text.\n
+        When both queries are given a recipe has to match both of them.\n
+        limit: Only find this many best matches, which lets a search stop long before it read every recipe containing the terms\n
+        after: The (score, recipe_id) of the last match of the previous page, so only the matches ranked after it are returned\n
+        allowed: Only these recipe_ids can match, e.g. the recipes with the chosen tags\n
+        returns: A list of (recipe_id, score), best match first"""
+        self._ensure_loaded()
+        if limit == 0:
+            return []
+
+        # Only looking up the terms needs the lock, the ranking reads ranked copies of their postings
+        queries = []
+        with self._lock:
+            for query, fields in zip((name_query, text_query), SEARCHED_FIELDS):
+                terms = tokenize(query or '')
+                if terms:
+                    # Unknown terms are probably typos, so search for the closest known terms instead
+                    queries.append([(fields, match, weight) for term in terms for match, weight in self._expand(term)])
+
+        lists = []
+        for query, terms in enumerate(queries):
+            query_lists = []
+            for fields, match, weight in terms:
+                impacts = self._term_impacts(fields, match)
+                if impacts is not None:
+                    query_lists.append((weight, impacts, query))
+            if not query_lists:
+                return []  # Nothing matches this query, so nothing matches both
+            lists.extend(query_lists)
+        if not lists:
+            return []
+        return self._rank(lists, len(queries), limit, after, allowed)
+
+    def _rank(self, lists:list[tuple[float, TermImpacts, int]], queries:int, limit:int | None, after:tuple[float, int] | None, allowed:set[int] | None) -> list[tuple[int, float]]:
+        after_key = None if after is None else (-after[0], after[1])
+        best = []  # A heap of (score, -recipe_id), the worst match kept on top
+
+        def consider(recipe_id:int):
+            score, matched = 0.0, set()
+            for weight, impacts, query in lists:
+                impact = impacts.impact(recipe_id)
+                if impact is not None:
+                    score += weight * impact
+                    matched.add(query)
+            if len(matched) < queries or (after_key is not None and (-score, recipe_id) <= after_key):
+                return
+            if limit is None or len(best) < limit:
+                heapq.heappush(best, (score, -recipe_id))
+            elif (score, -recipe_id) > best[0]:
+                heapq.heapreplace(best, (score, -recipe_id))
+
+        # A match has to be allowed and match every query, so when one of those leaves few recipes just score them
+        smallest, candidates = None, None
+        if allowed is not None:
+            smallest, candidates = len(allowed), allowed
+        if queries > 1:
+            for query in range(queries):
+                postings = [impacts.recipe_ids for _, impacts, list_query in lists if list_query == query]
+                size = sum(map(len, postings))
+                if smallest is None or size < smallest:
+                    smallest, candidates = size, set(chain.from_iterable(postings))
+        if smallest is not None and smallest <= sum(len(impacts.recipe_ids) for _, impacts, _ in lists) // 2:
+            for recipe_id in candidates:
+                if allowed is None or recipe_id in allowed:
+                    consider(recipe_id)
+        else:
+            # Read every term's postings best first, one row at a time. A recipe not read yet scores at most the sum of
+            # the impacts in the current row, so stop once that cannot beat the worst match kept. With a single term the
+            # postings are in result order, so a recipe not read yet cannot beat it on a tie either
+            single = len(lists) == 1
+            # A recipe read in one term's postings scores at most its impact there plus the best impact of every other term
+            best_impacts = [weight * impacts.impacts[0] for weight, impacts, _ in lists]
+            best_total = sum(best_impacts)
+            seen = set()
+            depth = 0
+            while True:
+                bound, more = 0.0, False
+                for (weight, impacts, _), best_impact in zip(lists, best_impacts):
+                    if depth < len(impacts.recipe_ids):
+                        more = True
+                        impact = weight * impacts.impacts[depth]
+                        bound += impact
+                        recipe_id = impacts.recipe_ids[depth]
+                        if recipe_id not in seen:
+                            seen.add(recipe_id)
+                            if allowed is not None and recipe_id not in allowed:
+                                continue
+                            if limit is not None and len(best) == limit and impact + best_total - best_impact < best[0][0] - 1e-9:
+                                continue
+                            consider(recipe_id)
+                if not more:
+                    break
+                if limit is not None and len(best) == limit and (bound < best[0][0] or (single and bound == best[0][0])):
+                    break
+                depth += 1
+        return [(-negative_id, score) for score, negative_id in sorted(best, reverse=True)]
+
+    def _term_impacts(self, fields:tuple[str, ...], term:str) -> TermImpacts | None:
+        key = (fields, term)
+        with self._lock:
+            postings = [self._postings[field].get(term) or {} for field in fields]
+            if not any(postings):
+                return None
+            document_count = len(self._documents) or 1
+            cached = self._impacts.get(key)
+            # The scores depend on how many recipes there are, so rank the postings again once that moved by a tenth
+            if cached is not None and abs(cached.document_count - document_count) <= document_count * 0.1:
+                self._impacts.move_to_end(key)
+                return cached
+            items = [list(field_postings.items()) for field_postings in postings]
+            average_lengths = [self._total_lengths[field] / document_count or 1 for field in fields]
+            generation = self._generation
+
+        weighted = []
+        for field, field_postings, field_items, average_length in zip(fields, postings, items, average_lengths):
+            idf = math.log(1 + (document_count - len(field_items) + 0.5) / (len(field_items) + 0.5))
+            weighted.append((field_postings, self._lengths[field], FIELD_BOOSTS[field] * idf, average_length))
+        impacts = TermImpacts(weighted, items, document_count, self.k1, self.b)
+        with self._lock:
+            # Only keep them if no recipe was indexed or removed meanwhile, which could have changed the postings
+            if self._generation == generation:
+                self._forget(term)
+                self._impacts[key] = impacts
+                self._cached_postings += len(impacts.recipe_ids)
+                while self._cached_postings > self.cache_postings and len(self._impacts) > 1:
+                    _, evicted = self._impacts.popitem(last=False)
+                    self._cached_postings -= len(evicted.recipe_ids)
+        return impacts
+
+    def _forget(self, term:str):
+        for fields in SEARCHED_FIELDS:
+            impacts = self._impacts.pop((fields, term), None)
+            if impacts is not None:
+                self._cached_postings -= len(impacts.recipe_ids)
+
+    def _expand(self, term:str, max_matches:int=3, min_similarity:float=0.4) -> list[tuple[str, float]]:
+        if term in self._term_refs:
+            return [(term, 1.0)]
+        grams = trigrams(term)
+        overlap = defaultdict(int)
+        for gram in grams:
+            for candidate in self._trigrams.get(gram, ()):
+                overlap[candidate] += 1
+        similar = []
+        for candidate, shared in overlap.items():
+            similarity = shared / (len(grams) + len(trigrams(candidate)) - shared)
+            if similarity >= min_similarity:
+                similar.append((candidate, similarity))
+        similar.sort(key=lambda pair: -pair[1])
+        return similar[:max_matches]
+
+    def _ensure_loaded(self):
+        if self._loaded:
+            return
+        with self._lock:
+            if not self._loaded:
+                self._load()
+
+    def _load(self):
+        """Loads every recipe, following the change log from here on. Called with the lock held."""
+        if self._changes is not None:
+            self._changes.start()
+        self._clear()
+        for recipe_id, recipe_name, recipe_description, instructions in self._load_documents(None):
+            self._add(recipe_id, recipe_name, recipe_description, instructions)
+        self._loaded = True
+
+    def _clear(self):
+        self._postings = {field: defaultdict(dict) for field in FIELD_BOOSTS}  # field -> term -> {recipe_id: tf}
+        self._lengths = {field: {} for field in FIELD_BOOSTS}  # field -> recipe_id -> term count
+        self._total_lengths = {field: 0 for field in FIELD_BOOSTS}
+        self._documents = {}  # recipe_id -> set of terms, used to remove a recipe
+        self._trigrams = defaultdict(set)  # trigram -> terms containing it
+        self._term_refs = defaultdict(int)  # term -> number of recipes using it
+        self._impacts = OrderedDict()  # (fields, term) -> TermImpacts, least recently searched first
+        self._cached_postings = 0
+        self._generation += 1
+
+    def _add(self, recipe_id:int, recipe_name:str, recipe_description:str, instructions:str):
+        self._remove(recipe_id)
+        document_terms = set()
+        for field, text in (('name', recipe_name), ('description', recipe_description), ('instructions', instructions)):
+            terms = tokenize(text or '')
+            counts = Counter(terms)
+            postings = self._postings[field]
+            for term, tf in counts.items():
+                postings[term][recipe_id] = tf
+            self._lengths[field][recipe_id] = len(terms)
+            self._total_lengths[field] += len(terms)
+            document_terms.update(counts)
+        for term in document_terms:
+            if term not in self._term_refs:
+                for gram in trigrams(term):
+                    self._trigrams[gram].add(term)
+            self._term_refs[term] += 1
+            if self._impacts:
+                self._forget(term)
+        self._documents[recipe_id] = document_terms
+        self._generation += 1
+
+    def _remove(self, recipe_id:int):
+        document_terms = self._documents.pop(recipe_id, None)
+        if document_terms is None:
+            return
+        for field in FIELD_BOOSTS:
+            for term in document_terms:
+                postings = self._postings[field].get(term)
+                if postings and postings.pop(recipe_id, None) is not None:
+                    self._forget(term)
+                    if not postings:
+                        del self._postings[field][term]
+            self._total_lengths[field] -= self._lengths[field].pop(recipe_id, 0)
+        for term in document_terms:
+            self._term_refs[term] -= 1
+            if self._term_refs[term] == 0:
+                del self._term_refs[term]
+                for gram in trigrams(term):
+                    self._trigrams[gram].discard(term)
+        self._generation += 1
@@ -0,0 +1,82 @@
+import os
+import threading
+from pydantic import BaseModel
+from dotenv import load_dotenv
+
+class Settings(BaseModel):
+    """Every setting the app reads from .env and the environment, parsed and type checked once at startup."""
+    secret: str | None = None
+
+    # Database
+    db_backend: str = 'mysql'
+    db_host: str | None = None
+    db_user: str | None = None
+    db_password: str | None = None
+    db_database: str | None = None
+    db_path: str = 'cooking.sqlite3'
+    db_pool_size: int = 5
+    db_pool_timeout: float = 10.0
+    db_pool_recycle: float = 300.0
+    db_replicas: str | None = None  # Comma separated read replicas, host[:port] for MySQL or file paths for SQLite
+    db_replica_max_lag: float = 5.0  # Replicas further behind the primary than this many seconds get no reads
+    db_replica_check_seconds: float = 2.0  # How often a worker measures the lag of each replica
+    strict_row_mapping: bool = False  # Validate every row read into a model, e.g. to catch a schema that drifted from the models
+
+    # Caches
+    recipe_cache_bytes: int = 64 * 1024 * 1024
+    recipe_cache_url: str | None = None
+    recipe_cache_ttl: int = 3600
+    recipe_cache_local_ttl: float = 5.0  # How long a worker keeps its own copy of a recipe, so other workers' edits show up
+    fragment_cache_bytes: int = 16 * 1024 * 1024
+
+    # Responses
+    stream_list_pages: bool = False
+    compress_min_bytes: int = 1024
+    server_timing: bool = False
+
+    # Instrumentation
+    slow_query_ms: float = 200.0
+    n_plus_one_threshold: int = 10
+
+    # Search
+    index_sync_seconds: float = 30.0  # How often a worker picks up the recipes other workers created, edited or deleted into its search indexes
+    recipe_change_prune_seconds: float = 3600.0  # How often a worker trims the recipe_change log those come from, 0 to leave it to a cron job
+
+    # Recommendations
+    recommendations_top_k: int = 10  # Similar recipes stored per recipe
+    recommendations_refresh_seconds: float = 60.0  # How often a worker recomputes the queued recipes, 0 to leave it to a cron job
+
+    # Images
+    image_workers: int = 2
+    max_image_bytes: int = 15 * 1024 * 1024 + 512 * 1024
+    upload_spool_bytes: int = 1024 * 1024  # Uploads bigger than this are kept in a temporary file rather than in memory
+    blob_dir: str = 'blobs'  # Where the original uploads are stored, by content hash
+    blob_gc_seconds: float = 3600.0  # How often a worker deletes images no recipe uses any more, 0 to leave it to a cron job
+
+    # Startup
+    warm_start: bool = False
+    db_pool_warm: int | None = None  # Connections opened by the warm up, DB_POOL_SIZE if unset
+    template_cache_dir: str | None = None
+
+    @classmethod
+    def from_env(cls) -> 'Settings':
+        """Reads .env into the environment, then every field from the upper case variable of the same name."""
+        load_dotenv()
+        values = {}
+        for name in cls.model_fields:
+            value = os.getenv(name.upper())
+            if value is not None and value != '':
+                values[name] = value
+        return cls(**values)
+
+_settings = None
+_settings_lock = threading.Lock()
+
+def get_settings() -> Settings:
+    """returns: The settings of this process, loaded the first time they are needed"""
+    global _settings
+    if _settings is None:
+        with _settings_lock:
+            if _settings is None:
+                _settings = Settings.from_env()
+    return _settings
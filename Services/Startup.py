@@ -0,0 +1,65 @@
+import time
+import logging
+import threading
+from flask import g
+
+logger = logging.getLogger('cookbook.startup')
+
+class StartupTimer():
+    def __init__(self, started:float):
+        """Measures how long a worker took to become ready and to answer its first request.\n
+        started: time.perf_counter() taken as early as possible, before the app's imports"""
+        self.started = started
+        self._lock = threading.Lock()
+        self._stats = {'startup_seconds': None, 'warm_up_seconds': None, 'first_request_seconds': None, 'first_request_since_start_seconds': None}
+
+    def init_app(self, app):
+        @app.before_request
+        def time_first_request():
+            if self._stats['first_request_seconds'] is None:
+                g._startup_request_started = time.perf_counter()
+
+        @app.teardown_request
+        def record_first_request(exception=None):
+            request_started = g.pop('_startup_request_started', None)
+            if request_started is None:
+                return
+            with self._lock:
+                if self._stats['first_request_seconds'] is not None:
+                    return
+                finished = time.perf_counter()
+                self._stats['first_request_seconds'] = finished - request_started
+                self._stats['first_request_since_start_seconds'] = finished - self.started
+            logger.info('First request took %.1f ms', self._stats['first_request_seconds'] * 1000)
+
+    def warmed_up(self, seconds:float):
+        self._stats['warm_up_seconds'] = seconds
+
+    def ready(self):
+        """Called once the app is built and warmed up."""
+        self._stats['startup_seconds'] = time.perf_counter() - self.started
+        logger.info('Started in %.1f ms', self._stats['startup_seconds'] * 1000)
+
+    def stats(self) -> dict:
+        """returns: The startup timings in seconds, None until they happen"""
+        with self._lock:
+            return dict(self._stats)
+
+def precompile_templates(app) -> int:
+    """Compiles every template into the bytecode cache, so no worker has to compile them on its first requests.\n
+    returns: The number of templates compiled"""
+    names = app.jinja_env.list_templates(extensions=['html'])
+    for name in names:
+        app.jinja_env.get_template(name)
+    return len(names)
+
+def warm_up(app, pool, pool_connections:int, indexes=()) -> float:
+    """Does the work that would otherwise slow down a new worker's first requests: loads every template,
+    opens database connections and loads the given in memory indexes.\n
+    returns: How many seconds it took"""
+    started = time.perf_counter()
+    precompile_templates(app)
+    pool.warm(pool_connections)
+    for index in indexes:
+        index.warm()
+    return time.perf_counter() - started
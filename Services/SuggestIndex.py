@@ -0,0 +1,224 @@
+import re
+import bisect
+import heapq
+import threading
+from collections import OrderedDict
+
+from Services.ChangeFeed import ChangeFeed
+
+WORD_RE = re.compile(r"[a-z0-9]+")
+REBUILD_CHANGES = 1000  # A refresh that picks up more changed recipes than this rebuilds the index
+
+def normalize(text:str) -> str:
+    """Lower cases text and reduces it to words separated by single spaces, so "Mom's  Apple-Pie" becomes "mom s apple pie"."""
+    return ' '.join(WORD_RE.findall((text or '').lower()))
+
+def name_keys(recipe_name:str) -> list[str]:
+    """returns: The name from each of its words onwards, so typing "pie" or "apple p" both find "Mom's Apple Pie\""""
+    words = normalize(recipe_name).split(' ')
+    return list(dict.fromkeys(' '.join(words[index:]) for index in range(len(words)) if words[index]))
+
+def name_prefixes(recipe_name:str) -> set[str]:
+    """returns: Every query that suggests the recipe, i.e. every prefix of its name_keys"""
+    return {key[:length] for key in name_keys(recipe_name) for length in range(1, len(key) + 1)}
+
+class SuggestIndex():
+    def __init__(self, load_names, load_popularity, load_tags, changes:ChangeFeed | None = None, cache_size:int=4096, depth:int=40):
+        """An in memory prefix index over recipe names and tags for autocomplete, best known recipes first.\n
+        load_names: A function taking a list of recipe_ids, or None for every recipe, and returning their (recipe_id, recipe_name) rows\n
+        load_popularity: A function returning {recipe_id: number of cookbooks it is saved in}\n
+        load_tags: A function returning {tag: number of recipes with it}\n
+        changes: The recipes other worker processes created, edited or deleted, picked up by refresh()\n
+        depth: How many of the best recipes are kept for each prefix, twice the most suggestions asked for, so that a few
+        of them dropping out does not mean scanning the prefix again"""
+        self._load_names = load_names
+        self._load_popularity = load_popularity
+        self._load_tags = load_tags
+        self._changes = changes
+        self.cache_size = cache_size
+        self.depth = depth
+        self._lock = threading.RLock()
+        self._loaded = False
+        self._keys = []  # Sorted (key, recipe_id) pairs, searched with bisect
+        self._names = {}  # recipe_id -> recipe_name
+        self._popularity = {}  # recipe_id -> cookbook saves
+        self._tags = {}  # normalized tag -> (tag, recipe count)
+        self._best = OrderedDict()  # prefix -> [the best recipe_ids matching it, whether that is every match], least recently used first
+
+    def warm(self):
+        """Loads the index now rather than on the first keystroke."""
+        self._ensure_loaded()
+
+    def suggest(self, query:str, limit:int=8) -> list[dict]:
+        """returns: Up to limit (at most depth / 2) tags and recipes whose name has a word starting with query, tags first, then the most saved recipes"""
+        prefix = normalize(query)
+        if not prefix:
+            return []
+        self._ensure_loaded()
+        with self._lock:
+            tags = sorted((entry for key, entry in self._tags.items() if key.startswith(prefix)), key=lambda entry: (-entry[1], entry[0]))
+            suggestions = [{'type': 'tag', 'tag': tag, 'recipes': count} for tag, count in tags[:limit]]
+            best = self._ranking(prefix)[:limit - len(suggestions)]
+            suggestions.extend({'type': 'recipe', 'recipe_id': recipe_id, 'recipe_name': self._names[recipe_id], 'saves': self._popularity.get(recipe_id, 0)} for recipe_id in best)
+            return suggestions
+
+    def add(self, recipe_id:int, recipe_name:str, tags:list[str] = ()):
+        """Indexes (or re-indexes) a single recipe, e.g. right after it is created."""
+        with self._lock:
+            if not self._loaded:
+                return  # The first suggest will read this recipe from the database
+            self._add(recipe_id, recipe_name)
+            self._count_tags(tags, 1)
+
+    def remove(self, recipe_id:int, tags:list[str] = ()):
+        """Drops a recipe, e.g. right after it is deleted, taking its tags back out of the tag counts."""
+        with self._lock:
+            if not self._loaded:
+                return
+            self._remove(recipe_id)
+            self._popularity.pop(recipe_id, None)
+            self._count_tags(tags, -1)
+
+    def replace(self, recipe_id:int, recipe_name:str, old_tags:list[str], new_tags:list[str]):
+        """Re-indexes a recipe after an edit, moving the tag counts from its old tags to its new ones and keeping its saves."""
+        with self._lock:
+            if not self._loaded:
+                return
+            saves = self._popularity.get(recipe_id, 0)
+            self.remove(recipe_id, old_tags)
+            self._popularity[recipe_id] = saves
+            self.add(recipe_id, recipe_name, new_tags)
+
+    def add_saves(self, recipe_id:int, count:int):
+        """Adjusts a recipe's popularity when it is saved to (or removed from) a cookbook."""
+        with self._lock:
+            if self._loaded:
+                self._set_saves(recipe_id, max(0, self._popularity.get(recipe_id, 0) + count))
+
+    def refresh(self):
+        """Picks up the recipes other worker processes created, edited or deleted, and the save and tag counts from their counter tables.
+        Run it every minute or so."""
+        if not self._loaded:
+            return
+        changed = self._changes.poll() if self._changes is not None else set()
+        if changed is None:
+            with self._lock:
+                self._load()
+            return
+        names = dict(self._load_names(sorted(changed))) if changed else {}
+        popularity = dict(self._load_popularity())
+        tags = {normalize(tag): (tag, count) for tag, count in self._load_tags().items()}
+        with self._lock:
+            if len(changed) > REBUILD_CHANGES:
+                # Sorting every key again beats inserting this many one at a time
+                self._rebuild({**{recipe_id: name for recipe_id, name in self._names.items() if recipe_id not in changed}, **names})
+            else:
+                for recipe_id in changed:
+                    if recipe_id in names:
+                        self._add(recipe_id, names[recipe_id])
+                    else:
+                        self._remove(recipe_id)
+            for recipe_id in self._popularity.keys() | popularity.keys():
+                if recipe_id in self._names and self._popularity.get(recipe_id, 0) != popularity.get(recipe_id, 0):
+                    self._set_saves(recipe_id, popularity.get(recipe_id, 0))
+            self._tags = tags
+
+    def _ensure_loaded(self):
+        if self._loaded:
+            return
+        with self._lock:
+            if not self._loaded:
+                self._load()
+
+    def _load(self):
+        """Loads every recipe, following the change log from here on. Called with the lock held."""
+        if self._changes is not None:
+            self._changes.start()
+        self._popularity = dict(self._load_popularity())
+        self._tags = {normalize(tag): (tag, count) for tag, count in self._load_tags().items()}
+        self._rebuild(dict(self._load_names(None)))
+        self._loaded = True
+
+    def _rebuild(self, names:dict[int, str]):
+        self._names = names
+        self._keys = sorted((key, recipe_id) for recipe_id, recipe_name in names.items() for key in name_keys(recipe_name))
+        self._best.clear()
+        # The one and two letter prefixes match the most names, so rank them now rather than on a keystroke
+        for prefix in sorted({key[:length] for key, _ in self._keys for length in (1, 2)}):
+            self._ranking(prefix)
+
+    def _rank(self, recipe_id:int) -> tuple:
+        return (-self._popularity.get(recipe_id, 0), self._names[recipe_id], recipe_id)
+
+    def _ranking(self, prefix:str) -> list[int]:
+        """returns: The best recipe_ids for the prefix, scanning the keys it matches unless they are cached"""
+        entry = self._best.get(prefix)
+        if entry is not None:
+            self._best.move_to_end(prefix)
+            return entry[0]
+        # Every key starting with the prefix sorts between the prefix and the prefix followed by the highest character
+        start = bisect.bisect_left(self._keys, (prefix,))
+        end = bisect.bisect_left(self._keys, (prefix + '\U0010ffff',), lo=start)
+        matches = {recipe_id for _, recipe_id in self._keys[start:end]}
+        self._best[prefix] = [heapq.nsmallest(self.depth, matches, key=self._rank), len(matches) <= self.depth]
+        if len(self._best) > self.cache_size:
+            self._best.popitem(last=False)
+        return self._best[prefix][0]
+
+    def _set_saves(self, recipe_id:int, saves:int):
+        self._popularity[recipe_id] = saves
+        if recipe_id in self._names:
+            prefixes = name_prefixes(self._names[recipe_id])
+            self._move(recipe_id, prefixes, prefixes)
+
+    def _move(self, recipe_id:int, old_prefixes:set[str], new_prefixes:set[str]):
+        """Moves a recipe within the cached rankings after its name or popularity changed, rather than ranking the prefixes again."""
+        rank = self._rank(recipe_id) if new_prefixes else None
+        for prefix in old_prefixes | new_prefixes:
+            entry = self._best.get(prefix)
+            if entry is None:
+                continue
+            best = entry[0]
+            if recipe_id in best:
+                best.remove(recipe_id)
+            # The recipes left out of a ranking all rank below its last one, so the recipe only goes in above that
+            if prefix in new_prefixes and (entry[1] or (best and rank < self._rank(best[-1]))):
+                bisect.insort(best, recipe_id, key=self._rank)
+                if len(best) > self.depth:
+                    best.pop()
+                    entry[1] = False
+            if not entry[1] and len(best) < self.depth // 2:
+                del self._best[prefix]
+
+    def _add(self, recipe_id:int, recipe_name:str):
+        old_name = self._names.get(recipe_id)
+        self._remove_keys(recipe_id)
+        self._names[recipe_id] = recipe_name
+        for key in name_keys(recipe_name):
+            bisect.insort(self._keys, (key, recipe_id))
+        self._move(recipe_id, name_prefixes(old_name) if old_name is not None else set(), name_prefixes(recipe_name))
+
+    def _remove(self, recipe_id:int):
+        recipe_name = self._names.get(recipe_id)
+        if recipe_name is None:
+            return
+        self._remove_keys(recipe_id)
+        self._move(recipe_id, name_prefixes(recipe_name), set())
+        del self._names[recipe_id]
+
+    def _count_tags(self, tags:list[str], amount:int):
+        for tag in tags:
+            name, count = self._tags.get(normalize(tag), (tag, 0))
+            if count + amount > 0:
+                self._tags[normalize(tag)] = (name, count + amount)
+            else:
+                self._tags.pop(normalize(tag), None)
+
+    def _remove_keys(self, recipe_id:int):
+        recipe_name = self._names.get(recipe_id)
+        if recipe_name is None:
+            return
+        for key in name_keys(recipe_name):
+            index = bisect.bisect_left(self._keys, (key, recipe_id))
+            if index < len(self._keys) and self._keys[index] == (key, recipe_id):
+                del self._keys[index]
@@ -0,0 +1,57 @@
+import os
+import tempfile
+from flask import Request, flash, redirect, request
+from werkzeug.exceptions import RequestEntityTooLarge
+
+from Services.ImageTypes import sniff_mime_type
+
+FORM_FIELDS_BYTES = 64 * 1024  # Room for the text fields and multipart headers sent along with an image
+
+class UploadRequest(Request):
+    """A request that keeps each uploaded file in memory only up to spool_bytes, and in a temporary file beyond that."""
+    spool_bytes = 1024 * 1024
+
+    def _get_file_stream(self, total_content_length, content_type, filename=None, content_length=None):
+        return tempfile.SpooledTemporaryFile(max_size=self.spool_bytes, mode='rb+')
+
+def upload_size(file) -> int:
+    """returns: The size of an uploaded file in bytes, found without reading it"""
+    stream = file.stream
+    stream.seek(0, os.SEEK_END)
+    size = stream.tell()
+    stream.seek(0)
+    return size
+
+def check_image(file, max_bytes:int) -> str | None:
+    """Checks the size and type of an uploaded image without reading it, and leaves its stream at the start.\n
+    returns: The mime_type of the image, or None if no file was chosen\n
+    raises: ValueError if the file is too big or not an image"""
+    if file is None:
+        return None
+    size = upload_size(file)
+    if size == 0:
+        return None
+    if size > max_bytes:
+        raise ValueError(f'Image size exceeds {max_bytes / 1024 / 1024:g} MB')
+
+    # The first bytes are enough to tell an image from anything else
+    mime_type = sniff_mime_type(file.stream.read(16))
+    if not mime_type:
+        raise ValueError('The file is not a PNG, JPEG, GIF, WebP or AVIF image')
+    file.stream.seek(0)
+    return mime_type
+
+def init_app(app, max_image_bytes:int, spool_bytes:int):
+    """Caps the size of every request body, so an oversized upload is refused from its Content-Length
+    (or as soon as a streamed body passes the cap) before it is read, and spools uploads to disk past spool_bytes."""
+    UploadRequest.spool_bytes = spool_bytes
+    app.request_class = UploadRequest
+    app.config['MAX_CONTENT_LENGTH'] = max_image_bytes + FORM_FIELDS_BYTES
+
+    @app.errorhandler(RequestEntityTooLarge)
+    def upload_too_large(error):
+        # Browsers show nothing useful for a bare 413, so send them back to the form they came from
+        if request.url_rule is None or 'GET' not in request.url_rule.methods:
+            return error
+        flash(f'Image size exceeds {max_image_bytes / 1024 / 1024:g} MB', 'error')
+        return redirect(request.path)
@@ -0,0 +1,63 @@
+import json
+import math
+import re
+import time
+
+def percentile(samples:list[float], pct:float) -> float:
+    """The nearest-rank percentile of samples."""
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    rank = max(1, math.ceil(pct / 100 * len(ordered)))
+    return ordered[rank - 1]
+
+def summarize(samples:list[float], elapsed:float, queries:list[int] | None = None) -> dict:
+    """Turns latency samples (seconds) into the numbers saved in a baseline."""
+    summary = {
+        'count': len(samples),
+        'p50_ms': percentile(samples, 50) * 1000,
+        'p95_ms': percentile(samples, 95) * 1000,
+        'p99_ms': percentile(samples, 99) * 1000,
+        'mean_ms': (sum(samples) / len(samples) * 1000) if samples else 0.0,
+        'throughput_per_s': len(samples) / elapsed if elapsed else 0.0,
+    }
+    if queries is not None:
+        summary['queries_per_request'] = sum(queries) / len(queries) if queries else 0.0
+    return summary
+
+def time_calls(function, repeat:int) -> dict:
+    """Times repeat calls of function, for micro-benchmarks."""
+    samples = []
+    started = time.perf_counter()
+    for _ in range(repeat):
+        call_started = time.perf_counter()
+        function()
+        samples.append(time.perf_counter() - call_started)
+    return summarize(samples, time.perf_counter() - started)
+
+def queries_from_server_timing(header:str | None) -> int:
+    """Reads the query count out of the Server-Timing header the app sends when SERVER_TIMING=1."""
+    match = re.search(r'db;[^,]*desc="(\d+) queries"', header or '')
+    return int(match.group(1)) if match else 0
+
+def save_results(path:str, results:dict):
+    with open(path, 'w') as file:
+        json.dump(results, file, indent=2, sort_keys=True)
+
+def compare_results(baseline_path:str, results:dict, threshold:float=0.10) -> list[str]:
+    """Compares every p95 and queries_per_request figure to a saved baseline.\n
+    returns: A line per figure that got worse by more than threshold"""
+    with open(baseline_path) as file:
+        baseline = json.load(file)
+    regressions = []
+    for section in ('routes', 'micro'):
+        for name, current in results.get(section, {}).items():
+            previous = baseline.get(section, {}).get(name)
+            if not previous:
+                continue
+            for metric in ('p95_ms', 'queries_per_request'):
+                if metric in current and previous.get(metric):
+                    change = current[metric] / previous[metric] - 1
+                    if change > threshold:
+                        regressions.append(f'{section}/{name} {metric}: {previous[metric]:.2f} -> {current[metric]:.2f} (+{change:.0%})')
+    return regressions
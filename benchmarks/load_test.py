@@ -0,0 +1,63 @@
+import time
+import random
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+
+from benchmarks.common import queries_from_server_timing, summarize
+from benchmarks.seed import PASSWORD, TAGS, WORDS
+
+def pick_request(rng:random.Random, user_id:int, recipe_count:int) -> tuple[str, str, str, dict | None]:
+    """Picks the next request of a simulated user, weighted towards the read heavy pages.\n
+    returns: (name, method, path, form data)"""
+    recipe_id = rng.randint(1, recipe_count)
+    entry = {'recipe_id': recipe_id}
+    choices = [
+        (20, ('GET /', 'GET', '/', None)),
+        (10, ('GET /try_recipes', 'GET', '/try_recipes', None)),
+        (15, ('GET /search (text)', 'GET', f'/search?recipe_name={rng.choice(WORDS)}', None)),
+        (10, ('GET /search (tags)', 'GET', f'/search?tags={rng.choice(TAGS)}&tag_match=any', None)),
+        (15, ('GET /recipe', 'GET', f'/recipe?recipe_id={recipe_id}', None)),
+        (10, ('GET /recipe/<id>/image', 'GET', f'/recipe/{recipe_id}/image?size=thumb', None)),
+        (2, ('GET /stats', 'GET', '/stats', None)),
+        (4, ('POST /add_to_personal_cookbook', 'POST', '/add_to_personal_cookbook', entry)),
+        (4, ('POST /remove_recipe_from_pcb', 'POST', '/remove_recipe_from_pcb', entry)),
+        (4, ('POST /add_to_try_list', 'POST', '/add_to_try_list', entry)),
+        (4, ('POST /remove_recipe_from_try_list', 'POST', '/remove_recipe_from_try_list', entry)),
+        (4, ('POST /login', 'POST', '/login', {'username': f'bench_user_{user_id}', 'password': PASSWORD})),
+    ]
+    weights, requests = zip(*choices)
+    return rng.choices(requests, weights=weights)[0]
+
+def run_load_test(app, users:int, recipe_count:int, concurrency:int=8, requests_per_worker:int=200, rng_seed:int=7) -> dict:
+    """Drives every route with concurrent simulated users through Flask test clients.\n
+    returns: Latency percentiles, throughput and queries per request for each route"""
+    samples = defaultdict(list)
+    queries = defaultdict(list)
+    errors = defaultdict(int)
+
+    def worker(index:int):
+        rng = random.Random(rng_seed + index)
+        user_id = index % users + 1
+        client = app.test_client()
+        client.post('/login', data={'username': f'bench_user_{user_id}', 'password': PASSWORD})
+        for _ in range(requests_per_worker):
+            name, method, path, data = pick_request(rng, user_id, recipe_count)
+            started = time.perf_counter()
+            response = client.open(path, method=method, data=data, headers={'Referer': '/'})
+            response.get_data()  # Read streamed bodies to the end
+            elapsed = time.perf_counter() - started
+            samples[name].append(elapsed)
+            queries[name].append(queries_from_server_timing(response.headers.get('Server-Timing')))
+            if response.status_code >= 400:
+                errors[name] += 1
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        list(executor.map(worker, range(concurrency)))
+    elapsed = time.perf_counter() - started
+
+    results = {name: dict(summarize(samples[name], elapsed, queries[name]), errors=errors[name]) for name in samples}
+    all_samples = [sample for route_samples in samples.values() for sample in route_samples]
+    all_queries = [count for route_queries in queries.values() for count in route_queries]
+    results['ALL'] = dict(summarize(all_samples, elapsed, all_queries), errors=sum(errors.values()))
+    return results
@@ -0,0 +1,72 @@
+"""Times turning database rows into Recipe models, per row, over a batch of synthetic rows.
+
+Usage:
+    python -m benchmarks.mapping [--rows 10000] [--repeat 5]
+
+Compares a validated Recipe(...) call per row (how rows used to be mapped), Recipe.model_construct,
+the generated RowMapper function the DAOs use, and the RowMapper in strict mode. No database is needed.
+"""
+import json
+import time
+import random
+import argparse
+import statistics
+from datetime import date, timedelta
+
+from benchmarks.seed import TAGS, WORDS
+
+def make_rows(count:int, rng_seed:int=7) -> list[tuple]:
+    """returns: Rows shaped like SELECT RECIPE_COLUMNS returns them"""
+    rng = random.Random(rng_seed)
+    return [(
+        recipe_id, ' '.join(rng.sample(WORDS, 3)).title(), date(2024, 1, 1) + timedelta(days=recipe_id % 365), f'{recipe_id:064x}',
+        ' '.join(rng.choices(WORDS, k=20)), ' '.join(rng.choices(WORDS, k=120)), json.dumps(rng.sample(TAGS, rng.randint(0, 3))), rng.randint(1, 500)
+    ) for recipe_id in range(1, count + 1)]
+
+def run_mapping(rows:int=10000, repeat:int=5) -> dict:
+    """returns: The median cost per row in microseconds, and per batch in milliseconds, of each way of mapping"""
+    from DAOs.RowMapper import RowMapper
+    from DAOs.Recipe_DAO import RECIPE_COLUMN_NAMES
+    from Models.Recipe import Recipe
+
+    def validated(row):
+        recipe_id, recipe_name, date_created, image_hash, recipe_description, instructions, tags, user_id = row
+        return Recipe(recipe_id=recipe_id, recipe_name=recipe_name, date_created=date_created, image_hash=image_hash,
+                      recipe_description=recipe_description, instructions=instructions, tags=json.loads(tags), user_id=user_id)
+
+    def constructed(row):
+        recipe_id, recipe_name, date_created, image_hash, recipe_description, instructions, tags, user_id = row
+        return Recipe.model_construct(recipe_id=recipe_id, recipe_name=recipe_name, date_created=date_created, image_hash=image_hash,
+                                      recipe_description=recipe_description, instructions=instructions, tags=json.loads(tags), user_id=user_id)
+
+    mappers = {
+        'Recipe(...) (validated)': validated,
+        'Recipe.model_construct': constructed,
+        'RowMapper': RowMapper(Recipe, {'tags': json.loads}).for_columns(RECIPE_COLUMN_NAMES),
+        'RowMapper (strict)': RowMapper(Recipe, {'tags': json.loads}, strict=True).for_columns(RECIPE_COLUMN_NAMES),
+    }
+    batch = make_rows(rows)
+    results = {}
+    for name, mapper in mappers.items():
+        assert mapper(batch[0]) == validated(batch[0])
+        timings = []
+        for _ in range(repeat):
+            started = time.perf_counter()
+            for row in batch:
+                mapper(row)
+            timings.append(time.perf_counter() - started)
+        elapsed = statistics.median(timings)
+        results[name] = {'per_row_us': elapsed / rows * 1e6, 'batch_ms': elapsed * 1000}
+    return results
+
+def main(argv:list[str] | None = None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, default=10000)
+    parser.add_argument('--repeat', type=int, default=5, help='Batches timed per mapper, the median is reported')
+    args = parser.parse_args(argv)
+
+    for name, result in run_mapping(args.rows, args.repeat).items():
+        print(f"  {name:<30} {result['per_row_us']:8.2f} us/row  {result['batch_ms']:9.1f} ms per {args.rows} rows")
+
+if __name__ == '__main__':
+    main()
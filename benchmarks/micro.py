@@ -0,0 +1,47 @@
+import json
+import random
+from datetime import date
+
+from benchmarks.common import time_calls
+from benchmarks.seed import TAGS, WORDS
+
+def run_micro(users:int, recipe_count:int, repeat:int=200, rng_seed:int=11) -> dict:
+    """Times the DAO methods behind the list pages, and building the Recipe models, one call at a time.\n
+    returns: Latency percentiles for each benchmark"""
+    from DAOs.PCB_DAO import PcbDAO
+    from DAOs.Recipe_DAO import RecipeDAO, recipe_cache
+    from DAOs.Saved_DAO import SavedDAO, saved_set_cache
+    from DAOs.Tag_DAO import TagDAO
+    from Models.RecipeSummary import RecipeSummary
+
+    rng = random.Random(rng_seed)
+    page_ids = rng.sample(range(1, recipe_count + 1), min(50, recipe_count))
+
+    def uncached_recipe():
+        recipe_id = rng.randint(1, recipe_count)
+        recipe_cache.invalidate(recipe_id)
+        RecipeDAO().retrieve_recipe_by_id(recipe_id)
+
+    def uncached_flags():
+        user_id = rng.randint(1, users)
+        saved_set_cache.invalidate(user_id)
+        SavedDAO().retrieve_saved_flags(user_id, page_ids)
+
+    # A full recipe row and a summary row, as the database returns them
+    recipe_row = (1, 'Chocolate Cake', date(2024, 1, 1), '0' * 64, ' '.join(WORDS[:20]), ' '.join(WORDS * 3), json.dumps(TAGS[:2]), 1)
+    summary_row = (1, 'Chocolate Cake', date(2024, 1, 1), ' '.join(WORDS[:20]), ' '.join(WORDS)[:200], json.dumps(TAGS[:2]), 1, 'ab' * 32)
+
+    benchmarks = {
+        'RecipeDAO.retrieve_recipe_summaries_by_ids (50 ids)': lambda: RecipeDAO().retrieve_recipe_summaries_by_ids(page_ids),
+        'RecipeDAO.retrieve_recipe_by_id (cached)': lambda: RecipeDAO().retrieve_recipe_by_id(page_ids[0]),
+        'RecipeDAO.retrieve_recipe_by_id (uncached)': uncached_recipe,
+        'RecipeDAO.search_recipe_ids (text)': lambda: RecipeDAO().search_recipe_ids(rng.choice(WORDS), '', []),
+        'RecipeDAO.search_recipe_ids (tags)': lambda: RecipeDAO().search_recipe_ids('', '', rng.sample(TAGS, 2)),
+        'TagDAO.retrieve_tag_counts (50 ids)': lambda: TagDAO().retrieve_tag_counts(page_ids),
+        'SavedDAO.retrieve_saved_flags (cached)': lambda: SavedDAO().retrieve_saved_flags(1, page_ids),
+        'SavedDAO.retrieve_saved_flags (uncached)': uncached_flags,
+        'PcbDAO.retrieve_entries_by_user (one page)': lambda: PcbDAO().retrieve_entries_by_user(rng.randint(1, users), limit=51),
+        'Recipe model construction': lambda: RecipeDAO()._convert_data_to_recipe__(recipe_row),
+        'RecipeSummary construction': lambda: RecipeSummary.from_row(summary_row),
+    }
+    return {name: time_calls(function, repeat) for name, function in benchmarks.items()}
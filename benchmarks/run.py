@@ -0,0 +1,106 @@
+"""Seeds a benchmark database, load tests every route and times the DAOs.
+
+Usage:
+    python -m benchmarks.run --database cooking_bench [--scale small] [--out benchmarks/results/small.json]
+    python -m benchmarks.run --database cooking_bench --no-seed --compare benchmarks/results/small.json
+    python -m benchmarks.run --backend sqlite --database bench.sqlite3
+
+The benchmark database is dropped and refilled, so never point --database at real data.
+Exits with status 1 when a p95 or queries-per-request figure regressed past --threshold.
+"""
+import os
+import sys
+import argparse
+import platform
+import subprocess
+from datetime import datetime
+from dotenv import load_dotenv
+
+from benchmarks.common import compare_results, save_results
+from benchmarks.seed import SCALES
+
+def main(argv:list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description='Load test and micro-benchmark the cookbook.')
+    parser.add_argument('--backend', choices=['mysql', 'sqlite'], default='mysql')
+    parser.add_argument('--database', required=True, help='A scratch database (a file path for sqlite), it is dropped and reseeded')
+    parser.add_argument('--scale', choices=list(SCALES), default='small')
+    parser.add_argument('--blob-dir', default=os.path.join('benchmarks', 'blobs'), help='A scratch folder for the image files of the seeded recipes')
+    parser.add_argument('--no-seed', action='store_true', help='Reuse the data already in --database')
+    parser.add_argument('--concurrency', type=int, default=8)
+    parser.add_argument('--requests', type=int, default=200, help='Requests per simulated user')
+    parser.add_argument('--repeat', type=int, default=200, help='Calls per micro-benchmark')
+    parser.add_argument('--out', help='Where to save the results (default benchmarks/results/<scale>.json)')
+    parser.add_argument('--compare', help='A saved baseline to check for regressions')
+    parser.add_argument('--threshold', type=float, default=0.10, help='Allowed slowdown before a figure counts as a regression')
+    args = parser.parse_args(argv)
+
+    # Point the app at the benchmark database before anything builds the connection pool
+    load_dotenv()
+    database_setting = 'DB_PATH' if args.backend == 'sqlite' else 'DB_DATABASE'
+    if not args.no_seed and os.getenv('DB_BACKEND', 'mysql') == args.backend and args.database == os.getenv(database_setting):
+        parser.error(f'{args.database} is the database in .env, refusing to reseed it')
+    os.environ['DB_BACKEND'] = args.backend
+    os.environ[database_setting] = args.database
+    os.environ['BLOB_DIR'] = args.blob_dir
+    os.environ.setdefault('SECRET', 'benchmark')
+    os.environ['SERVER_TIMING'] = '1'  # Each response reports how many queries it ran
+
+    from benchmarks.seed import reset_schema, seed
+    from benchmarks.load_test import run_load_test
+    from benchmarks.micro import run_micro
+
+    sizes = SCALES[args.scale]
+    seeded = None
+    if not args.no_seed:
+        print(f'Seeding {args.scale} dataset into {args.database}...')
+        reset_schema()
+        seeded = seed(args.scale)
+
+    from main import app
+
+    print('Load testing routes...')
+    routes = run_load_test(app, sizes['users'], sizes['recipes'], args.concurrency, args.requests)
+    print('Running micro-benchmarks...')
+    micro = run_micro(sizes['users'], sizes['recipes'], args.repeat)
+
+    results = {
+        'meta': {
+            'scale': args.scale,
+            'backend': args.backend,
+            'seeded': seeded,
+            'concurrency': args.concurrency,
+            'requests_per_worker': args.requests,
+            'timestamp': datetime.now().isoformat(timespec='seconds'),
+            'commit': _git_commit(),
+            'python': platform.python_version(),
+        },
+        'routes': routes,
+        'micro': micro,
+    }
+
+    for section in ('routes', 'micro'):
+        print(f'\n{section}:')
+        for name, figures in sorted(results[section].items()):
+            queries = f"  queries={figures['queries_per_request']:.1f}" if 'queries_per_request' in figures else ''
+            print(f"  {name:<55} p50={figures['p50_ms']:8.2f}ms  p95={figures['p95_ms']:8.2f}ms  p99={figures['p99_ms']:8.2f}ms  {figures['throughput_per_s']:8.1f}/s{queries}")
+
+    out = args.out or os.path.join('benchmarks', 'results', f'{args.scale}.json')
+    os.makedirs(os.path.dirname(out), exist_ok=True)
+    save_results(out, results)
+    print(f'\nSaved results to {out}')
+
+    if args.compare:
+        regressions = compare_results(args.compare, results, args.threshold)
+        for regression in regressions:
+            print(f'REGRESSION {regression}')
+        return 1 if regressions else 0
+    return 0
+
+def _git_commit() -> str | None:
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,116 @@
+import re
+import json
+import zlib
+import random
+import struct
+import hashlib
+from collections import Counter
+from datetime import date, timedelta
+
+from DAOs.GetConnection import get_backend, get_db_connection
+from DAOs.Stats_DAO import StatsDAO
+
+SCALES = {
+    'small': {'users': 50, 'recipes': 1000, 'cookbook_per_user': 20, 'try_per_user': 10},
+    'medium': {'users': 500, 'recipes': 20000, 'cookbook_per_user': 100, 'try_per_user': 50},
+    'large': {'users': 5000, 'recipes': 200000, 'cookbook_per_user': 200, 'try_per_user': 100},
+}
+TAGS = ['Dessert', 'Lunch', 'Breakfast', 'Gluten Free', 'Vegetarian', 'Vegan', 'Includes Nuts']
+WORDS = ('apple banana butter cake caramel cheese chicken chili chocolate cinnamon coconut cookie cream curry egg flour '
+         'garlic ginger honey lemon lentil maple mushroom noodle oat onion orange pasta peanut pepper pie pork potato '
+         'pumpkin rice salad salmon soup spinach steak strawberry sugar taco tomato vanilla waffle walnut yogurt').split()
+PASSWORD = 'password'
+BATCH_SIZE = 1000
+
+def make_png(width:int, height:int, seed:int) -> bytes:
+    """A valid solid colour PNG, made without Pillow so seeding has no image dependencies."""
+    def chunk(kind:bytes, data:bytes) -> bytes:
+        return struct.pack('>I', len(data)) + kind + data + struct.pack('>I', zlib.crc32(kind + data) & 0xffffffff)
+    colour = bytes([(seed * 37) % 256, (seed * 91) % 256, (seed * 53) % 256])
+    rows = b''.join(b'\x00' + colour * width for _ in range(height))
+    header = struct.pack('>IIBBBBB', width, height, 8, 2, 0, 0, 0)
+    return b'\x89PNG\r\n\x1a\n' + chunk(b'IHDR', header) + chunk(b'IDAT', zlib.compress(rows)) + chunk(b'IEND', b'')
+
+def reset_schema(create_script:str | None = None):
+    """Drops and recreates every table of the benchmark database from the backend's create script."""
+    with open(create_script or get_backend().schema_script) as file:
+        # Comments go first, whole line or trailing, so none ends up in front of the next statement (the scripts have no '--' in strings)
+        script = '\n'.join(re.sub(r'--.*$', '', line.rstrip('\n')) for line in file)
+    statements = [statement.strip() for statement in script.split(';')]
+    statements = [statement for statement in statements if statement and not statement.upper().startswith(('CREATE DATABASE', 'USE '))]
+    tables = [statement.split()[2] for statement in statements if statement.upper().startswith('CREATE TABLE')]
+
+    conn = get_db_connection()
+    try:
+        with conn.cursor() as cursor:
+            for table in reversed(tables):
+                cursor.execute(f"DROP TABLE IF EXISTS {table}")
+            for statement in statements:
+                cursor.execute(statement)
+        conn.commit()
+    finally:
+        conn.close()
+
+def seed(scale:str='small', image_side:int=256, rng_seed:int=42) -> dict:
+    """Fills an empty benchmark database with synthetic users, recipes (with images), tags and entries.\n
+    returns: What was seeded, for the results file"""
+    sizes = SCALES[scale]
+    rng = random.Random(rng_seed)
+    password_hash = hashlib.md5(PASSWORD.encode()).hexdigest()
+    from DAOs.Image_DAO import blob_store  # Imported here, since it reads the settings that run.py points at the benchmark first
+    images = [make_png(image_side, image_side, index) for index in range(16)]
+    image_hashes = [blob_store.put_bytes(image) for image in images]
+
+    conn = get_db_connection()
+    try:
+        with conn.cursor() as cursor:
+            # Users
+            users = [(user_id, f'bench_user_{user_id}', f'bench_user_{user_id}@example.com', 'Bench', f'User {user_id}', password_hash, '2024-01-01')
+                     for user_id in range(1, sizes['users'] + 1)]
+            cursor.executemany("INSERT INTO user (user_id, username, user_email, first_name, last_name, password_hash, date_joined) VALUES (%s, %s, %s, %s, %s, %s, %s)", users)
+
+            # The images the recipes share, counted up front since recipe i uses image i % 16
+            image_counts = Counter(image_hashes[recipe_id % len(image_hashes)] for recipe_id in range(1, sizes['recipes'] + 1))
+            cursor.executemany("INSERT INTO image_blob (blob_hash, ref_count) VALUES (%s, %s)", list(image_counts.items()))
+
+            # Recipes and their tags, in batches
+            for first_id in range(1, sizes['recipes'] + 1, BATCH_SIZE):
+                recipes, recipe_tags = [], []
+                for recipe_id in range(first_id, min(first_id + BATCH_SIZE, sizes['recipes'] + 1)):
+                    name = ' '.join(rng.sample(WORDS, 3)).title()
+                    tags = rng.sample(TAGS, rng.randint(0, 3))
+                    image_hash = image_hashes[recipe_id % len(image_hashes)]
+                    recipes.append((
+                        recipe_id, name, (date(2024, 1, 1) + timedelta(days=recipe_id % 365)).isoformat(), image_hash,
+                        ' '.join(rng.choices(WORDS, k=20)), ' '.join(rng.choices(WORDS, k=120)),
+                        json.dumps(tags), rng.randint(1, sizes['users']), 'image/png'
+                    ))
+                    recipe_tags.extend((recipe_id, tag) for tag in tags)
+                cursor.executemany("""
+                INSERT INTO recipe (recipe_id, recipe_name, date_created, image_hash, recipe_description, instructions, tags, user_id, image_mime_type)
+                VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s)
+                """, recipes)
+                if recipe_tags:
+                    cursor.executemany("INSERT INTO recipe_tag (recipe_id, tag) VALUES (%s, %s)", recipe_tags)
+                conn.commit()
+
+            # Cookbook and try list entries, skewed so a few recipes are popular
+            for table, per_user in (('personal_cookbook_entry', sizes['cookbook_per_user']), ('to_try_entry', sizes['try_per_user'])):
+                entries = []
+                for user_id in range(1, sizes['users'] + 1):
+                    saved = set()
+                    while len(saved) < min(per_user, sizes['recipes']):
+                        popular = rng.random() < 0.5
+                        saved.add(min(int(rng.paretovariate(1.2)), sizes['recipes']) if popular else rng.randint(1, sizes['recipes']))
+                    entries.extend((user_id, recipe_id) for recipe_id in sorted(saved))
+                    if len(entries) >= BATCH_SIZE or user_id == sizes['users']:
+                        cursor.executemany(f"INSERT INTO {table} (user_id, recipe_id) VALUES (%s, %s)", entries)
+                        conn.commit()
+                        entries = []
+        conn.commit()
+    finally:
+        conn.close()
+
+    # The rows went in around the DAOs, so count them for /stats in one go
+    StatsDAO().reconcile()
+    return dict(sizes, scale=scale, image_bytes=len(images[0]))
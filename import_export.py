@@ -0,0 +1,284 @@
+"""Bulk import and export of recipes.
+
+Usage:
+    python import_export.py import recipes.jsonl [--batch-size 500]
+    python import_export.py export out_dir/ [--format csv]
+
+Each recipe is one JSON line (or CSV row) with these fields:
+    recipe_id (optional), recipe_name, date_created, recipe_description, instructions,
+    tags (a list), user_id, image (a path relative to the file, optional),
+    cookbook_user_ids and try_user_ids (lists of users who saved the recipe, optional)
+In CSV files the list fields hold JSON, e.g. ["Dessert", "Vegan"].
+"""
+import os
+import csv
+import sys
+import json
+import time
+import argparse
+from datetime import datetime
+
+from DAOs.GetConnection import get_backend, get_db_connection
+from DAOs.Recipe_DAO import RecipeDAO
+from DAOs.Recommendation_DAO import RecommendationDAO
+from DAOs.Stats_DAO import StatsDAO
+from DAOs.Image_DAO import ImageDAO, blob_store
+from Services.ImageTypes import sniff_mime_type
+
+RECIPE_FIELDS = ['recipe_id', 'recipe_name', 'date_created', 'recipe_description', 'instructions', 'tags', 'user_id', 'image', 'cookbook_user_ids', 'try_user_ids']
+LIST_FIELDS = ('tags', 'cookbook_user_ids', 'try_user_ids')
+
+def read_rows(path:str):
+    """Streams the recipes of a JSONL or CSV file one at a time."""
+    with open(path, newline='', encoding='utf-8') as file:
+        if path.endswith('.csv'):
+            for row in csv.DictReader(file):
+                for field in LIST_FIELDS:
+                    row[field] = json.loads(row[field]) if row.get(field) else []
+                yield row
+        else:
+            for line in file:
+                if line.strip():
+                    yield json.loads(line)
+
+class Checkpoint():
+    """Remembers how many rows of an import have been committed, so a failed import can carry on where it stopped."""
+    def __init__(self, input_path:str):
+        self.path = input_path + '.checkpoint'
+
+    def load(self) -> int:
+        if not os.path.exists(self.path):
+            return 0
+        with open(self.path) as file:
+            return json.load(file)['rows_done']
+
+    def save(self, rows_done:int):
+        # Write then rename, so a crash never leaves a half written checkpoint
+        with open(self.path + '.tmp', 'w') as file:
+            json.dump({'rows_done': rows_done}, file)
+        os.replace(self.path + '.tmp', self.path)
+
+    def clear(self):
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+class Importer():
+    def __init__(self, input_path:str, batch_size:int=500):
+        self.input_path = input_path
+        self.base_dir = os.path.dirname(os.path.abspath(input_path))
+        self.batch_size = batch_size
+        self.checkpoint = Checkpoint(input_path)
+
+    def run(self):
+        rows_done = self.checkpoint.load()
+        if rows_done:
+            print(f'Resuming after row {rows_done}')
+
+        conn = get_db_connection()
+        try:
+            consecutive_ids = get_backend().has_consecutive_insert_ids(conn)
+            started = time.monotonic()
+            imported = 0
+            batch = []
+            for row_number, row in enumerate(read_rows(self.input_path), start=1):
+                if row_number <= rows_done:
+                    continue
+                batch.append(row)
+                if len(batch) == self.batch_size:
+                    self._write_batch(conn, batch, consecutive_ids)
+                    imported += len(batch)
+                    self.checkpoint.save(row_number)
+                    self._report(imported, started)
+                    batch = []
+            if batch:
+                self._write_batch(conn, batch, consecutive_ids)
+                imported += len(batch)
+            self._report(imported, started)
+            self.checkpoint.clear()
+
+            # Recount the /stats counters once, rather than per recipe and entry
+            StatsDAO().reconcile()
+        finally:
+            conn.close()
+
+    def _write_batch(self, conn, batch:list[dict], consecutive_ids:bool):
+        """Inserts a batch of recipes with their tags and cookbook/try list entries, in one transaction."""
+        cursor = conn.cursor()
+        try:
+            # Recipes that bring their own id can always go in with one executemany
+            with_ids = [row for row in batch if row.get('recipe_id')]
+            without_ids = [row for row in batch if not row.get('recipe_id')]
+            with_id_values = [(int(row['recipe_id']), *self._recipe_values(row)) for row in with_ids]
+            without_id_values = [self._recipe_values(row) for row in without_ids]
+
+            # The images go in first, since the recipes refer to them
+            image_hashes = [values[3] for values in with_id_values] + [values[2] for values in without_id_values]
+            for image_hash in filter(None, image_hashes):
+                ImageDAO().add_reference(cursor, image_hash)
+
+            if with_ids:
+                query = """
+                INSERT INTO recipe (recipe_id, recipe_name, date_created, image_hash, recipe_description, instructions, tags, user_id, image_mime_type)
+                VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s)
+                """
+                cursor.executemany(query, with_id_values)
+
+            # Otherwise the new ids are only known up front when the server hands them out consecutively
+            if without_ids:
+                query = """
+                INSERT INTO recipe (recipe_name, date_created, image_hash, recipe_description, instructions, tags, user_id, image_mime_type)
+                VALUES (%s, %s, %s, %s, %s, %s, %s, %s)
+                """
+                if consecutive_ids:
+                    cursor.executemany(query, without_id_values)
+                    for offset, row in enumerate(without_ids):
+                        row['recipe_id'] = cursor.lastrowid + offset
+                else:
+                    for row, values in zip(without_ids, without_id_values):
+                        cursor.execute(query, values)
+                        row['recipe_id'] = cursor.lastrowid
+
+            # Tags and entries, batched as well
+            tags = [(int(row['recipe_id']), tag) for row in batch for tag in dict.fromkeys(row.get('tags') or [])]
+            if tags:
+                cursor.executemany("INSERT INTO recipe_tag (recipe_id, tag) VALUES (%s, %s)", tags)
+            for table, field in (('personal_cookbook_entry', 'cookbook_user_ids'), ('to_try_entry', 'try_user_ids')):
+                entries = [(int(user_id), int(row['recipe_id'])) for row in batch for user_id in row.get(field) or []]
+                if entries:
+                    cursor.executemany(f"INSERT IGNORE INTO {table} (user_id, recipe_id) VALUES (%s, %s)", entries)
+
+            # The next recommender refresh finds their similar recipes, and the workers' search indexes pick them up
+            RecommendationDAO().mark_stale(cursor, [int(row['recipe_id']) for row in batch])
+            RecipeDAO().record_changes(cursor, [int(row['recipe_id']) for row in batch])
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            cursor.close()
+
+    def _recipe_values(self, row:dict) -> tuple:
+        # Images are streamed into the blob store, so a big one is never read into memory whole
+        image_hash, image_mime_type = None, None
+        if row.get('image'):
+            with open(os.path.join(self.base_dir, row['image']), 'rb') as file:
+                image_mime_type = sniff_mime_type(file.read(16))
+                if image_mime_type:
+                    file.seek(0)
+                    image_hash = blob_store.put(file)
+        return (
+            row['recipe_name'],
+            row.get('date_created') or datetime.now().strftime('%Y-%m-%d'),
+            image_hash,
+            row['recipe_description'],
+            row['instructions'],
+            json.dumps(row.get('tags') or []),
+            int(row['user_id']),
+            image_mime_type
+        )
+
+    @staticmethod
+    def _report(imported:int, started:float):
+        elapsed = max(time.monotonic() - started, 1e-9)
+        print(f'Imported {imported} recipes ({imported / elapsed:.0f} rows/s)')
+
+class Exporter():
+    def __init__(self, out_dir:str, file_format:str='jsonl', batch_size:int=500):
+        self.out_dir = out_dir
+        self.file_format = file_format
+        self.batch_size = batch_size
+
+    def run(self):
+        os.makedirs(os.path.join(self.out_dir, 'images'), exist_ok=True)
+        out_path = os.path.join(self.out_dir, f'recipes.{self.file_format}')
+
+        # An unbuffered cursor streams rows from the server instead of loading the whole table,
+        # and a second connection looks up the cookbook and try list entries of each batch
+        stream_conn = get_db_connection()
+        lookup_conn = get_db_connection()
+        started = time.monotonic()
+        exported = 0
+        try:
+            with open(out_path, 'w', newline='', encoding='utf-8') as file:
+                writer = csv.DictWriter(file, RECIPE_FIELDS) if self.file_format == 'csv' else None
+                if writer:
+                    writer.writeheader()
+                cursor = stream_conn.cursor(buffered=False)
+                cursor.execute("""
+                SELECT recipe_id, recipe_name, date_created, recipe_description, instructions, tags, user_id, image_hash, image_mime_type
+                FROM recipe ORDER BY recipe_id
+                """)
+                while True:
+                    rows = cursor.fetchmany(self.batch_size)
+                    if not rows:
+                        break
+                    for record in self._records(lookup_conn, rows):
+                        self._write(file, writer, record)
+                    exported += len(rows)
+                    print(f'Exported {exported} recipes ({exported / max(time.monotonic() - started, 1e-9):.0f} rows/s)')
+                cursor.close()
+        finally:
+            stream_conn.close()
+            lookup_conn.close()
+
+    def _records(self, lookup_conn, rows:list[tuple]):
+        recipe_ids = [row[0] for row in rows]
+        entries = self._entries(lookup_conn, recipe_ids)
+        for recipe_id, recipe_name, date_created, recipe_description, instructions, tags, user_id, image_hash, image_mime_type in rows:
+            image = None
+            if image_hash and image_mime_type:
+                image = f'images/{recipe_id}.{image_mime_type.split("/")[-1]}'
+                blob_store.copy_to(image_hash, os.path.join(self.out_dir, image))
+            yield {
+                'recipe_id': recipe_id,
+                'recipe_name': recipe_name,
+                'date_created': str(date_created),
+                'recipe_description': recipe_description,
+                'instructions': instructions,
+                'tags': json.loads(tags),
+                'user_id': user_id,
+                'image': image,
+                'cookbook_user_ids': entries['cookbook'].get(recipe_id, []),
+                'try_user_ids': entries['try'].get(recipe_id, []),
+            }
+
+    def _entries(self, conn, recipe_ids:list[int]) -> dict[str, dict[int, list[int]]]:
+        placeholders = ', '.join(['%s'] * len(recipe_ids))
+        query = f"""
+        SELECT 'cookbook', recipe_id, user_id FROM personal_cookbook_entry WHERE recipe_id IN ({placeholders})
+        UNION ALL
+        SELECT 'try', recipe_id, user_id FROM to_try_entry WHERE recipe_id IN ({placeholders})
+        """
+        entries = {'cookbook': {}, 'try': {}}
+        with conn.cursor() as cursor:
+            cursor.execute(query, (*recipe_ids, *recipe_ids))
+            for list_name, recipe_id, user_id in cursor.fetchall():
+                entries[list_name].setdefault(recipe_id, []).append(user_id)
+        conn.rollback()  # End the read transaction so the next batch sees fresh entries
+        return entries
+
+    def _write(self, file, writer, record:dict):
+        if writer:
+            writer.writerow({field: json.dumps(value) if field in LIST_FIELDS else value for field, value in record.items()})
+        else:
+            file.write(json.dumps(record) + '\n')
+
+def main(argv:list[str] | None = None):
+    parser = argparse.ArgumentParser(description='Bulk import and export of recipes.')
+    commands = parser.add_subparsers(dest='command', required=True)
+    import_parser = commands.add_parser('import', help='Load recipes from a .jsonl or .csv file')
+    import_parser.add_argument('input_path')
+    import_parser.add_argument('--batch-size', type=int, default=500, help='Rows per executemany and commit')
+    export_parser = commands.add_parser('export', help='Write every recipe and its image to a directory')
+    export_parser.add_argument('out_dir')
+    export_parser.add_argument('--format', choices=['jsonl', 'csv'], default='jsonl')
+    export_parser.add_argument('--batch-size', type=int, default=500, help='Rows fetched from the server at a time')
+    args = parser.parse_args(argv)
+
+    if args.command == 'import':
+        Importer(args.input_path, args.batch_size).run()
+    else:
+        Exporter(args.out_dir, args.format, args.batch_size).run()
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,20 +1,90 @@
+import time
+_started = time.perf_counter()  # Taken before the other imports, so the startup time includes them
+
 import os
 import json
+import hashlib
 from functools import wraps
 from datetime import datetime
-from dotenv import load_dotenv
-from flask import Flask, render_template, request, redirect, url_for, flash, session
+from jinja2 import FileSystemBytecodeCache
+from flask import Flask, Response, make_response, render_template, stream_template, send_file, request, redirect, url_for, flash, session, get_flashed_messages
 
-from Models.Recipe import Recipe
+from Models.RecipeSummary import RecipeSummary
 from DAOs.PCB_DAO import PcbDAO
-from DAOs.Recipe_DAO import RecipeDAO
+from DAOs.Recipe_DAO import RecipeDAO, RecipeNotFoundError, SEARCH_SAMPLE_SIZE, recipe_cache, fragment_cache, search_index, suggest_index
 from DAOs.Try_DAO import TryDAO
 from DAOs.User_DAO import UserDAO
-
-# Load env and start the flask app
-load_dotenv()
+from DAOs.Saved_DAO import SavedDAO, saved_set_cache
+from DAOs.Tag_DAO import TagDAO
+from DAOs.Image_DAO import ImageDAO, blob_store
+from DAOs.Recommendation_DAO import RecommendationDAO
+from DAOs.Stats_DAO import StatsDAO
+from DAOs.GetConnection import advisory_lock, get_pool, get_replicas, remember_writes, release_request_connection
+from DAOs.Pagination import PAGE_SIZE, decode_cursor, paginate
+from DAOs.UnitOfWork import UnitOfWork
+from DAOs import Instrumentation
+from Services import Uploads
+from Services.ImagePipeline import SIZES as IMAGE_SIZES, submit_derivatives
+from Services.Metrics import metrics
+from Services import HttpCaching
+from Services.Settings import get_settings
+from Services.Startup import StartupTimer
+
+# Load the settings once and start the flask app
+settings = get_settings()
 app = Flask(__name__)
-app.secret_key = os.getenv('SECRET')
+app.secret_key = settings.secret
+app.config['STREAM_LIST_PAGES'] = settings.stream_list_pages
+if settings.template_cache_dir:
+    # Compiled templates are read from here instead of being compiled again by every new worker
+    os.makedirs(settings.template_cache_dir, exist_ok=True)
+    app.jinja_options = dict(app.jinja_options, bytecode_cache=FileSystemBytecodeCache(settings.template_cache_dir))
+startup = StartupTimer(_started)
+startup.init_app(app)
+IMAGE_MAX_AGE = 30 * 24 * 60 * 60  # Browsers may reuse a recipe image whose URL carries its hash (?v=) for 30 days
+IMAGE_REVALIDATE_AGE = 60  # Other image URLs may show a new image, so browsers check their ETag after a minute
+SIMILAR_COUNT = 5  # Similar recipes listed on a recipe page
+RECOMMENDED_COUNT = 5  # Recommendations listed on the home page
+STATS_COUNT = 10  # Rows in each table of the stats page
+
+# Every DAO call in a request shares one pooled connection, which goes back to the pool here
+app.teardown_appcontext(release_request_connection)
+
+# Read only DAO methods use a replica when DB_REPLICAS is set, except for a user who just wrote, until the replicas catch up
+app.after_request(remember_writes)
+replicas = get_replicas()
+
+# Count the queries, database time and rows of every request, log slow queries and warn about N+1 queries
+app.config['SERVER_TIMING'] = settings.server_timing
+Instrumentation.configure(slow_query_ms=settings.slow_query_ms, n_plus_one_threshold=settings.n_plus_one_threshold)
+metrics.add_stats('cookbook_db_pool', 'Connection pool counter', lambda: get_pool().stats())
+metrics.add_stats('cookbook_saved_set_cache', 'Saved set cache counter', saved_set_cache.stats)
+metrics.add_stats('cookbook_recipe_cache', 'Recipe cache counter', recipe_cache.stats)
+metrics.add_stats('cookbook_fragment_cache', 'Fragment cache counter', fragment_cache.stats)
+metrics.add_stats('cookbook_startup', 'Startup timing of this worker', startup.stats)
+if replicas:
+    metrics.add_stats('cookbook_db_replicas', 'Read replica routing counter or lag', replicas.stats)
+
+@app.before_request
+def start_request_stats():
+    Instrumentation.begin_request(request.endpoint)
+
+@app.after_request
+def add_request_stats(response):
+    stats = Instrumentation.current_stats()
+    if stats is not None:
+        stats.status = response.status_code
+        if app.config['SERVER_TIMING']:
+            response.headers['Server-Timing'] = Instrumentation.server_timing(stats)
+    return response
+
+app.teardown_request(Instrumentation.end_request)
+
+# ETags and 304s for pages, gzip (or brotli) for big responses, and year long caching of fingerprinted static files
+HttpCaching.init_app(app, compress_min_bytes=settings.compress_min_bytes)
+
+# Oversized uploads are refused before they are read, and big ones wait on disk rather than in memory
+Uploads.init_app(app, max_image_bytes=settings.max_image_bytes, spool_bytes=settings.upload_spool_bytes)
 
 # Custom decorator to check if the user is logged in
 def login_required(f):
@@ -25,48 +95,67 @@ def login_required(f):
         return f(*args, **kwargs)
     return decorated_function
 
+def build_items(user_id:int, recipes:list[RecipeSummary]) -> list[tuple[RecipeSummary, bool, bool]]:
+    """Pairs each recipe with whether the user saved it to their try list and cookbook, using one query."""
+    flags = SavedDAO().retrieve_saved_flags(user_id, [recipe.recipe_id for recipe in recipes])
+    return [(recipe, *flags[recipe.recipe_id]) for recipe in recipes]
+
+@app.template_global()
+def cached_row(item:tuple[RecipeSummary, bool, bool]):
+    """Renders one row of table.html, reusing the HTML from the last time the same recipe version had the same saved flags."""
+    recipe, saved_try, saved_cb = item
+    template = app.jinja_env.get_template('table_row.html')
+    return fragment_cache.render(template, recipe.recipe_id, recipe.version(), (saved_try, saved_cb), item=item)
+
+def render_list(template:str, **context):
+    """Renders a list page, streaming it with stream_template when ?stream=1 (or STREAM_LIST_PAGES=1) is set,
+    so the first table rows reach the browser before the whole page is built."""
+    if request.args.get('stream', app.config['STREAM_LIST_PAGES']) not in ('1', True):
+        return render_template(template, **context)
+
+    # Pop the flashed messages now, so the session cookie is saved before the body starts streaming
+    get_flashed_messages(with_categories=True)
+    return app.response_class(stream_template(template, **context))
+
 # Home page
 @app.route('/', methods=['GET'])
 @login_required
 def home():
-    # Access the Personal Cookbook entries that match the user_id
-    pcb_entry_list = PcbDAO().retrieve_entries_by_user(session['user_id'])
+    # Access one page of the Personal Cookbook entries that match the user_id
+    after = decode_cursor(request.args.get('page'), (int,))
+    pcb_entry_list = PcbDAO().retrieve_entries_by_user(session['user_id'], after_recipe_id=after[0] if after else None, limit=PAGE_SIZE + 1)
+    page = paginate(pcb_entry_list, PAGE_SIZE, lambda pcb_entry: [pcb_entry.recipe_id])
 
     # Access each recipe_id for every Personal Cookbook Entry
-    recipe_ids = [pcb_entry.recipe_id for pcb_entry in pcb_entry_list]
+    recipe_ids = [pcb_entry.recipe_id for pcb_entry in page.items]
+
+    # Access every recipe, if saved in try_list, and if saved in pcb in a fixed number of queries
+    recipes:list[RecipeSummary] = RecipeDAO().retrieve_recipe_summaries_by_ids(recipe_ids)
+    items = build_items(session['user_id'], recipes)
 
-    # Access each recipe, if saved in try_list, and if saved in pcb for every recipe_id
-    items = []
-    for recipe_id in recipe_ids:
-        recipe:Recipe = RecipeDAO().retrieve_recipe_by_id(recipe_id)
-        saved_try = TryDAO().check_if_saved_recipe(user_id=session['user_id'], recipe_id=recipe_id)
-        saved_cb = True
-        tup = (recipe, saved_try, saved_cb)
-        items.append(tup)
+    # Recommendations come from the precomputed similar recipes, and only top the first page
+    recommended = RecommendationDAO().retrieve_recommended_recipes(session['user_id'], RECOMMENDED_COUNT) if after is None else []
 
     # Render the page with all the recipes
-    return render_template('my_personal_cookbook.html', items=items)
+    return render_list('my_personal_cookbook.html', items=items, recommended=recommended, next_token=page.next_token)
 
 # Try Recipe page
 @app.route('/try_recipes', methods=['GET'])
 def try_recipes():
-    # Access the Try entries that match the user_id
-    try_entry_list = TryDAO().retrieve_entries_by_user(session['user_id'])
+    # Access one page of the Try entries that match the user_id
+    after = decode_cursor(request.args.get('page'), (int,))
+    try_entry_list = TryDAO().retrieve_entries_by_user(session['user_id'], after_recipe_id=after[0] if after else None, limit=PAGE_SIZE + 1)
+    page = paginate(try_entry_list, PAGE_SIZE, lambda try_entry: [try_entry.recipe_id])
 
     # Access each recipe_id for every Personal Cookbook Entry
-    recipe_ids = [try_entry.recipe_id for try_entry in try_entry_list]
+    recipe_ids = [try_entry.recipe_id for try_entry in page.items]
 
-    # Access each recipe for every recipe_id
-    items = []
-    for recipe_id in recipe_ids:
-        recipe:Recipe = RecipeDAO().retrieve_recipe_by_id(recipe_id)
-        saved_try = True
-        saved_cb = PcbDAO().check_if_saved_recipe(user_id=session['user_id'], recipe_id=recipe_id)
-        tup = (recipe, saved_try, saved_cb)
-        items.append(tup)
+    # Access every recipe for every recipe_id in a fixed number of queries
+    recipes:list[RecipeSummary] = RecipeDAO().retrieve_recipe_summaries_by_ids(recipe_ids)
+    items = build_items(session['user_id'], recipes)
 
     # Render the page with all the recipes
-    return render_template('try_recipes.html', items=items)
+    return render_list('try_recipes.html', items=items, next_token=page.next_token)
 
 # Search Request
 @app.route('/search', methods=['GET'])
@@ -76,6 +165,7 @@ def search():
     recipe_name = request.args.get('recipe_name', '')
     description = request.args.get('description', '')
     tags = request.args.getlist('tags')  # Gets all selected tags
+    match_all_tags = request.args.get('tag_match', 'all') != 'any'
 
     # Handle the case where the form is submitted without any criteria
     if not any([isinstance(recipe_name, str) or recipe_name is None,
@@ -84,19 +174,35 @@ def search():
         flash('Please enter search criteria.', 'error')
         return render_template('search.html')
 
-    # Make the search
-    recipes:list[Recipe] = RecipeDAO().retrieve_recipes_from_search(recipe_name, description, tags)
+    # The bare search page only shows the form, so nothing needs loading or counting
+    if not (recipe_name or description or tags):
+        return render_list('search.html', items=[], tag_counts={}, total=None, next_token=None)
+
+    # Rank the best matches, which the first page is cut from and the count and tag facets are taken over,
+    # so a broad search never ranks or counts every recipe it matches
+    page_token = request.args.get('page')
+    best = RecipeDAO().search_recipe_ids(recipe_name, description, tags, match_all_tags, SEARCH_SAMPLE_SIZE)
+    matches = best if not page_token else RecipeDAO().search_recipe_ids(recipe_name, description, tags, match_all_tags, PAGE_SIZE + 1, page_token)
+
+    # Load only the requested page of results
+    page = RecipeDAO().retrieve_search_page(matches, page_token, PAGE_SIZE)
+
+    # Count the tags of the best matches so the page can show facets
+    tag_counts = TagDAO().retrieve_tag_counts([recipe_id for recipe_id, _ in best])
 
     # Check if each recipe is saved in try_list and/or in pcb
-    items = []
-    for recipe in recipes:
-        saved_try = TryDAO().check_if_saved_recipe(user_id=session['user_id'], recipe_id=recipe.recipe_id)
-        saved_cb = PcbDAO().check_if_saved_recipe(user_id=session['user_id'], recipe_id=recipe.recipe_id)
-        tup = (recipe, saved_try, saved_cb)
-        items.append(tup)
-    
+    items = build_items(session['user_id'], page.items)
+
     # Return the matching items
-    return render_template('search.html', items=items)
+    return render_list('search.html', items=items, tag_counts=tag_counts, total=len(best), more=len(best) == SEARCH_SAMPLE_SIZE, next_token=page.next_token)
+
+# Autocomplete for the search box, answered from memory so typing never reaches the database
+@app.route('/search/suggest', methods=['GET'])
+@login_required
+def search_suggest():
+    query = request.args.get('q', '')[:255]
+    limit = min(max(request.args.get('limit', 8, type=int), 1), 20)
+    return {'query': query, 'suggestions': suggest_index.suggest(query, limit)}
 
 # Recipe page that can dynamically display different recipes
 @app.route('/recipe')
@@ -107,27 +213,93 @@ def recipe_page():
         if recipe:
             saved_try = TryDAO().check_if_saved_recipe(user_id=session['user_id'], recipe_id=recipe.recipe_id)
             saved_cb = PcbDAO().check_if_saved_recipe(user_id=session['user_id'], recipe_id=recipe.recipe_id)
+            similar = RecommendationDAO().retrieve_similar_recipes(recipe.recipe_id, SIMILAR_COUNT)
             tup = (recipe, saved_try, saved_cb)
-            return render_template('recipe.html', item=tup)
+
+            # Flashed messages are part of the page, so only the content hash made after rendering can describe it
+            if '_flashes' in session:
+                return render_template('recipe.html', item=tup, similar=similar)
+
+            # Otherwise the page only changes with the recipe and the saved flags, so a browser's copy can be confirmed without rendering
+            etag = HttpCaching.page_etag(app, session['user_id'], recipe.recipe_id, recipe.date_created, recipe.recipe_name,
+                                         recipe.recipe_description, recipe.instructions, recipe.tags, recipe.image_hash, saved_try, saved_cb, similar)
+            if request.if_none_match.contains_weak(etag):
+                response = Response(status=304)
+            else:
+                response = make_response(render_template('recipe.html', item=tup, similar=similar))
+            response.set_etag(etag, weak=True)
+            response.cache_control.private = True
+            response.cache_control.no_cache = True
+            return response
         else:
             return 'Recipe not found', 404
     else:
         return 'No recipe ID', 400
-    
+
+# Recipe images are served on their own so browsers can cache them
+@app.route('/recipe/<int:recipe_id>/image', methods=['GET'])
+def recipe_image(recipe_id:int):
+    # Only a URL naming the image's hash always shows the same picture, so only that one is cached for long
+    versioned = bool(request.args.get('v'))
+
+    # Serve a resized variant in the best format the browser accepts, if it has been made yet
+    size = request.args.get('size')
+    if size in IMAGE_SIZES:
+        accepted = {mime_type for mime_type, quality in request.accept_mimetypes if quality > 0}
+        formats = [image_format for image_format in ('avif', 'webp') if f'image/{image_format}' in accepted] + ['jpeg']
+        variant = ImageDAO().retrieve_variant(recipe_id, size, formats)
+        if variant:
+            response = image_response(*variant, max_age=IMAGE_MAX_AGE if versioned else IMAGE_REVALIDATE_AGE)
+            response.vary.add('Accept')
+            return response
+
+    # Otherwise stream the original upload from the blob store, its hash being a ready made ETag
+    image = RecipeDAO().retrieve_recipe_image(recipe_id)
+    if not image:
+        return 'Image not found', 404
+    image_hash, mime_type, date_created = image
+    # An original standing in for a variant not made yet is rechecked soon, so the browser picks up the variant
+    max_age = IMAGE_MAX_AGE if versioned and size not in IMAGE_SIZES else IMAGE_REVALIDATE_AGE
+    try:
+        return send_file(blob_store.path(image_hash), mimetype=mime_type, etag=image_hash, max_age=max_age, conditional=True,
+                         last_modified=datetime.combine(date_created, datetime.min.time()))
+    except FileNotFoundError:
+        return 'Image not found', 404
+
+def image_response(image_bytes:bytes, mime_type:str, date_created, max_age:int = IMAGE_REVALIDATE_AGE) -> Response:
+    """Builds an image response with validators, cached by browsers for max_age seconds."""
+    response = Response(image_bytes, mimetype=mime_type)
+    response.set_etag(hashlib.sha256(image_bytes).hexdigest())
+    response.last_modified = datetime.combine(date_created, datetime.min.time())
+    response.cache_control.public = True
+    response.cache_control.max_age = max_age
+
+    # Answer If-None-Match / If-Modified-Since with a 304 and Range requests with a 206
+    return response.make_conditional(request, accept_ranges=True, complete_length=len(image_bytes))
+
 # Routes to add recipe to either cookbook or to try list
 @app.route('/add_to_personal_cookbook', methods=['POST'])
+@login_required
 def add_to_personal_cookbook():
     # Access user submitted data
     recipe_id = request.form.get('recipe_id', type=int)
-    user_id = request.form.get('user_id', type=int)
+    user_id = session.get('user_id')
 
-    # Attempt to add the new entry
-    success = PcbDAO().add_new_entry(user_id, recipe_id)
-    if success:
-        flash('Recipe added to your cookbook.', 'success')
-        TryDAO().delete_recipe(user_id, recipe_id)
+    # Attempt to add the new entry and take it off the try list, in one transaction
+    try:
+        with UnitOfWork() as unit:
+            success = PcbDAO().add_new_entry(user_id, recipe_id)
+            if success:
+                TryDAO().delete_recipe(user_id, recipe_id)
+    except RecipeNotFoundError:
+        flash('That recipe no longer exists.', 'error')
     else:
-        flash('Recipe already in your cookbook.', 'error')
+        if success and unit.committed:
+            flash('Recipe added to your cookbook.', 'success')
+        elif success:
+            flash('Error adding recipe to your cookbook.', 'error')
+        else:
+            flash('Recipe already in your cookbook.', 'error')
     
     # Redirect back
     referer = request.headers.get('Referer')
@@ -137,17 +309,22 @@ def add_to_personal_cookbook():
         return redirect('/')
 
 @app.route('/add_to_try_list', methods=['POST'])
+@login_required
 def add_to_try_list():
     # Access user submitted data
     recipe_id = request.form.get('recipe_id', type=int)
-    user_id = request.form.get('user_id', type=int)
+    user_id = session.get('user_id')
 
     # Attempt to add the new entry
-    success = TryDAO().add_new_entry(user_id, recipe_id)
-    if success:
-        flash('Recipe added to your try list.', 'success')
+    try:
+        success = TryDAO().add_new_entry(user_id, recipe_id)
+    except RecipeNotFoundError:
+        flash('That recipe no longer exists.', 'error')
     else:
-        flash('Recipe already in your try list.', 'error')
+        if success:
+            flash('Recipe added to your try list.', 'success')
+        else:
+            flash('Recipe already in your try list.', 'error')
 
     # Redirect back
     referer = request.headers.get('Referer')
@@ -200,6 +377,35 @@ def remove_recipe_from_try_list():
     else:
         return redirect('/my_personal_cookbook')
 
+# Site statistics, read from counters kept up to date by the write paths
+@app.route('/stats', methods=['GET'])
+@login_required
+def stats():
+    dao = StatsDAO()
+    return render_template('stats.html',
+                           totals=dao.retrieve_totals(),
+                           most_saved=dao.retrieve_most_saved('cookbook', STATS_COUNT),
+                           most_tried=dao.retrieve_most_saved('try_list', STATS_COUNT),
+                           top_tags=dao.retrieve_top_tags(STATS_COUNT),
+                           top_authors=dao.retrieve_top_authors(STATS_COUNT))
+
+# Counters of the connection pool and caches of this worker process
+@app.route('/cache-stats', methods=['GET'])
+@login_required
+def cache_stats():
+    return {
+        'connection_pool': get_pool().stats(),
+        'replicas': replicas.stats() if replicas else None,
+        'saved_set_cache': saved_set_cache.stats(),
+        'recipe_cache': recipe_cache.stats(),
+        'fragment_cache': fragment_cache.stats()
+    }
+
+# Prometheus metrics of this worker process
+@app.route('/metrics', methods=['GET'])
+def prometheus_metrics():
+    return Response(metrics.render(), mimetype='text/plain; version=0.0.4')
+
 # ME page Request
 @app.route('/me', methods=['GET'])
 @login_required
@@ -211,36 +417,42 @@ def me():
 @login_required
 def create_recipe():
     if request.method == 'GET':
-        return render_template('create_recipe.html')
+        return render_template('create_recipe.html', max_image_bytes=settings.max_image_bytes)
     
     if request.method == 'POST':
-        # Get image bytes
-        image_file = request.files['recipe_image']
+        # The upload is size checked and sniffed before it is read, and only kept if it really is an image,
+        # in which case it is streamed into the blob store rather than read into memory
+        image_hash, image_mime_type = None, None
         try:
-            image_bytes:bytes = image_file.read()
-            if len(image_bytes) > 15.5 * 1024 * 1024:  # 16MB Limit
-                raise ValueError('Image size exceeds 16 MB')
+            upload = request.files.get('recipe_image')
+            image_mime_type = Uploads.check_image(upload, settings.max_image_bytes)
+            if image_mime_type:
+                image_hash = blob_store.put(upload.stream)
         except Exception as e:
+            image_mime_type = None
             flash(f'Error with image upload: {str(e)}', 'error')
-            image_bytes = b''
 
         # Handle tags
         tags = request.form.getlist('tags')  # Gets a list of checked tags
         tags_json = json.dumps(tags)  # Converts list to JSON string
 
-        # Insert recipe data into the database
-        recipe_id = RecipeDAO().create_recipe(
-            request.form['recipe_name'],
-            datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
-            image_bytes,
-            request.form['recipe_description'],
-            request.form['instructions'],
-            tags_json,
-            session['user_id']
-        )
-
-        # Add this to that users personal cookbook
-        PcbDAO().add_new_entry(user_id=session['user_id'], recipe_id=recipe_id)
+        # Insert recipe data into the database and add it to that users personal cookbook, in one transaction
+        with UnitOfWork():
+            recipe_id = RecipeDAO().create_recipe(
+                request.form['recipe_name'],
+                datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+                image_hash,
+                request.form['recipe_description'],
+                request.form['instructions'],
+                tags_json,
+                session['user_id'],
+                image_mime_type
+            )
+            PcbDAO().add_new_entry(user_id=session['user_id'], recipe_id=int(recipe_id))
+
+        # Make the thumbnail and detail sized variants in the image worker processes, now that the recipe is committed
+        if image_hash:
+            submit_derivatives(int(recipe_id), blob_store.path(image_hash))
 
         # Send message to page
         flash('Recipe created successfully', 'success')
@@ -408,6 +620,60 @@ def change_password():
             flash('Failed to update password', 'error')
         return render_template('me.html')
 
+# Run at deploy time, with TEMPLATE_CACHE_DIR set: flask --app main precompile-templates
+@app.cli.command('precompile-templates')
+def precompile_templates_command():
+    """Compiles every template into the TEMPLATE_CACHE_DIR bytecode cache."""
+    from Services.Startup import precompile_templates
+    if not settings.template_cache_dir:
+        raise SystemExit('Set TEMPLATE_CACHE_DIR first')
+    print(f'Compiled {precompile_templates(app)} templates into {settings.template_cache_dir}')
+
+# Recount the /stats counters, e.g. after creating them with migrate_stats.sql or nightly from cron: flask --app main reconcile-stats
+@app.cli.command('reconcile-stats')
+def reconcile_stats_command():
+    """Recounts every counter behind the /stats page."""
+    with advisory_lock('cookbook.stats') as locked:
+        if not locked:
+            raise SystemExit('The stats counters are being recounted already')
+        StatsDAO().reconcile()
+    print('Recounted the stats counters')
+
+def start_background():
+    """Warms up a serving worker and starts its background threads. Called by whatever serves the app (wsgi.py, or running
+    main.py) rather than on import, so CLI commands, scripts and tests that import main start nothing."""
+    global _background_started
+    if _background_started:
+        return
+    _background_started = True
+    from Services.Background import run_every
+    from Services.Recommender import start_refresher
+    from Services.Startup import warm_up
+
+    # With WARM_START=1 the worker gets its templates, connections and search indexes ready before it takes requests
+    if settings.warm_start:
+        startup.warmed_up(warm_up(app, get_pool(), settings.db_pool_warm or settings.db_pool_size, (search_index, suggest_index)))
+
+    # Pick up the recipes other workers created, edited or deleted, and the save and tag counts, into this worker's search and suggest
+    # indexes, and trim the log the changes come from
+    run_every('search_index', settings.index_sync_seconds, search_index.refresh)
+    run_every('suggest_index', settings.index_sync_seconds, suggest_index.refresh)
+    run_every('recipe_changes', settings.recipe_change_prune_seconds, lambda: RecipeDAO().prune_changes())
+
+    # Keep the similar recipes of recently saved recipes up to date in the background
+    start_refresher(settings.recommendations_refresh_seconds, settings.recommendations_top_k)
+
+    # Measure how far behind each read replica is, reads only go to one once it has been measured
+    if replicas:
+        run_every('replica_lag', settings.db_replica_check_seconds, replicas.check_lag)
+
+    # Delete image files no recipe uses any more, e.g. after recipes were deleted or given a new image
+    run_every('blob_gc', settings.blob_gc_seconds, lambda: blob_store.collect_garbage(ImageDAO().find_unused_blobs))
+    startup.ready()
+
+_background_started = False
+
 # listen on port 8080
 if __name__ == '__main__':
+    start_background()
     app.run(host='0.0.0.0', port=8080, debug=False)
\ No newline at end of file
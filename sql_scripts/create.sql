@@ -37,17 +37,43 @@ CREATE TABLE login_session (
   UNIQUE (cookie)
 );
 
+CREATE TABLE image_blob (
+  blob_hash CHAR (64),
+  ref_count INT NOT NULL DEFAULT 0,
+  PRIMARY KEY (blob_hash)
+);
+
 CREATE TABLE recipe (
   recipe_id SERIAL,
   recipe_name VARCHAR (255) NOT NULL,
   date_created DATE NOT NULL,
-  recipe_image MEDIUMBLOB,
+  image_hash CHAR (64),
   recipe_description VARCHAR (3000) NOT NULL,
   instructions VARCHAR (3000) NOT NULL,
   tags JSON NOT NULL,
   user_id BIGINT UNSIGNED,
+  image_mime_type VARCHAR (32),
   PRIMARY KEY (recipe_id),
-  FOREIGN KEY (user_id) REFERENCES user(user_id)
+  FOREIGN KEY (user_id) REFERENCES user(user_id),
+  FOREIGN KEY (image_hash) REFERENCES image_blob(blob_hash)
+);
+
+CREATE TABLE recipe_image_variant (
+  recipe_id BIGINT UNSIGNED,
+  size VARCHAR (16) NOT NULL,
+  format VARCHAR (16) NOT NULL,
+  mime_type VARCHAR (32) NOT NULL,
+  image_data MEDIUMBLOB NOT NULL,
+  PRIMARY KEY (recipe_id, size, format),
+  FOREIGN KEY (recipe_id) REFERENCES recipe(recipe_id)
+);
+
+CREATE TABLE recipe_tag (
+  recipe_id BIGINT UNSIGNED,
+  tag VARCHAR (255) NOT NULL,
+  PRIMARY KEY (recipe_id, tag),
+  INDEX (tag, recipe_id),
+  FOREIGN KEY (recipe_id) REFERENCES recipe(recipe_id)
 );
 
 CREATE TABLE personal_cookbook_entry (
@@ -64,4 +90,63 @@ CREATE TABLE to_try_entry (
   PRIMARY KEY (user_id, recipe_id),
   FOREIGN KEY (user_id) REFERENCES user(user_id),
   FOREIGN KEY (recipe_id) REFERENCES recipe(recipe_id)
-);
\ No newline at end of file
+);
+CREATE TABLE recipe_similarity (
+  recipe_id BIGINT UNSIGNED,
+  similar_recipe_id BIGINT UNSIGNED,
+  score DOUBLE NOT NULL,
+  PRIMARY KEY (recipe_id, similar_recipe_id),
+  INDEX (similar_recipe_id),
+  FOREIGN KEY (recipe_id) REFERENCES recipe(recipe_id),
+  FOREIGN KEY (similar_recipe_id) REFERENCES recipe(recipe_id)
+);
+
+CREATE TABLE recipe_similarity_stale (
+  stale_id BIGINT UNSIGNED AUTO_INCREMENT,
+  recipe_id BIGINT UNSIGNED NOT NULL,
+  PRIMARY KEY (stale_id),
+  INDEX (recipe_id)
+);
+
+CREATE TABLE recipe_similarity_stale_user (
+  stale_id BIGINT UNSIGNED AUTO_INCREMENT,
+  user_id BIGINT UNSIGNED NOT NULL,
+  PRIMARY KEY (stale_id)
+);
+
+CREATE TABLE recipe_change (
+  change_id BIGINT UNSIGNED AUTO_INCREMENT,
+  recipe_id BIGINT UNSIGNED NOT NULL,
+  PRIMARY KEY (change_id)
+);
+
+CREATE TABLE recipe_stats (
+  recipe_id BIGINT UNSIGNED,
+  cookbook_saves INT NOT NULL DEFAULT 0,
+  try_saves INT NOT NULL DEFAULT 0,
+  PRIMARY KEY (recipe_id),
+  INDEX (cookbook_saves, recipe_id),
+  INDEX (try_saves, recipe_id),
+  FOREIGN KEY (recipe_id) REFERENCES recipe(recipe_id)
+);
+
+CREATE TABLE tag_stats (
+  tag VARCHAR (255),
+  recipes INT NOT NULL DEFAULT 0,
+  PRIMARY KEY (tag)
+);
+
+CREATE TABLE author_stats (
+  user_id BIGINT UNSIGNED,
+  recipes INT NOT NULL DEFAULT 0,
+  PRIMARY KEY (user_id),
+  INDEX (recipes, user_id),
+  FOREIGN KEY (user_id) REFERENCES user(user_id)
+);
+
+CREATE TABLE site_stats (
+  name VARCHAR (32),
+  stripe SMALLINT NOT NULL DEFAULT 0,
+  value BIGINT NOT NULL DEFAULT 0,
+  PRIMARY KEY (name, stripe)
+);
@@ -0,0 +1,135 @@
+-- The same schema as create.sql for the SQLite backend (DB_BACKEND=sqlite).
+-- The app creates these tables itself the first time it opens a new database file.
+
+CREATE TABLE user (
+  user_id INTEGER PRIMARY KEY AUTOINCREMENT,
+  username VARCHAR (255) NOT NULL UNIQUE,
+  user_email VARCHAR (255) NOT NULL UNIQUE,
+  first_name VARCHAR (255) NOT NULL,
+  last_name VARCHAR (255) NOT NULL,
+  password_hash VARCHAR (255) NOT NULL,
+  date_joined DATE NOT NULL
+);
+
+CREATE TABLE login_attempt (
+  login_id INTEGER PRIMARY KEY AUTOINCREMENT,
+  user_exists BOOLEAN NOT NULL,
+  date_time VARCHAR (255) NOT NULL,
+  attempt_num INT NOT NULL,
+  ip_address VARCHAR (255) NOT NULL,
+  user_id INTEGER REFERENCES user(user_id)
+);
+
+CREATE TABLE login_session (
+  session_id INTEGER PRIMARY KEY AUTOINCREMENT,
+  date_time VARCHAR (255) NOT NULL,
+  cookie VARCHAR (255) NOT NULL UNIQUE,
+  active BOOLEAN NOT NULL,
+  user_id INTEGER REFERENCES user(user_id)
+);
+
+CREATE TABLE image_blob (
+  blob_hash CHAR (64) PRIMARY KEY,
+  ref_count INT NOT NULL DEFAULT 0
+);
+
+CREATE TABLE recipe (
+  recipe_id INTEGER PRIMARY KEY AUTOINCREMENT,
+  recipe_name VARCHAR (255) NOT NULL,
+  date_created DATE NOT NULL,
+  image_hash CHAR (64) REFERENCES image_blob(blob_hash),
+  recipe_description VARCHAR (3000) NOT NULL,
+  instructions VARCHAR (3000) NOT NULL,
+  tags TEXT NOT NULL,
+  user_id INTEGER REFERENCES user(user_id),
+  image_mime_type VARCHAR (32)
+);
+
+CREATE TABLE recipe_image_variant (
+  recipe_id INTEGER REFERENCES recipe(recipe_id),
+  size VARCHAR (16) NOT NULL,
+  format VARCHAR (16) NOT NULL,
+  mime_type VARCHAR (32) NOT NULL,
+  image_data BLOB NOT NULL,
+  PRIMARY KEY (recipe_id, size, format)
+);
+
+CREATE TABLE recipe_tag (
+  recipe_id INTEGER REFERENCES recipe(recipe_id),
+  tag VARCHAR (255) NOT NULL,
+  PRIMARY KEY (recipe_id, tag)
+);
+
+CREATE INDEX recipe_tag_by_tag ON recipe_tag (tag, recipe_id);
+
+CREATE TABLE personal_cookbook_entry (
+  user_id INTEGER REFERENCES user(user_id),
+  recipe_id INTEGER REFERENCES recipe(recipe_id),
+  PRIMARY KEY (user_id, recipe_id)
+);
+
+-- Who saved a recipe, MySQL indexes its foreign keys itself
+CREATE INDEX personal_cookbook_entry_by_recipe ON personal_cookbook_entry (recipe_id, user_id);
+
+CREATE TABLE to_try_entry (
+  user_id INTEGER REFERENCES user(user_id),
+  recipe_id INTEGER REFERENCES recipe(recipe_id),
+  PRIMARY KEY (user_id, recipe_id)
+);
+
+-- Who saved a recipe, MySQL indexes its foreign keys itself
+CREATE INDEX to_try_entry_by_recipe ON to_try_entry (recipe_id, user_id);
+
+CREATE TABLE recipe_similarity (
+  recipe_id INTEGER REFERENCES recipe(recipe_id),
+  similar_recipe_id INTEGER REFERENCES recipe(recipe_id),
+  score DOUBLE NOT NULL,
+  PRIMARY KEY (recipe_id, similar_recipe_id)
+);
+
+CREATE INDEX recipe_similarity_by_similar ON recipe_similarity (similar_recipe_id);
+
+CREATE TABLE recipe_similarity_stale (
+  stale_id INTEGER PRIMARY KEY AUTOINCREMENT,
+  recipe_id INTEGER NOT NULL
+);
+
+CREATE INDEX recipe_similarity_stale_by_recipe ON recipe_similarity_stale (recipe_id);
+
+CREATE TABLE recipe_similarity_stale_user (
+  stale_id INTEGER PRIMARY KEY AUTOINCREMENT,
+  user_id INTEGER NOT NULL
+);
+
+CREATE TABLE recipe_change (
+  change_id INTEGER PRIMARY KEY AUTOINCREMENT,
+  recipe_id INTEGER NOT NULL
+);
+
+CREATE TABLE recipe_stats (
+  recipe_id INTEGER PRIMARY KEY REFERENCES recipe(recipe_id),
+  cookbook_saves INT NOT NULL DEFAULT 0,
+  try_saves INT NOT NULL DEFAULT 0
+);
+
+CREATE INDEX recipe_stats_by_cookbook_saves ON recipe_stats (cookbook_saves, recipe_id);
+CREATE INDEX recipe_stats_by_try_saves ON recipe_stats (try_saves, recipe_id);
+
+CREATE TABLE tag_stats (
+  tag VARCHAR (255) PRIMARY KEY,
+  recipes INT NOT NULL DEFAULT 0
+);
+
+CREATE TABLE author_stats (
+  user_id INTEGER PRIMARY KEY REFERENCES user(user_id),
+  recipes INT NOT NULL DEFAULT 0
+);
+
+CREATE INDEX author_stats_by_recipes ON author_stats (recipes, user_id);
+
+CREATE TABLE site_stats (
+  name VARCHAR (32),
+  stripe SMALLINT NOT NULL DEFAULT 0,
+  value BIGINT NOT NULL DEFAULT 0,
+  PRIMARY KEY (name, stripe)
+);
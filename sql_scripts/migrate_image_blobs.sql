@@ -0,0 +1,17 @@
+USE cooking;
+
+-- Moves the original recipe images out of the recipe table into the blob store (the BLOB_DIR folder).
+-- 1. Run this script to add the reference counted image_blob table and the recipe.image_hash column.
+-- 2. Run `python -m Services.BlobStore migrate`, which copies every image into the store and empties recipe_image.
+--    It can be stopped and run again. Images it has not moved yet are not shown until it has.
+-- 3. Once it reports that no images are left, drop the old column:
+--    ALTER TABLE recipe DROP COLUMN recipe_image;
+CREATE TABLE IF NOT EXISTS image_blob (
+  blob_hash CHAR (64),
+  ref_count INT NOT NULL DEFAULT 0,
+  PRIMARY KEY (blob_hash)
+);
+
+ALTER TABLE recipe
+  ADD COLUMN image_hash CHAR (64) AFTER date_created,
+  ADD FOREIGN KEY (image_hash) REFERENCES image_blob(blob_hash);
@@ -0,0 +1,15 @@
+USE cooking;
+
+-- Adds the image_mime_type column that list pages use to tell if a recipe has an image without reading the image.
+ALTER TABLE recipe ADD COLUMN image_mime_type VARCHAR (32);
+
+-- Fill it in for the images that already exist, from their magic numbers. Empty uploads become NULL.
+UPDATE recipe SET image_mime_type = CASE
+    WHEN HEX(SUBSTR(recipe_image, 1, 8)) = '89504E470D0A1A0A' THEN 'image/png'
+    WHEN HEX(SUBSTR(recipe_image, 1, 3)) = 'FFD8FF' THEN 'image/jpeg'
+    WHEN SUBSTR(recipe_image, 1, 4) = 'GIF8' THEN 'image/gif'
+    WHEN SUBSTR(recipe_image, 1, 4) = 'RIFF' AND SUBSTR(recipe_image, 9, 4) = 'WEBP' THEN 'image/webp'
+END
+WHERE recipe_image IS NOT NULL;
+
+UPDATE recipe SET recipe_image = NULL WHERE image_mime_type IS NULL;
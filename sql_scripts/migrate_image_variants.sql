@@ -0,0 +1,13 @@
+USE cooking;
+
+-- Creates the table holding the resized variants of every recipe image.
+-- Afterwards run `python -m Services.ImagePipeline` to make the variants of the images that already exist.
+CREATE TABLE IF NOT EXISTS recipe_image_variant (
+  recipe_id BIGINT UNSIGNED,
+  size VARCHAR (16) NOT NULL,
+  format VARCHAR (16) NOT NULL,
+  mime_type VARCHAR (32) NOT NULL,
+  image_data MEDIUMBLOB NOT NULL,
+  PRIMARY KEY (recipe_id, size, format),
+  FOREIGN KEY (recipe_id) REFERENCES recipe(recipe_id)
+);
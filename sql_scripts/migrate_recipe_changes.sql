@@ -0,0 +1,9 @@
+USE cooking;
+
+-- Creates the log of created, edited and deleted recipes that every worker reads to keep its search indexes up to date.
+-- The log starts empty, the workers load every recipe when they start.
+CREATE TABLE IF NOT EXISTS recipe_change (
+  change_id BIGINT UNSIGNED AUTO_INCREMENT,
+  recipe_id BIGINT UNSIGNED NOT NULL,
+  PRIMARY KEY (change_id)
+);
@@ -0,0 +1,30 @@
+USE cooking;
+
+-- Creates the tables holding each recipe's most similar recipes, and the recipes and users whose neighbours need recomputing.
+-- Every existing recipe is queued, so the next refresh computes all of their neighbours
+-- (or run `python -m Services.Recommender --full` to do it right away).
+CREATE TABLE IF NOT EXISTS recipe_similarity (
+  recipe_id BIGINT UNSIGNED,
+  similar_recipe_id BIGINT UNSIGNED,
+  score DOUBLE NOT NULL,
+  PRIMARY KEY (recipe_id, similar_recipe_id),
+  INDEX (similar_recipe_id),
+  FOREIGN KEY (recipe_id) REFERENCES recipe(recipe_id),
+  FOREIGN KEY (similar_recipe_id) REFERENCES recipe(recipe_id)
+);
+
+CREATE TABLE IF NOT EXISTS recipe_similarity_stale (
+  stale_id BIGINT UNSIGNED AUTO_INCREMENT,
+  recipe_id BIGINT UNSIGNED NOT NULL,
+  PRIMARY KEY (stale_id),
+  INDEX (recipe_id)
+);
+
+CREATE TABLE IF NOT EXISTS recipe_similarity_stale_user (
+  stale_id BIGINT UNSIGNED AUTO_INCREMENT,
+  user_id BIGINT UNSIGNED NOT NULL,
+  PRIMARY KEY (stale_id)
+);
+
+INSERT INTO recipe_similarity_stale (recipe_id)
+SELECT recipe_id FROM recipe;
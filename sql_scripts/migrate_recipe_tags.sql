@@ -0,0 +1,15 @@
+USE cooking;
+
+-- Creates the indexed recipe_tag table and fills it from the tags JSON column of every existing recipe.
+-- Safe to run more than once.
+CREATE TABLE IF NOT EXISTS recipe_tag (
+  recipe_id BIGINT UNSIGNED,
+  tag VARCHAR (255) NOT NULL,
+  PRIMARY KEY (recipe_id, tag),
+  INDEX (tag, recipe_id),
+  FOREIGN KEY (recipe_id) REFERENCES recipe(recipe_id)
+);
+
+INSERT IGNORE INTO recipe_tag (recipe_id, tag)
+SELECT recipe.recipe_id, recipe_tags.tag
+FROM recipe, JSON_TABLE(recipe.tags, '$[*]' COLUMNS (tag VARCHAR (255) PATH '$')) AS recipe_tags;
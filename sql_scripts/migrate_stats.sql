@@ -0,0 +1,34 @@
+USE cooking;
+
+-- Creates the counter tables behind the /stats page.
+-- Afterwards run `flask --app main reconcile-stats` to count what is already in the database.
+CREATE TABLE IF NOT EXISTS recipe_stats (
+  recipe_id BIGINT UNSIGNED,
+  cookbook_saves INT NOT NULL DEFAULT 0,
+  try_saves INT NOT NULL DEFAULT 0,
+  PRIMARY KEY (recipe_id),
+  INDEX (cookbook_saves, recipe_id),
+  INDEX (try_saves, recipe_id),
+  FOREIGN KEY (recipe_id) REFERENCES recipe(recipe_id)
+);
+
+CREATE TABLE IF NOT EXISTS tag_stats (
+  tag VARCHAR (255),
+  recipes INT NOT NULL DEFAULT 0,
+  PRIMARY KEY (tag)
+);
+
+CREATE TABLE IF NOT EXISTS author_stats (
+  user_id BIGINT UNSIGNED,
+  recipes INT NOT NULL DEFAULT 0,
+  PRIMARY KEY (user_id),
+  INDEX (recipes, user_id),
+  FOREIGN KEY (user_id) REFERENCES user(user_id)
+);
+
+CREATE TABLE IF NOT EXISTS site_stats (
+  name VARCHAR (32),
+  stripe SMALLINT NOT NULL DEFAULT 0,
+  value BIGINT NOT NULL DEFAULT 0,
+  PRIMARY KEY (name, stripe)
+);
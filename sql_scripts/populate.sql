@@ -15,10 +15,19 @@ INSERT INTO login_session VALUES (9, '3-1-2024 8:45 AM', 'hsfksfdsfsdlfldsj', tr
 INSERT INTO login_session VALUES (10, '3-1-2024 8:48 AM', 'fjdkjfkajsfiewkf', false, 2);
 INSERT INTO login_session VALUES (11, '3-1-2024 8:50 AM', 'luerhjnndeurf', true, 3);
 
---          recipe VALUES (recipe_id(default),   recipe_name,   date_created,   recipe_image,   recipe_description,   instructions,   tags,   user_id(FK) );
-INSERT INTO recipe VALUES (70, 'Pasta', '2024-03-01', NULL, 'It is so good with parm.', 'Boil the pasta', '["Spicy", "Italian"]', 1);
-INSERT INTO recipe VALUES (71, 'Omlete', '2024-03-01', NULL, 'Eggman does not approve', 'Crack the eggs', '["Breakfast", "Romantic"]', 2);
-INSERT INTO recipe VALUES (72, 'Cake', '2024-03-01', NULL, 'Square cake from minecraft', 'Mix the flour and egg', '["Sweet", "Dessert", "Baking"]', 3);
+--          recipe VALUES (recipe_id(default),   recipe_name,   date_created,   image_hash,   recipe_description,   instructions,   tags,   user_id(FK),   image_mime_type );
+INSERT INTO recipe VALUES (70, 'Pasta', '2024-03-01', NULL, 'It is so good with parm.', 'Boil the pasta', '["Spicy", "Italian"]', 1, NULL);
+INSERT INTO recipe VALUES (71, 'Omlete', '2024-03-01', NULL, 'Eggman does not approve', 'Crack the eggs', '["Breakfast", "Romantic"]', 2, NULL);
+INSERT INTO recipe VALUES (72, 'Cake', '2024-03-01', NULL, 'Square cake from minecraft', 'Mix the flour and egg', '["Sweet", "Dessert", "Baking"]', 3, NULL);
+
+--          recipe_tag VALUES (recipe_id(FK),   tag );
+INSERT INTO recipe_tag VALUES (70, 'Spicy');
+INSERT INTO recipe_tag VALUES (70, 'Italian');
+INSERT INTO recipe_tag VALUES (71, 'Breakfast');
+INSERT INTO recipe_tag VALUES (71, 'Romantic');
+INSERT INTO recipe_tag VALUES (72, 'Sweet');
+INSERT INTO recipe_tag VALUES (72, 'Dessert');
+INSERT INTO recipe_tag VALUES (72, 'Baking');
 
 --          ingredient VALUES (ingredient_id(default),   ingredient_name );
 INSERT INTO ingredient VALUES (20, 'egg');
@@ -0,0 +1,4 @@
+"""The WSGI entry point for serving the app, e.g. gunicorn wsgi:app. Unlike importing main, it starts the worker's background threads."""
+from main import app, start_background
+
+start_background()